@@ -15,6 +15,8 @@ DEBUG = os.getenv('DEBUG', 'true').lower() == 'true'
 
 USE_SQLITE = os.getenv('USE_SQLITE', 'true').lower() == 'true'
 
+USE_REDIS_CACHE = os.getenv('USE_REDIS_CACHE', 'false').lower() == 'true'
+
 ALLOWED_HOSTS = ['127.0.0.1', 'localhost', '84.201.162.233', 'webdozen.ddns.net']
 
 
@@ -39,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -85,10 +88,58 @@ else:
             'USER': os.getenv('POSTGRES_USER', 'postgres'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
             'HOST': os.getenv('DB_HOST', 'localhost'),
-            'PORT': os.getenv('DB_PORT', 5432)
+            'PORT': os.getenv('DB_PORT', 5432),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+                'DB_DISABLE_SERVER_SIDE_CURSORS', 'false'
+            ).lower() == 'true',
         }
     }
 
+DB_CONN_HEALTH_CHECKS = os.getenv(
+    'DB_CONN_HEALTH_CHECKS', 'false'
+).lower() == 'true'
+
+
+if USE_REDIS_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.getenv('REDIS_CACHE_URL', 'redis://redis:6379/1'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Объединять пересчеты статуса ИПР можно только через общий для веба и
+# воркеров кэш, с locmem у каждого процесса свой ключ ожидания
+IDP_STATUS_COALESCE = USE_REDIS_CACHE
+
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+IDP_DETAIL_CACHE_TIMEOUT = int(os.getenv('IDP_DETAIL_CACHE_TIMEOUT', 3600))
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+REQUEST_METRICS_FLUSH_INTERVAL = int(
+    os.getenv('REQUEST_METRICS_FLUSH_INTERVAL', 10)
+)
+QUERY_BUDGETS_ENFORCE = os.getenv(
+    'QUERY_BUDGETS_ENFORCE', 'false'
+).lower() == 'true'
+QUERY_BUDGETS = {
+    'employee-list': 8,
+    'employee-detail': 10,
+    'idps-list': 8,
+    'idps-detail': 5,
+    'PATCH idps-detail': 22,
+    'idp_comments-list': 3,
+    'task_comments-list': 3,
+    'head_statistic-list': 10,
+    'task_status-status': 6,
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -131,13 +182,25 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
 CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_RESULT_BACKEND = "redis://redis:6379/0"
+# Пересчеты статусов по запросам пользователей идут в отдельную очередь,
+# чтобы не ждать ночных пакетных задач
+CELERY_TASK_DEFAULT_QUEUE = 'maintenance'
+CELERY_TASK_ROUTES = {
+    'api.tasks.determine_status_idp_by_task': {'queue': 'interactive'},
+}
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(
+    os.getenv('CELERY_WORKER_PREFETCH_MULTIPLIER', 1)
+)
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'API V1 Сервис ИПР',
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api.metrics import install_query_recorder
+        connection_created.connect(install_query_recorder)
+        if settings.DB_CONN_HEALTH_CHECKS:
+            from api.db import close_unusable_connections
+            request_started.connect(close_unusable_connections)
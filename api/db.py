@@ -0,0 +1,36 @@
+import zlib
+from contextlib import contextmanager
+
+from django.db import connections
+
+
+def close_unusable_connections(**kwargs):
+    """
+    Закрывает постоянные соединения с БД, которые перестали отвечать,
+    чтобы запрос открыл новое вместо ошибки на первом обращении
+    """
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+
+@contextmanager
+def advisory_lock(name, using='default'):
+    """
+    Сессионная блокировка Postgres по имени, чтобы одну и ту же работу
+    не выполняли одновременно несколько реплик. Держится на отдельном
+    соединении, так как команды вроде loaddata закрывают основное.
+    На других БД не действует
+    """
+    if connections[using].vendor != 'postgresql':
+        yield
+        return
+    connection = connections[using].copy()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_lock(%s)', [zlib.crc32(name.encode())]
+            )
+        yield
+    finally:
+        connection.close()
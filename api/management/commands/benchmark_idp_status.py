@@ -0,0 +1,150 @@
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api.tasks import IDP_STATUS_COUNTDOWN, check_idp_statuses_by_deadline
+from plans.models import IDP, StatusIDP, StatusTask, Task
+from plans.synthetic import generate_org
+from users.models import User
+
+POLL_INTERVAL = 0.02
+
+
+def percentiles(timings):
+    """Возвращает медиану, 95-й перцентиль и максимум в миллисекундах"""
+    timings = sorted(timing * 1000 for timing in timings)
+    return (
+        statistics.median(timings),
+        statistics.quantiles(timings, n=20)[18],
+        timings[-1],
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Change task statuses with concurrent PATCH requests to a running '
+        'server and measure the time until Celery recalculates the IDP '
+        'status. Creates its own IDPs and deletes them afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Server URL, e.g. http://127.0.0.1')
+        parser.add_argument('--idps', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--maintenance',
+            type=int,
+            default=0,
+            help='Queue this many check_idp_statuses_by_deadline runs '
+                 'right before the requests',
+        )
+        parser.add_argument('--timeout', type=float, default=300)
+        parser.add_argument('--prefix', default='latency')
+
+    def create_samples(self, count, prefix):
+        generate_org(
+            count, idps_per_employee=1, tasks_per_idp=1, prefix=prefix
+        )
+        idps = IDP.objects.filter(
+            employee__user__username__startswith=f'{prefix}_employee_'
+        )
+        Task.objects.filter(idp__in=idps).update(
+            status=StatusTask.objects.get_or_create_cached('open')
+        )
+        idps.update(
+            status=StatusIDP.objects.get_or_create_cached('open'),
+            deadline=timezone.now() + timezone.timedelta(days=30),
+        )
+        IDP.update_task_counters(idps.values('id'))
+        tokens = {}
+        samples = {}
+        for task_id, idp_id, user_id in Task.objects.filter(
+            idp__in=idps
+        ).order_by('id').values_list('id', 'idp', 'idp__employee__user'):
+            if user_id not in tokens:
+                tokens[user_id] = Token.objects.get_or_create(
+                    user_id=user_id
+                )[0].key
+            samples.setdefault(idp_id, (task_id, tokens[user_id]))
+        return samples
+
+    def patch(self, url, idp_id, task_id, token):
+        request = Request(
+            f'{url}/api/v1/idps/{idp_id}/tasks/{task_id}/status/',
+            data=json.dumps({'status_slug': 'in_progress'}).encode(),
+            headers={
+                'Authorization': f'Token {token}',
+                'Content-Type': 'application/json',
+            },
+            method='PATCH',
+        )
+        started = time.perf_counter()
+        with urlopen(request) as response:
+            response.read()
+        return idp_id, started, time.perf_counter()
+
+    def wait_for_statuses(self, idp_ids, futures, timeout):
+        in_progress = StatusIDP.objects.get_cached('in_progress')
+        pending = set(idp_ids)
+        changed = {}
+        deadline = time.perf_counter() + timeout
+        while pending and time.perf_counter() < deadline:
+            if any(future.done() and future.exception() for future in futures):
+                break
+            for idp_id in IDP.objects.filter(
+                id__in=pending, status=in_progress
+            ).values_list('id', flat=True):
+                changed[idp_id] = time.perf_counter()
+                pending.discard(idp_id)
+            time.sleep(POLL_INTERVAL)
+        return changed
+
+    def handle(self, *args, **options):
+        url = options['url'].rstrip('/')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Users with prefix {prefix} already exist')
+        try:
+            samples = self.create_samples(options['idps'], prefix)
+            for _ in range(options['maintenance']):
+                check_idp_statuses_by_deadline.delay()
+            with ThreadPoolExecutor(options['concurrency']) as executor:
+                futures = [
+                    executor.submit(self.patch, url, idp_id, task_id, token)
+                    for idp_id, (task_id, token) in samples.items()
+                ]
+                changed = self.wait_for_statuses(
+                    samples, futures, options['timeout']
+                )
+                requests = [future.result() for future in futures]
+        finally:
+            User.objects.filter(username__startswith=f'{prefix}_').delete()
+
+        if len(changed) < len(samples):
+            raise CommandError(
+                f'{len(samples) - len(changed)} of {len(samples)} IDP '
+                f'statuses did not change in {options["timeout"]}s'
+            )
+        patch = percentiles(
+            finished - started for _, started, finished in requests
+        )
+        latency = percentiles(
+            changed[idp_id] - started for idp_id, started, _ in requests
+        )
+        self.stdout.write(
+            f'idps={len(samples)} concurrency={options["concurrency"]} '
+            f'maintenance={options["maintenance"]} '
+            f'countdown={IDP_STATUS_COUNTDOWN}s'
+        )
+        for name, (p50, p95, maximum) in (
+            ('PATCH', patch), ('PATCH to IDP status', latency)
+        ):
+            self.stdout.write(
+                f'{name}: p50={p50:.0f}ms p95={p95:.0f}ms max={maximum:.0f}ms'
+            )
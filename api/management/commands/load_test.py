@@ -0,0 +1,81 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Send concurrent authenticated GET requests to a running server '
+        'and print latency percentiles'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Full URL of the endpoint')
+        parser.add_argument(
+            '--username',
+            help='User to authenticate as, defaults to the first manager',
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=20,
+            help='Requests sent before measuring',
+        )
+
+    def get_token(self, username):
+        users = User.objects.order_by('id')
+        if username:
+            users = users.filter(username=username)
+        else:
+            users = users.filter(role=User.Role.MANAGER)
+        user = users.first()
+        if user is None:
+            raise CommandError('User not found')
+        token, _ = Token.objects.get_or_create(user=user)
+        return token.key
+
+    def send(self, url, token):
+        request = Request(url, headers={'Authorization': f'Token {token}'})
+        started = time.perf_counter()
+        try:
+            with urlopen(request) as response:
+                response.read()
+                status = response.status
+        except HTTPError as error:
+            status = error.code
+        return (time.perf_counter() - started) * 1000, status
+
+    def handle(self, *args, **options):
+        url = options['url']
+        token = self.get_token(options['username'])
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(
+                lambda _: self.send(url, token), range(options['warmup'])
+            ))
+            started = time.perf_counter()
+            results = list(executor.map(
+                lambda _: self.send(url, token), range(options['requests'])
+            ))
+            elapsed = time.perf_counter() - started
+
+        errors = sum(1 for _, status in results if status != 200)
+        if errors:
+            raise CommandError(f'{errors} requests failed')
+        timings = sorted(timing for timing, _ in results)
+        percentiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f'requests={len(timings)} '
+            f'concurrency={options["concurrency"]} '
+            f'rps={len(timings) / elapsed:.1f} '
+            f'p50={statistics.median(timings):.1f}ms '
+            f'p99={percentiles[98]:.1f}ms'
+        )
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+from api.db import advisory_lock
+from api.models import ReleaseStep
+
+SEED_COMMANDS = [
+    ['loaddata', 'user_dump.json'],
+    ['import_people', 'people.json'],
+    ['loaddata', 'other_dump.json'],
+    ['rebuild_idp_data'],
+    ['rebuild_manager_statistics'],
+]
+
+
+def pending_migrations():
+    """Возвращает еще не примененные миграции"""
+    executor = MigrationExecutor(connection)
+    return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+def seed_fingerprint():
+    """
+    Отпечаток начальных данных: команды загрузки, содержимое файлов и
+    последние миграции, поэтому новая схема тоже приводит к перезагрузке
+    """
+    executor = MigrationExecutor(connection)
+    digest = hashlib.sha256(json.dumps([
+        SEED_COMMANDS, sorted(executor.loader.graph.leaf_nodes())
+    ]).encode())
+    for command in SEED_COMMANDS:
+        for argument in command[1:]:
+            path = settings.BASE_DIR / argument
+            if path.is_file():
+                digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply pending migrations and load initial data unless the data '
+        'fingerprint is already recorded. Safe to run from several replicas '
+        'at once'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Exit with an error if migrations or initial data are '
+                 'not applied, without changing anything',
+        )
+        parser.add_argument(
+            '--no-seed',
+            action='store_true',
+            help='Only apply migrations',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Load initial data even if the fingerprint matches',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['check']:
+            self.check_release(options['no_seed'])
+            return
+        with advisory_lock('prepare_release'):
+            self.step('migrate', started, self.migrate)
+            if not options['no_seed']:
+                self.step(
+                    'seed', started, lambda: self.seed(options['force'])
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Release prepared in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def step(self, name, started, run):
+        step_started = time.perf_counter()
+        done = run()
+        self.stdout.write(
+            f'{name}: {"done" if done else "up to date"} in '
+            f'{time.perf_counter() - step_started:.1f}s '
+            f'({time.perf_counter() - started:.1f}s total)'
+        )
+
+    def migrate(self):
+        if not pending_migrations():
+            return False
+        call_command('migrate', interactive=False, verbosity=0)
+        return True
+
+    def seed(self, force):
+        fingerprint = seed_fingerprint()
+        if not force and ReleaseStep.objects.filter(
+            name='seed', fingerprint=fingerprint
+        ).exists():
+            return False
+        with transaction.atomic():
+            for command in SEED_COMMANDS:
+                call_command(*command, verbosity=0, stdout=self.stdout)
+            ReleaseStep.objects.update_or_create(
+                name='seed', defaults={'fingerprint': fingerprint}
+            )
+        return True
+
+    def check_release(self, no_seed):
+        pending = pending_migrations()
+        if pending:
+            raise CommandError(
+                'Unapplied migrations: ' + ', '.join(
+                    f'{migration.app_label}.{migration.name}'
+                    for migration, _ in pending
+                )
+            )
+        if not no_seed and not ReleaseStep.objects.filter(
+            name='seed', fingerprint=seed_fingerprint()
+        ).exists():
+            raise CommandError('Initial data is not loaded')
+        self.stdout.write(self.style.SUCCESS('Release is prepared'))
@@ -0,0 +1,242 @@
+import json
+import statistics
+import subprocess
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from api.tasks import (check_idp_statuses_by_deadline,
+                       determine_status_idp_by_task)
+from api.v1.cache import idp_detail_cache_key
+from plans.models import (IDP, IdpComment, StatusIDP, StatusTask, Task,
+                          TaskComment, TypeTask)
+from plans.statistics import rebuild_manager_statistics
+from plans.synthetic import generate_org
+from users.authentication import invalidate_tokens
+
+WARMUP = 2
+
+
+def summarize(timings, queries):
+    """Сводка замеров в мс"""
+    timings = sorted(timings)
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[int(0.95 * (len(timings) - 1))], 2),
+        'min_ms': round(timings[0], 2),
+        'queries': queries,
+    }
+
+
+def current_commit():
+    """Текущий коммит git, если он доступен"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic organisations of several sizes, time the main '
+        'endpoints and Celery tasks against each and write a JSON report. '
+        'Generated data is rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            type=int,
+            nargs='+',
+            default=[1000, 10000],
+            metavar='IDPS',
+            help='Organisation sizes in IDPs',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--comments-per-idp', type=int, default=2)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output',
+            default='benchmark.json',
+            help='Path of the JSON report',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Previous JSON report to compare medians with',
+        )
+
+    def get_subjects(self, prefix):
+        """Выбирает ИПР с ментором, задачами и комментариями"""
+        idp = IDP.objects.filter(
+            employee__user__username__startswith=f'{prefix}_',
+            mentor__isnull=False,
+            task_count__gt=0,
+            id__in=IdpComment.objects.values('idp'),
+        ).select_related(
+            'author__user', 'employee__user', 'mentor__user'
+        ).order_by('-id').first()
+        if idp is None:
+            raise CommandError('Scale is too small to pick an IDP to measure')
+        task = Task.objects.filter(
+            idp=idp, id__in=TaskComment.objects.values('task')
+        ).first() or idp.task.first()
+        return idp, task
+
+    def measure(self, run, repeat):
+        """Выполняет run с прогревом и возвращает сводку замеров"""
+        for _ in range(WARMUP):
+            run()
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+        return summarize(timings, len(context))
+
+    def endpoint(self, client, token, url):
+        def run():
+            response = client.get(url, HTTP_AUTHORIZATION=f'Token {token}')
+            if response.status_code != 200:
+                raise CommandError(f'{url}: {response.status_code}')
+        return run
+
+    def rolled_back(self, function, *args, **kwargs):
+        def run():
+            with transaction.atomic():
+                function(*args, **kwargs)
+                transaction.set_rollback(True)
+        return run
+
+    def run_scale(self, scale, options):
+        prefix = f'benchmark{scale}'
+        started = time.perf_counter()
+        org = generate_org(
+            scale,
+            comments_per_idp=options['comments_per_idp'],
+            prefix=prefix,
+            seed=options['seed'],
+        )
+        org['generate_seconds'] = round(time.perf_counter() - started, 1)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        idp, task = self.get_subjects(prefix)
+        tokens = {
+            role: Token.objects.get_or_create(user=user)[0].key
+            for role, user in (
+                ('manager', idp.author.user),
+                ('employee', idp.employee.user),
+                ('mentor', idp.mentor.user),
+            )
+        }
+        client = Client(HTTP_HOST='localhost')
+        employee_url = f'/api/v1/employees/{idp.employee_id}/'
+        endpoints = {
+            'employee-list manager': ('manager', '/api/v1/employees/'),
+            'employee-list mentor': ('mentor', '/api/v1/employees/'),
+            'employee-detail': ('manager', employee_url),
+            'idps-list': ('manager', f'{employee_url}idps/'),
+            'idps-detail': ('employee', f'{employee_url}idps/{idp.id}/'),
+            'idp_comments-list': (
+                'mentor', f'/api/v1/idp/{idp.id}/comments/'
+            ),
+            'task_comments-list': (
+                'employee', f'/api/v1/task/{task.id}/comments/'
+            ),
+            'head_statistic-list': ('manager', '/api/v1/head/statistics/'),
+        }
+        tasks = {
+            'determine_status_idp_by_task': self.rolled_back(
+                determine_status_idp_by_task, idp.id
+            ),
+            'check_idp_statuses_by_deadline': self.rolled_back(
+                check_idp_statuses_by_deadline
+            ),
+            'rebuild_manager_statistics': self.rolled_back(
+                rebuild_manager_statistics, managers=[idp.author_id]
+            ),
+        }
+        self.tokens.extend(tokens.values())
+        self.cache_keys.append(idp_detail_cache_key(
+            idp.id,
+            IDP.objects.filter(pk=idp.id).values_list(
+                'updated_at', 'mentor__updated_at'
+            ).get()
+        ))
+        result = {'org': org, 'endpoints': {}, 'tasks': {}}
+        for name, (role, url) in endpoints.items():
+            result['endpoints'][name] = self.measure(
+                self.endpoint(client, tokens[role], url), options['repeat']
+            )
+        for name, run in tasks.items():
+            result['tasks'][name] = self.measure(run, options['repeat'])
+        return result
+
+    def print_report(self, report, baseline):
+        for scale, result in report['scales'].items():
+            self.stdout.write(f'-- {scale} IDPs')
+            for group in ('endpoints', 'tasks'):
+                for name, values in result[group].items():
+                    line = (
+                        f'{name:<32} {values["median_ms"]:>9.2f} ms '
+                        f'{values["queries"]:>3} queries'
+                    )
+                    previous = baseline.get(scale, {}).get(group, {}).get(
+                        name
+                    )
+                    if previous and previous['median_ms']:
+                        change = (
+                            values['median_ms'] / previous['median_ms'] - 1
+                        )
+                        line += (
+                            f' {change:+.0%} vs {previous["median_ms"]:.2f} '
+                            f'ms, {previous["queries"]} queries'
+                        )
+                    self.stdout.write(line)
+
+    def forget_cached(self):
+        """
+        Удаляет из кэша данные откаченной структуры: токены, ИПР и
+        справочники. Остальной кэш, общий с приложением, не трогает
+        """
+        invalidate_tokens(self.tokens)
+        cache.delete_many(self.cache_keys)
+        for model in (StatusIDP, StatusTask, TypeTask):
+            model.objects.clear_cache()
+        self.tokens, self.cache_keys = [], []
+
+    def handle(self, *args, **options):
+        self.tokens, self.cache_keys = [], []
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)['scales']
+        report = {
+            'commit': current_commit(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'scales': {},
+        }
+        for scale in options['scales']:
+            try:
+                with transaction.atomic():
+                    report['scales'][str(scale)] = self.run_scale(
+                        scale, options
+                    )
+                    transaction.set_rollback(True)
+            finally:
+                self.forget_cached()
+        with open(options['output'], 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+            file.write('\n')
+        self.print_report(report, baseline)
+        self.stdout.write(f'Report written to {options["output"]}')
@@ -0,0 +1,230 @@
+"""Метрики запросов к API в текстовом формате Prometheus."""
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import get_resolver
+
+UNMATCHED_ROUTE = 'unmatched'
+REQUEST_METRIC_KEY = 'request_metrics:{}:{}'
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+COUNTERS = (
+    'requests', 'queries', 'db_us', 'serialize_us', 'render_us', 'duration_us'
+)
+BUCKETS = tuple(f'bucket_{bound}' for bound in DURATION_BUCKETS)
+MICROSECONDS = 1_000_000
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Запрос к API выполнил больше SQL-запросов, чем разрешено"""
+
+
+class RequestMetrics:
+    """Счетчики одного запроса к API"""
+    __slots__ = (
+        'queries', 'db_time', 'serialize_time', 'render_time', 'serializing'
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.serialize_time = 0
+        self.render_time = 0
+        self.serializing = False
+
+
+class SerializationMetricsMixin:
+    """
+    Добавляет время сериализации к метрикам текущего запроса. Вложенные
+    сериализаторы не считаются повторно
+    """
+
+    def to_representation(self, instance):
+        metrics = current_metrics.get()
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializing = False
+            metrics.serialize_time += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка выполнения SQL, считающая запросы и время в БД"""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(connection, **kwargs):
+    """Подключает record_query к новому соединению с БД"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def check_query_budget(method, route, queries):
+    """
+    Проверяет кол-во SQL-запросов по бюджету маршрута. Бюджет ищется
+    сначала по ключу "METHOD route", затем по имени маршрута
+    """
+    if not settings.QUERY_BUDGETS_ENFORCE:
+        return
+    budget = settings.QUERY_BUDGETS.get(
+        f'{method} {route}', settings.QUERY_BUDGETS.get(route)
+    )
+    if budget is not None and queries > budget:
+        raise QueryBudgetExceeded(
+            f'{method} {route}: {queries} SQL queries, budget is {budget}'
+        )
+
+
+class MetricsRegistry:
+    """
+    Накапливает метрики в памяти процесса и периодически добавляет их
+    к общим счетчикам в кэше, чтобы не обращаться к кэшу на каждый
+    запрос и видеть сумму по всем воркерам
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+
+    def observe(self, route, metrics, duration):
+        values = {
+            'requests': 1,
+            'queries': metrics.queries,
+            'db_us': int(metrics.db_time * MICROSECONDS),
+            'serialize_us': int(metrics.serialize_time * MICROSECONDS),
+            'render_us': int(metrics.render_time * MICROSECONDS),
+            'duration_us': int(duration * MICROSECONDS),
+        }
+        for bound, name in zip(DURATION_BUCKETS, BUCKETS):
+            if duration <= bound:
+                values[name] = 1
+        with self._lock:
+            for name, value in values.items():
+                key = REQUEST_METRIC_KEY.format(route, name)
+                self._pending[key] = self._pending.get(key, 0) + value
+            due = (
+                time.monotonic() - self._flushed_at
+                >= settings.REQUEST_METRICS_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Добавляет накопленные значения к счетчикам в кэше"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        for key, value in pending.items():
+            if value:
+                cache.add(key, 0, None)
+                cache.incr(key, value)
+
+    def collect(self):
+        """Возвращает счетчики по маршрутам из кэша"""
+        self.flush()
+        routes = sorted(
+            name for name in get_resolver().reverse_dict
+            if isinstance(name, str)
+        ) + [UNMATCHED_ROUTE]
+        keys = {
+            (route, name): REQUEST_METRIC_KEY.format(route, name)
+            for route in routes
+            for name in COUNTERS + BUCKETS
+        }
+        values = cache.get_many(keys.values())
+        collected = {}
+        for (route, name), key in keys.items():
+            if values.get(REQUEST_METRIC_KEY.format(route, 'requests')):
+                collected.setdefault(route, {})[name] = values.get(key, 0)
+        return collected
+
+
+registry = MetricsRegistry()
+
+
+def format_labels(**labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def render_metrics(collected, counters):
+    """
+    Формирует текст для Prometheus из метрик маршрутов и дополнительных
+    счетчиков вида {(метрика, описание, метка): {значение метки: число}}
+    """
+    lines = []
+
+    def add_counter(metric, help_text, samples):
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        for labels, value in samples:
+            lines.append(f'{metric}{{{labels}}} {value}')
+
+    def route_samples(name, scale=None):
+        return [
+            (
+                format_labels(route=route),
+                values[name] / scale if scale else values[name]
+            )
+            for route, values in collected.items()
+        ]
+
+    add_counter(
+        'api_requests_total', 'Requests by route.',
+        route_samples('requests')
+    )
+    add_counter(
+        'api_request_queries_total', 'SQL queries by route.',
+        route_samples('queries')
+    )
+    add_counter(
+        'api_request_db_seconds_total', 'Time spent in SQL by route.',
+        route_samples('db_us', MICROSECONDS)
+    )
+    add_counter(
+        'api_request_serialize_seconds_total',
+        'Time spent in serializers by route.',
+        route_samples('serialize_us', MICROSECONDS)
+    )
+    add_counter(
+        'api_request_render_seconds_total',
+        'Time spent in renderers by route.',
+        route_samples('render_us', MICROSECONDS)
+    )
+    metric = 'api_request_duration_seconds'
+    lines.append(f'# HELP {metric} Request duration by route.')
+    lines.append(f'# TYPE {metric} histogram')
+    for route, values in collected.items():
+        for bound, name in zip(DURATION_BUCKETS, BUCKETS):
+            labels = format_labels(route=route, le=bound)
+            lines.append(f'{metric}_bucket{{{labels}}} {values[name]}')
+        labels = format_labels(route=route, le='+Inf')
+        lines.append(f'{metric}_bucket{{{labels}}} {values["requests"]}')
+        labels = format_labels(route=route)
+        lines.append(
+            f'{metric}_sum{{{labels}}} '
+            f'{values["duration_us"] / MICROSECONDS}'
+        )
+        lines.append(f'{metric}_count{{{labels}}} {values["requests"]}')
+    for (metric, help_text, label), samples in counters.items():
+        add_counter(metric, help_text, [
+            (format_labels(**{label: name}), value)
+            for name, value in samples.items()
+        ])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,43 @@
+import time
+
+from .metrics import (UNMATCHED_ROUTE, RequestMetrics, check_query_budget,
+                      current_metrics, registry)
+
+
+class RequestMetricsMiddleware:
+    """
+    Считает SQL-запросы, время в БД, время отрисовки ответа рендерером и
+    общее время запроса по имени маршрута. Время сериализации считает
+    SerializationMetricsMixin
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        duration = time.perf_counter() - started
+        route = (
+            getattr(request.resolver_match, 'url_name', None)
+            or UNMATCHED_ROUTE
+        )
+        registry.observe(route, metrics, duration)
+        check_query_budget(request.method, route, metrics.queries)
+        return response
+
+    def process_template_response(self, request, response):
+        metrics = current_metrics.get()
+        started = time.perf_counter()
+
+        def finish_render(response):
+            metrics.render_time += time.perf_counter() - started
+
+        if metrics is not None:
+            response.add_post_render_callback(finish_render)
+        return response
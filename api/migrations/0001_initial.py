@@ -0,0 +1,27 @@
+# Generated by Django 3.2 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReleaseStep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('applied_at', models.DateTimeField(auto_now=True, verbose_name='Дата выполнения')),
+            ],
+            options={
+                'verbose_name': 'Шаг подготовки релиза',
+                'verbose_name_plural': 'Шаги подготовки релиза',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class ReleaseStep(models.Model):
+    """Выполненный шаг подготовки релиза"""
+    name = models.CharField(max_length=64, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    applied_at = models.DateTimeField(
+        verbose_name='Дата выполнения',
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = 'Шаг подготовки релиза'
+        verbose_name_plural = 'Шаги подготовки релиза'
+
+    def __str__(self):
+        return self.name
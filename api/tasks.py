@@ -1,62 +1,138 @@
 # from datetime import timedelta
+import time
+
 from celery import shared_task
 from celery.schedules import crontab
 from celery.utils.log import get_task_logger
-from django.db.models import F, Max, OuterRef, Subquery
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
 
 from alfa_people.celery import app as celery_app
 from plans.models import IDP, StatusIDP
+from plans.statistics import track_statistics
+from users.models import Employee
 
 logger = get_task_logger(__name__)
 
+IDP_STATUS_COUNTDOWN = 2
+IDP_STATUS_PENDING_TIMEOUT = 300
+IDP_STATUS_PENDING_KEY = 'idp_status_pending:{}'
+IDP_STATUS_METRIC_KEY = 'idp_status_metric:{}'
+IDP_STATUS_METRICS = ('scheduled', 'merged', 'executed')
+EXPIRABLE_STATUSES = ['open', 'in_progress', 'awaiting_review']
+EXPIRE_BATCH_SIZE = 1000
+
+
+def increment_idp_status_metric(name):
+    """Увеличивает счетчик пересчетов статуса ИПР"""
+    key = IDP_STATUS_METRIC_KEY.format(name)
+    cache.add(key, 0, None)
+    cache.incr(key)
+
+
+def get_idp_status_metrics():
+    """
+    Возвращает счетчики запланированных, объединенных и выполненных
+    пересчетов статуса ИПР
+    """
+    keys = {
+        name: IDP_STATUS_METRIC_KEY.format(name)
+        for name in IDP_STATUS_METRICS
+    }
+    values = cache.get_many(keys.values())
+    return {name: values.get(key, 0) for name, key in keys.items()}
+
+
+def schedule_determine_status_idp(idp_id):
+    """
+    Планирует пересчет статуса ИПР, объединяя частые изменения.
+    Ключ ожидания снимает сама задача перед чтением счетчиков, поэтому
+    изменения после этого планируют новый пересчет. Срок жизни ключа нужен
+    только на случай потерянной задачи. Без общего кэша ключ не виден
+    воркеру, и каждое изменение планирует свой пересчет
+    """
+    if settings.IDP_STATUS_COALESCE and not cache.add(
+        IDP_STATUS_PENDING_KEY.format(idp_id), True,
+        IDP_STATUS_PENDING_TIMEOUT
+    ):
+        increment_idp_status_metric('merged')
+        return
+    determine_status_idp_by_task.apply_async(
+        args=[idp_id], countdown=IDP_STATUS_COUNTDOWN
+    )
+    increment_idp_status_metric('scheduled')
+
 
 @shared_task()
 def determine_status_idp_by_task(idp_id):
     """Запускает проверку статуса ИПР после изменения статуса задачи в ИПР"""
+    if settings.IDP_STATUS_COALESCE:
+        cache.delete(IDP_STATUS_PENDING_KEY.format(idp_id))
+    increment_idp_status_metric('executed')
     instance = IDP.objects.get(pk=idp_id)
-    if instance.task.exists():
-        instance.status = determine_status_idp(instance)
-        instance.save()
+    if instance.task_count:
+        new_status = determine_status_idp(instance)
+        if new_status is None:
+            new_status = StatusIDP.objects.get_or_create_cached('open')
+        if new_status.id != instance.status_id:
+            instance.status = new_status
+            instance.save(update_fields=['status'])
 
 
 def determine_status_idp(instance):
     """Проверяет какой статус у ИПР должен быть"""
-    if not instance.task.exclude(status__slug='completed').exists():
-        return StatusIDP.objects.get(slug='awaiting_review')
-    elif instance.task.filter(
-        status__slug__in=['in_progress', 'completed']
-    ).exists():
-        return StatusIDP.objects.get(slug='in_progress')
+    if instance.task_done_count == instance.task_count:
+        return StatusIDP.objects.get_cached('awaiting_review')
+    elif instance.task_in_progress_count or instance.task_done_count:
+        return StatusIDP.objects.get_cached('in_progress')
+
+
+def expire_overdue_idps(now=None, batch_size=EXPIRE_BATCH_SIZE):
+    """
+    Переводит просроченные текущие ИПР сотрудников в статус expired
+    пакетными UPDATE по диапазонам id и возвращает их количество
+    """
+    now = now or timezone.now()
+    expired_status = StatusIDP.objects.get_cached('expired')
+    overdue_idps = IDP.objects.filter(
+        status__in=StatusIDP.objects.filter(slug__in=EXPIRABLE_STATUSES),
+        deadline__lt=now,
+        id__in=Employee.objects.values('current_idp'),
+    )
+    expired = 0
+    last_id = 0
+    while True:
+        batch = list(
+            overdue_idps.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'employee'
+            )[:batch_size]
+        )
+        if not batch:
+            return expired
+        last_id = batch[-1][0]
+        idp_ids = [idp_id for idp_id, _ in batch]
+        with transaction.atomic():
+            with track_statistics({employee for _, employee in batch}):
+                expired += overdue_idps.filter(id__in=idp_ids).update(
+                    status=expired_status, updated_at=timezone.now()
+                )
 
 
 @shared_task()
 def check_idp_statuses_by_deadline():
     """Запускает проверку ИПР по дедлайну"""
+    started = time.monotonic()
     try:
-        latest_idps = IDP.objects.annotate(
-            max_pub_date=Max('pub_date')
-        ).filter(
-            pub_date=F('max_pub_date')
-        ).order_by('employee', '-pub_date')
-
-        subquery = latest_idps.filter(
-            employee=OuterRef('employee')
-        ).values('id')[:1]
-
-        result = IDP.objects.filter(id__in=Subquery(subquery))
-
-        new_status = StatusIDP.objects.get(slug='expired')
-        for idp in result:
-            if (
-                idp.status.slug in ['open', 'in_progress', 'awaiting_review']
-                and idp.deadline
-                and idp.deadline < timezone.now()
-            ):
-                idp.status = new_status
-                idp.save()
+        expired = expire_overdue_idps()
     except Exception as e:
         logger.error(f'Error in check_idp_statuses: {e}', exc_info=True)
+        return None
+    logger.info(
+        f'Expired {expired} IDPs in {time.monotonic() - started:.2f}s'
+    )
+    return expired
 
 
 celery_app.conf.beat_schedule = {
@@ -0,0 +1,72 @@
+from unittest import mock
+
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.metrics import RequestMetrics, current_metrics, registry
+from api.v1.serializers import TaskSerializer
+from plans.models import StatusTask, Task
+from plans.tests.fixtures import CleanCacheMixin, create_manager, create_user
+
+
+class MetricsEndpointTests(CleanCacheMixin, APITestCase):
+    """Метрики запросов в формате Prometheus"""
+
+    def setUp(self):
+        super().setUp()
+        registry.flush()
+        self.manager_user = create_manager('manager_metrics').user
+        self.staff_user = create_user('staff_metrics', is_staff=True)
+
+    def test_route_metrics(self):
+        self.client.force_authenticate(user=self.manager_user)
+        self.client.get('/api/v1/employees/')
+        self.client.get('/api/v1/employees/')
+        self.client.force_authenticate(user=None)
+        self.client.force_login(self.staff_user)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        text = response.content.decode()
+        self.assertIn('api_requests_total{route="employee-list"} 2\n', text)
+        self.assertIn(
+            'api_request_duration_seconds_count{route="employee-list"} 2\n',
+            text
+        )
+        self.assertIn('idp_detail_cache_total{result="hit"} 0\n', text)
+        self.assertIn(
+            'api_request_serialize_seconds_total{route="employee-list"}', text
+        )
+
+    def test_nested_serializers_are_timed_once(self):
+        task = Task(
+            id=1,
+            name='Задача',
+            status=StatusTask(id=1, name='Открыта', slug='open'),
+        )
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            with mock.patch(
+                'api.metrics.time.perf_counter', side_effect=[10, 12]
+            ):
+                TaskSerializer(task).data
+        finally:
+            current_metrics.reset(token)
+        self.assertEqual(metrics.serialize_time, 2)
+        self.assertFalse(metrics.serializing)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_access(self):
+        self.client.force_login(self.manager_user)
+        self.assertEqual(
+            self.client.get('/api/metrics/').status_code,
+            status.HTTP_403_FORBIDDEN
+        )
+        self.client.logout()
+        self.assertEqual(
+            self.client.get(
+                '/api/metrics/', HTTP_AUTHORIZATION='Bearer secret'
+            ).status_code,
+            status.HTTP_200_OK
+        )
@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from users.models import Manager
+
+
+class PrepareReleaseTests(TestCase):
+    """Подготовка релиза пропускает уже выполненные шаги"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'people.json')
+        self.write_people('Петров')
+        seed_commands = mock.patch(
+            'api.management.commands.prepare_release.SEED_COMMANDS',
+            [['import_people', self.path], ['rebuild_manager_statistics']],
+        )
+        seed_commands.start()
+        self.addCleanup(seed_commands.stop)
+
+    def write_people(self, last_name):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump([{
+                'username': 'boss', 'role': 'manager', 'last_name': last_name,
+            }], file)
+
+    def prepare_release(self, *args):
+        stdout = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('prepare_release', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_seed_runs_once(self):
+        with self.assertRaisesMessage(CommandError, 'not loaded'):
+            self.prepare_release('--check')
+        output = self.prepare_release()
+        self.assertIn('migrate: up to date', output)
+        self.assertIn('seed: done', output)
+        self.assertTrue(Manager.objects.filter(user__username='boss').exists())
+
+        with mock.patch(
+            'api.management.commands.prepare_release.call_command'
+        ) as call:
+            self.assertIn('seed: up to date', self.prepare_release())
+            self.prepare_release('--check')
+        call.assert_not_called()
+
+        self.write_people('Иванов')
+        self.assertIn('seed: done', self.prepare_release())
+        self.assertEqual(
+            get_user_model().objects.get(username='boss').last_name, 'Иванов'
+        )
@@ -0,0 +1,74 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from alfa_people.celery import app as celery_app
+from api.tasks import (check_idp_statuses_by_deadline,
+                       determine_status_idp_by_task, expire_overdue_idps)
+from plans.models import IDP, ManagerStatistics, StatusIDP
+from plans.statistics import (find_inconsistent_statistics,
+                              rebuild_manager_statistics)
+from plans.tests.fixtures import create_employee, create_idp, create_manager
+
+
+class CeleryRoutingTests(TestCase):
+    """Пересчет статусов не стоит в очереди за пакетными задачами"""
+
+    def test_queues(self):
+        for task, queue in (
+            (determine_status_idp_by_task, 'interactive'),
+            (check_idp_statuses_by_deadline, 'maintenance'),
+        ):
+            with self.subTest(task=task.name):
+                self.assertEqual(
+                    celery_app.amqp.router.route({}, task.name)['queue'].name,
+                    queue
+                )
+
+
+class ExpireOverdueIDPsTests(TestCase):
+    """Перевод просроченных ИПР в статус expired"""
+
+    def setUp(self):
+        self.statuses = {
+            slug: StatusIDP.objects.create(name=slug, slug=slug)
+            for slug in ('open', 'in_progress', 'completed', 'expired')
+        }
+        self.manager = create_manager('manager_expire')
+        self.employees = [
+            create_employee(f'employee_expire_{number}', head=self.manager)
+            for number in range(3)
+        ]
+
+    def create_idp(self, employee, status, days):
+        idp = create_idp(
+            self.manager, employee, status=self.statuses[status]
+        )
+        IDP.objects.filter(id=idp.id).update(
+            deadline=timezone.now() + timezone.timedelta(days=days)
+        )
+        return idp
+
+    def assertStatus(self, idp, slug):
+        idp.refresh_from_db()
+        self.assertEqual(idp.status.slug, slug)
+
+    def test_only_latest_overdue_idps_expire(self):
+        previous = self.create_idp(self.employees[0], 'open', -3)
+        overdue = self.create_idp(self.employees[0], 'in_progress', -1)
+        in_time = self.create_idp(self.employees[1], 'open', 3)
+        completed = self.create_idp(self.employees[2], 'completed', -1)
+        rebuild_manager_statistics()
+
+        self.assertEqual(expire_overdue_idps(batch_size=1), 1)
+        self.assertStatus(previous, 'open')
+        self.assertStatus(overdue, 'expired')
+        self.assertStatus(in_time, 'open')
+        self.assertStatus(completed, 'completed')
+        self.assertEqual(find_inconsistent_statistics(), [])
+        self.assertEqual(
+            ManagerStatistics.objects.get(
+                manager=self.manager
+            ).count_idp_with_status_not_done,
+            1
+        )
+        self.assertEqual(expire_overdue_idps(), 0)
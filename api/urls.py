@@ -3,6 +3,9 @@ from django.urls import include, path
 
 from alfa_people.urls import VERSION_API
 
+from .views import metrics
+
 urlpatterns = [
     path(f'v{VERSION_API}/', include(f'api.v{VERSION_API}.urls')),
+    path('metrics/', metrics, name='metrics'),
 ]
@@ -0,0 +1,111 @@
+from django.utils.functional import cached_property
+
+from plans.models import IDP, Task
+from users.models import Employee
+
+
+class RequestAccess:
+    """
+    Объекты, от которых зависит доступ к запросу: профиль пользователя,
+    сотрудник, ИПР и задача из url. Каждый загружается не больше одного
+    раза и используется разрешениями, вьюсетом и сериализатором
+    """
+
+    def __init__(self, request, view):
+        self.user = request.user
+        self.kwargs = view.kwargs
+        self.idp_url_kwarg = getattr(view, 'idp_url_kwarg', 'idp_id')
+
+    def get_kwarg(self, name):
+        value = self.kwargs.get(name)
+        try:
+            return int(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    @cached_property
+    def manager(self):
+        """Профиль руководителя текущего пользователя"""
+        if self.user.role != 'manager':
+            return None
+        return getattr(self.user, 'manager_profile', None)
+
+    @cached_property
+    def employee_profile(self):
+        """Профиль сотрудника текущего пользователя"""
+        if self.user.role != 'employee':
+            return None
+        return getattr(self.user, 'employee_profile', None)
+
+    @cached_property
+    def employee(self):
+        """Сотрудник из url"""
+        employee_id = self.get_kwarg('employee_id')
+        if employee_id is None:
+            return None
+        return Employee.objects.filter(id=employee_id).first()
+
+    @cached_property
+    def task(self):
+        """Задача из url вместе с ИПР и его сотрудником"""
+        task_id = self.get_kwarg('task_id')
+        if task_id is None:
+            return None
+        return Task.objects.select_related(
+            'idp__employee'
+        ).filter(id=task_id).first()
+
+    @cached_property
+    def idp(self):
+        """ИПР из url или ИПР задачи из url"""
+        idp_id = self.get_kwarg(self.idp_url_kwarg)
+        if idp_id is None:
+            return self.task.idp if self.task else None
+        if self.task and self.task.idp_id == idp_id:
+            return self.task.idp
+        return IDP.objects.select_related('employee').filter(
+            id=idp_id
+        ).first()
+
+    @cached_property
+    def is_mentor_of_employee(self):
+        """Является ли пользователь ментором в ИПР сотрудника из url"""
+        employee_id = self.get_kwarg('employee_id')
+        if self.employee_profile is None or employee_id is None:
+            return False
+        return IDP.objects.filter(
+            employee=employee_id, mentor=self.employee_profile
+        ).exists()
+
+    def is_head(self, employee):
+        """Является ли пользователь руководителем сотрудника"""
+        return (
+            self.manager is not None
+            and employee is not None
+            and employee.head_id == self.manager.id
+        )
+
+    def is_employee(self, employee):
+        """Является ли пользователь этим сотрудником"""
+        return (
+            self.employee_profile is not None
+            and employee is not None
+            and employee.id == self.employee_profile.id
+        )
+
+    def is_mentor(self, idp):
+        """Является ли пользователь ментором ИПР"""
+        return (
+            self.employee_profile is not None
+            and idp is not None
+            and idp.mentor_id == self.employee_profile.id
+        )
+
+
+def get_access(request, view):
+    """Возвращает общий для запроса объект RequestAccess"""
+    access = getattr(request, '_access', None)
+    if access is None:
+        access = RequestAccess(request, view)
+        request._access = access
+    return access
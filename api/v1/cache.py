@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .conditional import version_hash
+
+IDP_DETAIL_CACHE_KEY = 'idp_detail:{}:{}'
+IDP_DETAIL_METRIC_KEY = 'idp_detail_cache:{}'
+IDP_DETAIL_METRICS = ('hit', 'miss')
+
+
+def increment_idp_detail_metric(name):
+    """Увеличивает счетчик попаданий или промахов кэша ИПР"""
+    key = IDP_DETAIL_METRIC_KEY.format(name)
+    cache.add(key, 0, None)
+    cache.incr(key)
+
+
+def get_idp_detail_metrics():
+    """Возвращает счетчики попаданий и промахов кэша ИПР"""
+    keys = {
+        name: IDP_DETAIL_METRIC_KEY.format(name)
+        for name in IDP_DETAIL_METRICS
+    }
+    values = cache.get_many(keys.values())
+    return {name: values.get(key, 0) for name, key in keys.items()}
+
+
+def idp_detail_cache_key(idp_id, version):
+    """Ключ кэша данных ИПР в переданной версии"""
+    return IDP_DETAIL_CACHE_KEY.format(idp_id, version_hash(version))
+
+
+def get_idp_detail(idp_id, version, serialize):
+    """
+    Возвращает данные ИПР из кэша по id и версии, а при промахе
+    сериализует и сохраняет их. Любое изменение ИПР, его задач или
+    ментора меняет версию, поэтому устаревшие данные не читаются и
+    просто истекают
+    """
+    key = idp_detail_cache_key(idp_id, version)
+    data = cache.get(key)
+    if data is not None:
+        increment_idp_detail_metric('hit')
+        return data
+    increment_idp_detail_metric('miss')
+    data = serialize()
+    cache.set(key, data, settings.IDP_DETAIL_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,85 @@
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from plans.models import IDP, StatusIDP, StatusTask
+
+REFERENCE_MODELS = (StatusIDP, StatusTask)
+
+
+def version_hash(version):
+    """
+    Хэш версии ресурса вместе с версиями справочников статусов,
+    так как их названия и цвета попадают в ответ
+    """
+    reference_versions = cache.get_many(
+        [model.objects.version_key for model in REFERENCE_MODELS]
+    )
+    parts = [*version, *sorted(reference_versions.items())]
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def make_etag(request, version):
+    """
+    Собирает ETag из версии ресурса и пользователя, так как ответ
+    зависит от его роли
+    """
+    return quote_etag(version_hash([request.user.pk, *version]))
+
+
+def conditional_get(get_version):
+    """
+    Декоратор действия вьюсета, отвечающий 304 Not Modified, если версия
+    ресурса не изменилась. get_version(view) возвращает время последнего
+    изменения и кортеж версии или None, если ресурс не найден
+    """
+    def decorator(action):
+        @wraps(action)
+        def wrapper(view, request, *args, **kwargs):
+            version = get_version(view)
+            if version is None:
+                return action(view, request, *args, **kwargs)
+            last_modified, parts = version
+            etag = make_etag(request, parts)
+            timestamp = (
+                int(last_modified.timestamp()) if last_modified else None
+            )
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is None:
+                response = action(view, request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if timestamp is not None:
+                    response['Last-Modified'] = http_date(timestamp)
+            return response
+        return wrapper
+    return decorator
+
+
+def latest(*values):
+    """Возвращает наибольшее из значений, пропуская None"""
+    return max((value for value in values if value is not None), default=None)
+
+
+def employees_version(employees):
+    """
+    Версия выборки сотрудников: время изменения и количество самих
+    сотрудников и ИПР, в которых они исполнители или менторы
+    """
+    employee_ids = employees.values('id')
+    employee_version = employees.order_by().aggregate(
+        updated_at=Max('updated_at'), count=Count('id')
+    )
+    idp_version = IDP.objects.filter(
+        Q(employee__in=employee_ids) | Q(mentor__in=employee_ids)
+    ).aggregate(updated_at=Max('updated_at'), count=Count('id'))
+    return (
+        latest(employee_version['updated_at'], idp_version['updated_at']),
+        (*employee_version.values(), *idp_version.values()),
+    )
@@ -0,0 +1,34 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+EMPLOYEE_PAGE_SIZE = 50
+IDP_PAGE_SIZE = 20
+COMMENT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+class EmployeePagination(PageNumberPagination):
+    """Постраничный вывод сотрудников"""
+    page_size = EMPLOYEE_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class PubDateCursorPagination(CursorPagination):
+    """
+    Вывод по курсору в порядке создания. Курсор строится по pub_date,
+    а id делает порядок устойчивым при совпадении дат
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class IDPCursorPagination(PubDateCursorPagination):
+    """Вывод ИПР сотрудника, начиная с последних"""
+    page_size = IDP_PAGE_SIZE
+    ordering = ('-pub_date', '-id')
+
+
+class CommentCursorPagination(PubDateCursorPagination):
+    """Вывод комментариев в хронологическом порядке"""
+    page_size = COMMENT_PAGE_SIZE
+    ordering = ('pub_date', 'id')
@@ -1,61 +1,43 @@
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from rest_framework.permissions import BasePermission
 
-from plans.models import IDP, Task
-from users.models import Employee, Manager
+from plans.models import IDP
+
+from .access import get_access
 
 
 class IsManagerIDP(BasePermission):
     """Является ли пользователь руководителем сотрудника ИПР"""
 
     def has_permission(self, request, view):
-        employee_id = view.kwargs.get('employee_id')
-
-        if request.user.role == 'manager':
-            try:
-                employee = Employee.objects.get(id=employee_id)
-                return request.user.manager_profile.id == employee.head.id
-            except Employee.DoesNotExist:
-                return False
-
-        return False
+        access = get_access(request, view)
+        return access.is_head(access.employee)
 
 
 class IsEmployeeIDP(BasePermission):
     """Является ли пользователь сотрудником у ИПР"""
 
     def has_permission(self, request, view):
-        employee_id = view.kwargs.get('employee_id')
-
-        if request.user.role == 'employee':
-            return request.user.employee_profile.id == int(employee_id)
+        access = get_access(request, view)
+        return (
+            access.employee_profile is not None
+            and access.employee_profile.id == access.get_kwarg('employee_id')
+        )
 
 
 class IsMentorIDP(BasePermission):
     """Является ли пользователь ментором сотрудника у ИПР"""
 
     def has_permission(self, request, view):
-        employee_id = view.kwargs.get('employee_id')
-        idp_pk = view.kwargs.get('pk') if 'pk' in view.kwargs else None
-
-        if request.user.role == 'employee':
-            if idp_pk:
-                try:
-                    employee = Employee.objects.get(id=employee_id)
-                    IDP.objects.get(
-                        id=idp_pk,
-                        employee=employee,
-                        mentor=request.user.employee_profile.id
-                    )
-                    return True
-                except IDP.DoesNotExist:
-                    return False
-            return IDP.objects.filter(
-                employee=employee_id,
-                mentor=request.user.employee_profile.id
-            ).exists()
-
-        return False
+        access = get_access(request, view)
+        if access.get_kwarg(access.idp_url_kwarg) is not None:
+            idp = access.idp
+            return (
+                idp is not None
+                and idp.employee_id == access.get_kwarg('employee_id')
+                and access.is_mentor(idp)
+            )
+        return access.is_mentor_of_employee
 
 
 class IsManagerandEmployee(BasePermission):
@@ -83,35 +65,20 @@ class IsManagerandEmployee(BasePermission):
         return False
 
 
-class IsEmployeeIDPExecutorMentorOrManager(IsEmployeeIDP):
+class IsEmployeeIDPExecutorMentorOrManager(BasePermission):
     """
     Является ли пользователь исполнителем ИПР,
     ментором или руководителем
     """
 
-    def check_permission(self, user, employee):
-        if not hasattr(user, 'employee_profile'):
-            return False
-        return user.employee_profile.id == employee.id
-
     def has_permission(self, request, view):
-        idp_id = view.kwargs.get('idp_id')
-        idp = get_object_or_404(IDP, id=idp_id)
-
-        employee = idp.employee
+        access = get_access(request, view)
+        idp = access.idp
+        if idp is None:
+            raise Http404
         if request.data['status_slug'] in ['open']:
-            if idp.mentor:
-                if idp.mentor.user == request.user:
-                    return True
-            try:
-                head = Manager.objects.get(user=request.user)
-                if head == employee.head:
-                    return True
-            except Manager.DoesNotExist:
-                pass
-            return False
-        else:
-            return self.check_permission(request.user, employee)
+            return access.is_mentor(idp) or access.is_head(idp.employee)
+        return access.is_employee(idp.employee)
 
 
 class Comments(BasePermission):
@@ -121,36 +88,12 @@ class Comments(BasePermission):
     """
 
     def has_permission(self, request, view):
-        idp_id = view.kwargs.get('idp_id', None)
-        task_id = view.kwargs.get('task_id', None)
-        current_user = request.user
-
-        def is_manager_author(idp):
-            """Является ли пользователь руководителем сотрудника"""
-            return idp.employee.head == current_user.manager_profile
-
-        def is_employee_or_mentor(idp):
-            """Связан ли пользователь с ИПР как сотрудник или ментор"""
-            return (
-                idp.employee == current_user.employee_profile or
-                idp.mentor == current_user.employee_profile
-            )
-
-        def get_idp():
-            """Получает объет ИПР"""
-            if idp_id:
-                return IDP.objects.get(id=idp_id)
-            elif task_id:
-                task = Task.objects.get(id=task_id)
-                return task.idp
-
-        try:
-            idp = get_idp()
-            if current_user.role == 'manager':
-                return is_manager_author(idp)
-            elif current_user.role == 'employee':
-                return is_employee_or_mentor(idp)
-        except (IDP.DoesNotExist, Task.DoesNotExist):
+        access = get_access(request, view)
+        idp = access.idp
+        if idp is None:
             return False
-
+        if request.user.role == 'manager':
+            return access.is_head(idp.employee)
+        elif request.user.role == 'employee':
+            return access.is_employee(idp.employee) or access.is_mentor(idp)
         return False
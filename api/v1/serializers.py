@@ -1,18 +1,90 @@
-from django.shortcuts import get_object_or_404
-from django.db.models import Max
+from django.db.models import (Exists, F, IntegerField, OuterRef, Prefetch, Q,
+                              Subquery, prefetch_related_objects)
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils import timezone
+from django.utils.encoding import smart_str
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
-from plans.models import (IDP, IdpComment, StatusIDP, StatusTask, Task,
-                          TaskComment)
+from api.metrics import SerializationMetricsMixin
+from plans.models import (IDP, TASK_COUNTERS, IdpComment, ManagerStatistics,
+                          StatusIDP, StatusTask, Task, TaskComment, TypeTask)
+from plans.statistics import (STATISTICS_AGGREGATES, delete_tasks_in_bulk,
+                              format_statistics, track_statistics)
 from users.models import Employee, Manager
 
 User = get_user_model()
 
 
-class EmployeeOrMentorSerializer(serializers.ModelSerializer):
+class SubqueryCount(Subquery):
+    """Подзапрос, возвращающий кол-во строк выборки"""
+
+    template = '(SELECT COUNT(*) FROM (%(subquery)s) _count)'
+    output_field = IntegerField()
+
+    def __init__(self, queryset, **kwargs):
+        super().__init__(queryset.order_by().values('pk'), **kwargs)
+
+
+class CachedSlugRelatedField(serializers.SlugRelatedField):
+    """Поле справочника по slug, разрешаемое через кэш процесса"""
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        try:
+            return model.objects.get_cached(slug=str(data))
+        except model.DoesNotExist:
+            self.fail(
+                'does_not_exist',
+                slug_name=self.slug_field,
+                value=smart_str(data)
+            )
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Поле справочника по pk, разрешаемое через кэш процесса"""
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        try:
+            return model.objects.get_cached(pk=int(data))
+        except model.DoesNotExist:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+ACTIVE_IDP_ERROR = {
+    'status': 'Сотрудник не может иметь несколько активных ИПР'
+}
+
+
+def has_active_idp(employees):
+    """
+    Проверяет, есть ли у сотрудников активный текущий ИПР.
+    Сотрудники выбираются отдельным запросом, чтобы сработала
+    блокировка select_for_update
+    """
+    current_idps = employees.exclude(
+        current_idp=None
+    ).values_list('current_idp', flat=True)
+    return IDP.objects.filter(
+        id__in=list(current_idps),
+        status__slug__in=['open', 'in_progress', 'awaiting_review'],
+    ).exists()
+
+
+def latest_idp_with_tasks_id(employee):
+    """Подзапрос id последнего ИПР сотрудника с задачами"""
+    return Subquery(IDP.objects.filter(
+        employee=employee, task_count__gt=0
+    ).order_by('-pub_date', '-id').values('id')[:1])
+
+
+class EmployeeOrMentorSerializer(
+    SerializationMetricsMixin, serializers.ModelSerializer
+):
     """Возвращает объект Employee"""
 
     last_name = serializers.ReadOnlyField(source='user.last_name')
@@ -31,7 +103,9 @@ class EmployeeOrMentorSerializer(serializers.ModelSerializer):
         )
 
 
-class StatusIDPSerializer(serializers.ModelSerializer):
+class StatusIDPSerializer(
+    SerializationMetricsMixin, serializers.ModelSerializer
+):
     """Возвращает объекты модели StatusIDP"""
 
     class Meta:
@@ -39,7 +113,9 @@ class StatusIDPSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class StatusTaskSerializer(serializers.ModelSerializer):
+class StatusTaskSerializer(
+    SerializationMetricsMixin, serializers.ModelSerializer
+):
     """Возвращает объекты модели StatusTask"""
 
     class Meta:
@@ -47,7 +123,9 @@ class StatusTaskSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(
+    SerializationMetricsMixin, serializers.ModelSerializer
+):
     """Возвращает объекты модели Task"""
 
     status = StatusTaskSerializer()
@@ -68,6 +146,7 @@ class TaskCreateSerializer(serializers.ModelSerializer):
     """Обрабатывает POST-запросы к модели Task"""
 
     id = serializers.IntegerField(required=False)
+    type = CachedPrimaryKeyRelatedField(queryset=TypeTask.objects.all())
 
     class Meta:
         model = Task
@@ -80,7 +159,9 @@ class TaskCreateSerializer(serializers.ModelSerializer):
         )
 
 
-class IDPSerializer(serializers.ModelSerializer):
+class IDPSerializer(
+    SerializationMetricsMixin, serializers.ModelSerializer
+):
     """Возвращает список объектов всех ИПР конкретного сотрудника"""
 
     status = StatusIDPSerializer()
@@ -101,14 +182,16 @@ class IDPSerializer(serializers.ModelSerializer):
 
     def get_mentor(self, obj) -> bool:
         """Проверка есть ли ментор у ИПР"""
-        return obj.mentor is not None
+        return obj.mentor_id is not None
 
     def get_tasks(self, obj) -> bool:
         """Проверка есть ли задачи у ИПР"""
-        return obj.task.exists()
+        return obj.task_count > 0
 
 
-class IDPDetailSerializer(serializers.ModelSerializer):
+class IDPDetailSerializer(
+    SerializationMetricsMixin, serializers.ModelSerializer
+):
     """Возвращает объект конкретного ИПР конкретного сотрудника"""
 
     tasks = TaskSerializer(
@@ -143,9 +226,7 @@ class IDPDetailSerializer(serializers.ModelSerializer):
     })
     def get_statistic(self, obj) -> dict:
         """Возвращает кол-во задач и кол-во завершенных задач ИПР"""
-        count_task = obj.task.count()
-        task_done = obj.task.filter(status__slug='completed').count()
-        return {'count_task': count_task, 'task_done': task_done}
+        return {'count_task': obj.task_count, 'task_done': obj.task_done_count}
 
 
 class IDPCreateAndUpdateSerializer(serializers.ModelSerializer):
@@ -175,17 +256,8 @@ class IDPCreateAndUpdateSerializer(serializers.ModelSerializer):
         employee_id = self.context.get('employee_id')
         mentor = data.get('mentor', None)
         tasks_data = data.get('tasks', [])
-        last_idp = IDP.objects.filter(
-            employee=employee_id
-        ).order_by('-pub_date').first()
-
-        if (
-            last_idp and
-            last_idp.status.slug in ['open', 'in_progress', 'awaiting_review']
-        ):
-            raise serializers.ValidationError(
-                {'status': 'Сотрудник не может иметь несколько активных ИПР'}
-            )
+        if has_active_idp(Employee.objects.filter(id=employee_id)):
+            raise serializers.ValidationError(ACTIVE_IDP_ERROR)
 
         if mentor is not None:
             if mentor.head.id != author_manager:
@@ -240,50 +312,97 @@ class IDPCreateAndUpdateSerializer(serializers.ModelSerializer):
 
     def create_tasks(self, instance, tasks_data):
         """Создает задачи и прикрепляет их к ИПР"""
-        for task in tasks_data:
-            Task.objects.create(idp=instance, **task)
+        if not tasks_data:
+            return
+        default_status = StatusTask.objects.get_or_create_cached('open')
+        with track_statistics([instance.employee_id]):
+            Task.objects.bulk_create([
+                Task(idp=instance, status=default_status, **task_data)
+                for task_data in tasks_data
+            ])
 
     def create(self, validated_data):
         tasks_data = validated_data.pop('tasks', [])
         employee_id = self.context.get('employee_id')
-        instance = IDP.objects.create(
-            employee_id=employee_id,
-            **validated_data
-        )
-        self.create_tasks(instance, tasks_data)
+        with transaction.atomic():
+            if has_active_idp(
+                Employee.objects.select_for_update().filter(id=employee_id)
+            ):
+                raise serializers.ValidationError(ACTIVE_IDP_ERROR)
+            instance = IDP.objects.create(
+                employee_id=employee_id,
+                **validated_data
+            )
+            self.create_tasks(instance, tasks_data)
+            IDP.update_task_counters([instance.id])
+        instance.refresh_from_db(fields=TASK_COUNTERS)
         return instance
 
+    def get_changed_fields(self, task, task_data):
+        """Возвращает поля задачи, значения которых отличаются от новых"""
+        changed_fields = []
+        for key, value in task_data.items():
+            field = Task._meta.get_field(key)
+            if field.is_relation:
+                value = value.pk if value is not None else None
+            if getattr(task, field.attname) != value:
+                changed_fields.append(key)
+        return changed_fields
+
     def upgrade_tasks(self, instance, tasks_data):
-        """Создает новые или обновляет существующие задачи ИПР"""
+        """Создает новые, обновляет измененные и удаляет лишние задачи ИПР"""
         task_mapping = {task.id: task for task in instance.task.all()}
+        changed_tasks = []
+        changed_fields = set()
+        new_tasks_data = []
         for task_data in tasks_data:
             task_id = task_data.get('id')
             task = task_mapping.get(task_id, None)
 
             if task is not None:
-                for key, value in task_data.items():
-                    setattr(task, key, value)
-                task.save()
+                fields = self.get_changed_fields(task, task_data)
+                for key in fields:
+                    setattr(task, key, task_data[key])
+                if fields:
+                    changed_tasks.append(task)
+                    changed_fields.update(fields)
             elif task_id is not None:
                 raise serializers.ValidationError(
                     {'tasks': f'Задачи с id {task_id} нет у ИПР'}
                 )
             else:
                 self.validate_task_on_upgrade(task_data)
-                Task.objects.create(idp=instance, **task_data)
-
-        for task_id, task in task_mapping.items():
-            if task_id not in [data.get('id') for data in tasks_data]:
-                task.delete()
+                new_tasks_data.append(task_data)
+
+        if changed_tasks:
+            now = timezone.now()
+            for task in changed_tasks:
+                task.updated_at = now
+            Task.objects.bulk_update(
+                changed_tasks, [*changed_fields, 'updated_at']
+            )
+        removed_ids = task_mapping.keys() - {
+            task_data.get('id') for task_data in tasks_data
+        }
+        if removed_ids:
+            with track_statistics([instance.employee_id]):
+                with delete_tasks_in_bulk():
+                    Task.objects.filter(id__in=removed_ids).delete()
+        self.create_tasks(instance, new_tasks_data)
 
     def update(self, instance, validated_data):
         tasks_data = validated_data.pop('tasks', [])
-        instance = super().update(instance, validated_data)
-        self.upgrade_tasks(instance, tasks_data)
-        instance.save()
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            self.upgrade_tasks(instance, tasks_data)
+            IDP.update_task_counters([instance.id])
+        instance.refresh_from_db(fields=TASK_COUNTERS)
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects([instance], Prefetch(
+            'task', queryset=Task.objects.select_related('status')
+        ))
         return IDPDetailSerializer(instance).data
 
 
@@ -294,19 +413,15 @@ class IDPStatusUpdateSerializer(serializers.ModelSerializer):
         model = IDP
         fields = ['status']
 
-    status = serializers.SlugRelatedField(
+    status = CachedSlugRelatedField(
         queryset=StatusIDP.objects.all(),
         slug_field='slug',
     )
 
     def validate_status(self, value):
         current_idp = self.instance
-        employee = current_idp.employee
-        latest_idp_pub_date = IDP.objects.filter(
-            employee=employee
-        ).aggregate(latest_idp=Max('pub_date'))['latest_idp']
         allowed_slugs = ['cancelled', 'completed']
-        if current_idp.pub_date != latest_idp_pub_date:
+        if not current_idp.is_current():
             raise serializers.ValidationError(
                 'Нельзя менять статус старых ИПР'
             )
@@ -337,7 +452,9 @@ class IDPStatusUpdateSerializer(serializers.ModelSerializer):
         return StatusIDPSerializer(instance.status).data
 
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class EmployeeSerializer(
+    SerializationMetricsMixin, serializers.ModelSerializer
+):
     """Сериализатор для сотрудников."""
 
     idp = serializers.SerializerMethodField()
@@ -367,16 +484,65 @@ class EmployeeSerializer(serializers.ModelSerializer):
             False)
         super().__init__(*args, **kwargs)
 
-    def filter_idps(self, idps):
-        """Фильтрует ИПР в зависимости от роли пользователя"""
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Подгружает данные по ИПР для всей выборки сотрудников
+        за фиксированное число запросов
+        """
+        employee_idps = IDP.objects.filter(employee=OuterRef('pk'))
+        employee_idps_with_tasks = employee_idps.filter(task_count__gt=0)
+        latest_idps = IDP.objects.filter(
+            Q(employee__current_idp=F('id'))
+            | Q(id=latest_idp_with_tasks_id(OuterRef('employee')))
+        ).select_related('status', 'mentor')
+        return queryset.select_related('user').annotate(
+            total_idp_count=SubqueryCount(employee_idps),
+            total_idp_with_tasks_count=SubqueryCount(employee_idps_with_tasks),
+            total_completed_idps=SubqueryCount(
+                employee_idps.filter(status__slug='completed')
+            ),
+            total_completed_idps_with_tasks=SubqueryCount(
+                employee_idps_with_tasks.filter(status__slug='completed')
+            ),
+            is_mentor=Exists(IDP.objects.filter(mentor=OuterRef('pk'))),
+        ).prefetch_related(
+            Prefetch('IDP', queryset=latest_idps, to_attr='latest_idps')
+        )
+
+    def filter_idps(self, obj):
+        """
+        Возвращает последний ИПР сотрудника, кол-во ИПР и кол-во завершенных
+        ИПР в зависимости от роли пользователя
+        """
         user = self.context['request'].user
+        latest_idp = next(
+            (idp for idp in obj.latest_idps if idp.id == obj.current_idp_id),
+            None
+        )
 
         if user.role == 'manager' or (
-            idps.exists() and idps.last().mentor == user.employee_profile
+            latest_idp and latest_idp.mentor_id == user.employee_profile.id
         ):
-            return idps
-        else:
-            return idps.exclude(task__isnull=True)
+            return (
+                latest_idp,
+                obj.total_idp_count,
+                obj.total_completed_idps
+            )
+        if latest_idp and latest_idp.task_count:
+            return (
+                latest_idp,
+                obj.total_idp_with_tasks_count,
+                obj.total_completed_idps_with_tasks
+            )
+        latest_idp_with_tasks = next(
+            (idp for idp in obj.latest_idps if idp.task_count), None
+        )
+        return (
+            latest_idp_with_tasks,
+            obj.total_idp_with_tasks_count,
+            obj.total_completed_idps_with_tasks
+        )
 
     @extend_schema_field({
         'type': 'object',
@@ -390,22 +556,17 @@ class EmployeeSerializer(serializers.ModelSerializer):
         }
     })
     def get_idp(self, obj):
-        idps = self.filter_idps(obj.IDP.all())
-        latest_idp = idps.last() if idps.exists() else None
-        total_idp_count = idps.count()
+        latest_idp, total_idp_count, total_completed_idps = (
+            self.filter_idps(obj)
+        )
         if latest_idp:
-            completed_tasks_count = latest_idp.task.filter(
-                status__slug='completed').count()
-            total_completed_idps = idps.filter(
-                status__slug='completed').count()
-            total_tasks_count = latest_idp.task.count()
             return {
                 'status':
                 latest_idp.status.slug if latest_idp.status else 'none',
-                'has_task': latest_idp.task.exists() if latest_idp else False,
-                'completed_tasks_count': completed_tasks_count,
+                'has_task': latest_idp.task_count > 0,
+                'completed_tasks_count': latest_idp.task_done_count,
                 'total_completed_idps': total_completed_idps,
-                'total_tasks_count': total_tasks_count,
+                'total_tasks_count': latest_idp.task_count,
                 'total_idp_count': total_idp_count,
             }
         return {
@@ -419,24 +580,25 @@ class EmployeeSerializer(serializers.ModelSerializer):
 
     def get_mentor(self, obj) -> bool:
         """Проверяет, есть ли ментор у последнего ИПР пользователя"""
-        idps = self.filter_idps(obj.IDP.all())
-        latest_idp = idps.last() if idps.exists() else None
+        latest_idp, _, _ = self.filter_idps(obj)
         if latest_idp:
-            return bool(latest_idp.mentor)
+            return bool(latest_idp.mentor_id)
         return False
 
     def get_is_mentor(self, obj) -> bool:
         """Проверяет, является ли сотрудник ментором"""
-        return obj.IDP_mentor.exists()
+        return obj.is_mentor
 
 
-class HeadStatisticSerializer(serializers.ModelSerializer):
+class HeadStatisticSerializer(
+    SerializationMetricsMixin, serializers.ModelSerializer
+):
     """Возвращает статистику по руководителю"""
 
     statistics = serializers.SerializerMethodField()
 
     class Meta:
-        model = Manager
+        model = ManagerStatistics
         fields = ('statistics',)
 
     @extend_schema_field({
@@ -453,61 +615,9 @@ class HeadStatisticSerializer(serializers.ModelSerializer):
     })
     def get_statistics(self, obj):
         """Сериализатор статистики"""
-        employees = Employee.objects.filter(
-            head=obj.id
-        ).prefetch_related('IDP')
-        idps = IDP.objects.filter(
-            author=obj.id, employee__in=employees
-        ).prefetch_related('task')
-        tasks = Task.objects.filter(idp__in=idps)
-        current_idps = []
-
-        count_employe_with_idp = 0
-        count_idp_with_status_not_done = 0
-        count_idp_with_status_cancelled = 0
-        count_idp_status_review = 0
-        active_statuses = ['in_progress', 'open', 'awaiting_review']
-        for employee in employees:
-            idp = idps.filter(employee=employee).last()
-            if idp:
-                if idp.status.slug in active_statuses:
-                    count_employe_with_idp += 1
-                elif idp.status.slug == 'expired':
-                    count_idp_with_status_not_done += 1
-                elif idp.status.slug == 'cancelled':
-                    count_idp_with_status_cancelled += 1
-                if idp.status.slug == 'awaiting_review':
-                    count_idp_status_review += 1
-                current_idps.append(idp)
-        count_employe = employees.count()
-
-        idps_with_tasks = idps.filter(task__in=tasks)
-        count_idp_without_tasks = (
-            len(current_idps) - len(
-                set(current_idps).intersection(list(idps_with_tasks))
-            )
-        )
-
-        if count_employe:
-            percent_progress_employees = int(
-                100 * count_employe_with_idp / count_employe
-            )
-        else:
-            percent_progress_employees = None
-        count_employe_without_idp = (
-            count_employe - count_employe_with_idp
-        )
-        data = {
-            'count_employe': count_employe,
-            'count_employe_with_idp': count_employe_with_idp,
-            'percent_progress_employees': percent_progress_employees,
-            'count_employe_without_idp': count_employe_without_idp,
-            'count_idp_without_tasks': count_idp_without_tasks,
-            'count_idp_with_status_not_done': count_idp_with_status_not_done,
-            'count_idp_with_status_awaiting_review': count_idp_status_review,
-            'count_idp_with_status_cancelled': count_idp_with_status_cancelled
-        }
-        return data
+        return format_statistics({
+            field: getattr(obj, field) for field in STATISTICS_AGGREGATES
+        })
 
 
 class TaskStatusUpdateSerializer(serializers.ModelSerializer):
@@ -517,18 +627,13 @@ class TaskStatusUpdateSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def validate(self, attrs):
-        idp_id = self.instance.idp.id
-        idp = get_object_or_404(IDP, id=idp_id)
+        idp = self.instance.idp
         if idp.status.slug in ['completed', 'expired', 'cancelled']:
             raise serializers.ValidationError(
                 'Нельзя менять статус задач завершенных, '
                 'отмененных или просроченных ИПР'
             )
-        employee = idp.employee
-        latest_idp_pub_date = IDP.objects.filter(
-            employee=employee
-        ).aggregate(latest_idp=Max('pub_date'))['latest_idp']
-        if idp.pub_date != latest_idp_pub_date:
+        if not idp.is_current():
             raise serializers.ValidationError(
                 'Нельзя менять статус задач старого ИПР'
             )
@@ -555,14 +660,22 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
 
-class IDPCommentSerializer(serializers.ModelSerializer):
-    """Сериализатор комментариев к ИПР"""
+class CommentSerializer(
+    SerializationMetricsMixin, serializers.ModelSerializer
+):
+    """
+    Общий сериализатор комментариев к ИПР и задачам. Данные автора
+    собираются один раз на каждого автора в ветке
+    """
     author = serializers.SerializerMethodField()
 
     class Meta:
-        model = IdpComment
         fields = ('id', 'text', 'pub_date', 'author')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._authors = {}
+
     @extend_schema_field({
         'type': 'object',
         'properties': {
@@ -574,7 +687,11 @@ class IDPCommentSerializer(serializers.ModelSerializer):
         }
     })
     def get_author(self, obj):
-        user = obj.author
+        if obj.author_id not in self._authors:
+            self._authors[obj.author_id] = self.serialize_author(obj.author)
+        return self._authors[obj.author_id]
+
+    def serialize_author(self, user):
         idp = self.context.get('idp')
         author_data = {}
         if user.role == 'manager':
@@ -582,36 +699,44 @@ class IDPCommentSerializer(serializers.ModelSerializer):
             author_data['is_mentor'] = False
         elif user.role == 'employee':
             author_data.update(UserSerializer(user.employee_profile).data)
-            author_data['is_mentor'] = idp.mentor == user.employee_profile
+            author_data['is_mentor'] = (
+                idp.mentor_id == user.employee_profile.id
+            )
         return author_data
 
 
-class TaskCommentSerializer(serializers.ModelSerializer):
+class IDPCommentSerializer(CommentSerializer):
+    """Сериализатор комментариев к ИПР"""
+
+    class Meta(CommentSerializer.Meta):
+        model = IdpComment
+
+
+class TaskCommentSerializer(CommentSerializer):
     """Сериализатор комментариев к задаче"""
-    author = serializers.SerializerMethodField()
 
-    class Meta:
+    class Meta(CommentSerializer.Meta):
         model = TaskComment
-        fields = ('id', 'text', 'pub_date', 'author')
 
-    @extend_schema_field({
-        'type': 'object',
-        'properties': {
-            'id': {'type': 'integer'},
-                'first_name': {'type': 'string'},
-                'last_name': {'type': 'string'},
-                'middle_name': {'type': 'string'},
-            'is_mentor': {'type': 'boolean'}
-        }
-    })
-    def get_author(self, obj):
-        user = obj.author
-        idp = self.context.get('idp')
-        author_data = {}
-        if user.role == 'manager':
-            author_data.update(UserSerializer(user.manager_profile).data)
-            author_data['is_mentor'] = False
-        elif user.role == 'employee':
-            author_data.update(UserSerializer(user.employee_profile).data)
-            author_data['is_mentor'] = idp.mentor == user.employee_profile
-        return author_data
+
+class IDPExportFilterSerializer(serializers.Serializer):
+    """Фильтры выгрузки ИПР"""
+
+    manager = serializers.PrimaryKeyRelatedField(
+        queryset=Manager.objects.all(), required=False
+    )
+    status = CachedSlugRelatedField(
+        slug_field='slug', queryset=StatusIDP.objects.all(), required=False
+    )
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if (
+            'date_from' in data and 'date_to' in data
+            and data['date_from'] > data['date_to']
+        ):
+            raise serializers.ValidationError(
+                {'date_to': 'Дата окончания раньше даты начала'}
+            )
+        return data
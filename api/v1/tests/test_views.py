@@ -1,8 +1,28 @@
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
 
+from api.metrics import QueryBudgetExceeded
+from api.tasks import (IDP_STATUS_COUNTDOWN, determine_status_idp_by_task,
+                       expire_overdue_idps, get_idp_status_metrics)
+from api.v1.cache import get_idp_detail_metrics
+from plans import statistics
+from plans.models import (IDP, IdpComment, ManagerStatistics, StatusIDP,
+                          StatusTask, Task, TaskComment, TypeTask)
+from plans.statistics import (find_inconsistent_statistics,
+                              rebuild_manager_statistics)
+from plans.tests.fixtures import (CleanCacheMixin, create_employee,
+                                  create_idp, create_manager, create_statuses,
+                                  create_task, create_user)
 from users.models import Employee
 
 
@@ -44,3 +64,800 @@ class EmployeeViewSetTests(TestCase):
         unauthorized_client = APIClient()
         response = unauthorized_client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class EmployeeListQueryCountTests(APITestCase):
+    """Кол-во запросов к списку сотрудников не зависит от размера команды"""
+
+    def setUp(self):
+        self.manager = create_manager('manager_queries')
+        self.manager_user = self.manager.user
+        self.type_task = TypeTask.objects.create(name='Курс', slug='course')
+        self.completed = StatusTask.objects.create(
+            name='Выполнена', slug='completed'
+        )
+        self.client.force_authenticate(user=self.manager_user)
+        self.url = '/api/v1/employees/'
+
+    def add_employees(self, count):
+        for _ in range(count):
+            number = Employee.objects.count()
+            employee = create_employee(
+                f'employee_queries_{number}', head=self.manager
+            )
+            for _ in range(2):
+                idp = create_idp(self.manager, employee)
+                create_task(idp, type=self.type_task, status=self.completed)
+                create_task(idp, type=self.type_task)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context), response.data['results']
+
+    def test_query_count_does_not_grow_with_team_size(self):
+        self.add_employees(2)
+        small_team_queries, data = self.count_queries()
+        self.assertEqual(len(data), 2)
+
+        self.add_employees(10)
+        large_team_queries, data = self.count_queries()
+        self.assertEqual(len(data), 12)
+        self.assertEqual(small_team_queries, large_team_queries)
+
+    def test_latest_idp_statistics(self):
+        self.add_employees(1)
+        _, data = self.count_queries()
+        self.assertEqual(data[0]['idp'], {
+            'status': 'open',
+            'has_task': True,
+            'completed_tasks_count': 1,
+            'total_completed_idps': 0,
+            'total_tasks_count': 2,
+            'total_idp_count': 2,
+        })
+        self.assertFalse(data[0]['mentor'])
+        self.assertFalse(data[0]['is_mentor'])
+
+
+class HeadStatisticViewSetTests(APITestCase):
+    """Статистика руководителя читается из сводной таблицы"""
+
+    def setUp(self):
+        manager = create_manager('manager_statistics')
+        self.manager_user = manager.user
+        create_employee('employee_statistics', head=manager)
+        self.client.force_authenticate(user=self.manager_user)
+        self.url = '/api/v1/head/statistics/'
+
+    def test_statistics_built_on_first_read(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['statistics']['count_employe'], 1)
+        self.assertEqual(
+            response.data['statistics']['count_employe_without_idp'], 1
+        )
+        self.assertTrue(ManagerStatistics.objects.filter(
+            manager=self.manager_user.manager_profile
+        ).exists())
+
+    def test_concurrent_first_reads(self):
+        manager = self.manager_user.manager_profile
+        collect_statistics = statistics.collect_statistics
+        concurrent_reads = []
+
+        def build_concurrently(employees):
+            if not concurrent_reads:
+                concurrent_reads.append(manager.id)
+                rebuild_manager_statistics(managers=[manager.id])
+            return collect_statistics(employees)
+
+        with mock.patch.object(
+            statistics, 'collect_statistics', side_effect=build_concurrently
+        ):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['statistics']['count_employe'], 1)
+
+    def test_statistics_single_read(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(context), 1)
+
+
+class IDPCreateAndUpdateTests(APITestCase):
+    """Создание и редактирование ИПР с задачами"""
+
+    def setUp(self):
+        self.manager_user = create_manager('manager_idps').user
+        create_statuses('open')
+        self.type_task = TypeTask.objects.create(name='Курс', slug='course')
+        self.client.force_authenticate(user=self.manager_user)
+
+    def create_employee(self, username):
+        return create_employee(
+            username, head=self.manager_user.manager_profile
+        )
+
+    def task_data(self, number, **kwargs):
+        return {
+            'type': self.type_task.id,
+            'name': f'Задача {number}',
+            'description': 'Описание',
+            'source': 'Источник',
+            **kwargs
+        }
+
+    def create_idp(self, employee, task_count):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                f'/api/v1/employees/{employee.id}/idps/',
+                {
+                    'name': 'ИПР',
+                    'description': 'Описание',
+                    'deadline': (
+                        timezone.now() + timezone.timedelta(days=7)
+                    ).isoformat(),
+                    'tasks': [
+                        self.task_data(number) for number in range(task_count)
+                    ],
+                },
+                format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data, len(context)
+
+    def test_create_query_count_does_not_grow_with_tasks(self):
+        self.create_idp(self.create_employee('employee_warmup'), 1)
+        data, few_tasks_queries = self.create_idp(
+            self.create_employee('employee_few'), 2
+        )
+        self.assertEqual(data['statistic'], {'count_task': 2, 'task_done': 0})
+        data, many_tasks_queries = self.create_idp(
+            self.create_employee('employee_many'), 10
+        )
+        self.assertEqual(data['statistic'], {'count_task': 10, 'task_done': 0})
+        self.assertEqual(few_tasks_queries, many_tasks_queries)
+        self.assertEqual(
+            {task['status']['slug'] for task in data['tasks']}, {'open'}
+        )
+
+    def test_update_tasks(self):
+        employee = self.create_employee('employee_update')
+        data, _ = self.create_idp(employee, 3)
+        kept, changed, _ = data['tasks']
+        response = self.client.patch(
+            f'/api/v1/employees/{employee.id}/idps/{data["id"]}/',
+            {
+                'tasks': [
+                    self.task_data(0, id=kept['id'], name=kept['name']),
+                    self.task_data(1, id=changed['id'], name='Новое имя'),
+                    self.task_data(3),
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [task['name'] for task in response.data['tasks']],
+            [kept['name'], 'Новое имя', 'Задача 3']
+        )
+        self.assertEqual(
+            response.data['statistic'], {'count_task': 3, 'task_done': 0}
+        )
+
+    def test_remove_tasks_query_count_does_not_grow(self):
+        def remove_tasks(username, task_count):
+            employee = self.create_employee(username)
+            data, _ = self.create_idp(employee, task_count)
+            rebuild_manager_statistics()
+            kept = data['tasks'][0]
+            with self.settings(QUERY_BUDGETS_ENFORCE=True):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.patch(
+                        f'/api/v1/employees/{employee.id}/idps/{data["id"]}/',
+                        {'tasks': [self.task_data(0, id=kept['id'])]},
+                        format='json'
+                    )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                response.data['statistic'], {'count_task': 1, 'task_done': 0}
+            )
+            self.assertEqual(find_inconsistent_statistics(), [])
+            return len(context)
+
+        remove_tasks('employee_warmup', 2)
+        self.assertEqual(
+            remove_tasks('employee_few', 2), remove_tasks('employee_many', 30)
+        )
+
+    def test_update_unknown_task(self):
+        employee = self.create_employee('employee_unknown')
+        data, _ = self.create_idp(employee, 1)
+        response = self.client.patch(
+            f'/api/v1/employees/{employee.id}/idps/{data["id"]}/',
+            {'tasks': [self.task_data(0, id=0)]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Task.objects.filter(idp=data['id']).count(), 1)
+
+
+class TaskStatusChangeTests(CleanCacheMixin, APITestCase):
+    """Пересчет статуса ИПР после изменения статусов задач"""
+
+    def setUp(self):
+        super().setUp()
+        create_statuses('open', 'in_progress', 'awaiting_review', 'completed')
+        manager = create_manager('manager_tasks')
+        employee = create_employee('employee_tasks', head=manager)
+        self.employee_user = employee.user
+        self.idp = create_idp(manager, employee)
+        self.tasks = [create_task(self.idp) for _ in range(3)]
+        self.client.force_authenticate(user=self.employee_user)
+
+    def change_status(self, task, slug):
+        return self.client.patch(
+            f'/api/v1/idps/{self.idp.id}/tasks/{task.id}/status/',
+            {'status_slug': slug},
+            format='json'
+        )
+
+    @override_settings(IDP_STATUS_COALESCE=True)
+    @mock.patch('api.tasks.determine_status_idp_by_task.apply_async')
+    def test_status_changes_are_coalesced(self, apply_async):
+        for task in self.tasks:
+            response = self.change_status(task, 'completed')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        apply_async.assert_called_once_with(
+            args=[self.idp.id], countdown=IDP_STATUS_COUNTDOWN
+        )
+        metrics = get_idp_status_metrics()
+        self.assertEqual(metrics['scheduled'], 1)
+        self.assertEqual(metrics['merged'], 2)
+
+    @override_settings(IDP_STATUS_COALESCE=True)
+    @mock.patch('api.tasks.determine_status_idp_by_task.apply_async')
+    def test_change_after_recalculation_schedules_again(self, apply_async):
+        self.change_status(self.tasks[0], 'in_progress')
+        determine_status_idp_by_task(self.idp.id)
+        self.change_status(self.tasks[1], 'in_progress')
+        self.assertEqual(apply_async.call_count, 2)
+        self.assertEqual(get_idp_status_metrics()['merged'], 0)
+
+    @override_settings(IDP_STATUS_COALESCE=False)
+    @mock.patch('api.tasks.determine_status_idp_by_task.apply_async')
+    def test_status_changes_are_not_coalesced_without_shared_cache(
+        self, apply_async
+    ):
+        for task in self.tasks:
+            self.change_status(task, 'completed')
+        self.assertEqual(apply_async.call_count, len(self.tasks))
+        self.assertEqual(get_idp_status_metrics()['merged'], 0)
+
+    @mock.patch('api.tasks.determine_status_idp_by_task.apply_async')
+    def test_recalculation_updates_status(self, apply_async):
+        self.change_status(self.tasks[0], 'in_progress')
+        determine_status_idp_by_task(self.idp.id)
+        self.idp.refresh_from_db()
+        self.assertEqual(self.idp.status.slug, 'in_progress')
+
+        for task in self.tasks:
+            self.change_status(task, 'completed')
+        determine_status_idp_by_task(self.idp.id)
+        self.idp.refresh_from_db()
+        self.assertEqual(self.idp.status.slug, 'awaiting_review')
+
+
+class RequestAccessTests(CleanCacheMixin, APITestCase):
+    """Проверки доступа загружают объекты из url один раз за запрос"""
+
+    def setUp(self):
+        super().setUp()
+        create_statuses('open')
+        manager = create_manager('manager_access')
+        self.manager_user = manager.user
+        self.other_manager_user = create_manager('other_manager_access').user
+        mentor = create_employee('mentor_access', head=manager)
+        self.mentor_user = mentor.user
+        self.idp = create_idp(
+            manager, create_employee('employee_access', head=manager),
+            mentor=mentor,
+        )
+        self.task = create_task(self.idp)
+
+    def get(self, user, url):
+        self.client.force_authenticate(user=user)
+        return self.client.get(url)
+
+    def test_comment_permissions(self):
+        idp_url = f'/api/v1/idp/{self.idp.id}/comments/'
+        task_url = f'/api/v1/task/{self.task.id}/comments/'
+        for user, url, expected in (
+            (self.manager_user, idp_url, status.HTTP_200_OK),
+            (self.mentor_user, task_url, status.HTTP_200_OK),
+            (self.other_manager_user, idp_url, status.HTTP_403_FORBIDDEN),
+            (self.other_manager_user, task_url, status.HTTP_403_FORBIDDEN),
+        ):
+            with self.subTest(user=user.username, url=url):
+                self.assertEqual(self.get(user, url).status_code, expected)
+
+    def test_comment_list_queries(self):
+        for user, url in (
+            (self.manager_user, f'/api/v1/idp/{self.idp.id}/comments/'),
+            (self.mentor_user, f'/api/v1/task/{self.task.id}/comments/'),
+        ):
+            user = get_user_model().objects.get(pk=user.pk)
+            with self.subTest(user=user.username, url=url):
+                # ИПР или задача, профиль пользователя и комментарии
+                with self.assertNumQueries(3):
+                    response = self.get(user, url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ConditionalGetTests(CleanCacheMixin, APITestCase):
+    """Неизмененные ИПР и сотрудники отдаются ответом 304"""
+
+    def setUp(self):
+        super().setUp()
+        create_statuses('open')
+        manager = create_manager('manager_conditional')
+        self.manager_user = manager.user
+        self.employee = create_employee('employee_conditional', head=manager)
+        self.employee_user = self.employee.user
+        self.idp = create_idp(manager, self.employee)
+        self.task = create_task(self.idp)
+        self.idp_url = (
+            f'/api/v1/employees/{self.employee.id}/idps/{self.idp.id}/'
+        )
+        self.client.force_authenticate(user=self.manager_user)
+
+    def assertNotModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_idp_detail_is_not_serialized_when_unchanged(self):
+        response = self.client.get(self.idp_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+        with mock.patch(
+            'api.v1.serializers.IDPDetailSerializer.to_representation'
+        ) as to_representation:
+            self.assertNotModified(self.idp_url, etag)
+        to_representation.assert_not_called()
+
+        self.task.status = StatusTask.objects.create(
+            name='in_progress', slug='in_progress'
+        )
+        self.task.save()
+        etag = self.assertModified(self.idp_url, etag)
+        self.task.delete()
+        etag = self.assertModified(self.idp_url, etag)
+        self.assertNotModified(self.idp_url, etag)
+
+    def test_idp_list(self):
+        url = f'/api/v1/employees/{self.employee.id}/idps/'
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+        self.idp.name = 'Новое название'
+        self.idp.save()
+        self.assertModified(url, etag)
+
+    def test_employee_list_and_detail(self):
+        for url in (
+            '/api/v1/employees/', f'/api/v1/employees/{self.employee.id}/'
+        ):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertNotModified(url, etag)
+
+                self.employee_user.first_name = url
+                self.employee_user.save()
+                etag = self.assertModified(url, etag)
+                IDP.objects.create(
+                    author=self.manager_user.manager_profile,
+                    employee=self.employee,
+                    name='ИПР',
+                )
+                self.assertModified(url, etag)
+
+    def test_etag_depends_on_user(self):
+        url = f'/api/v1/employees/{self.employee.id}/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(user=self.employee_user)
+        self.assertModified(url, etag)
+
+
+class IDPDetailCacheTests(CleanCacheMixin, APITestCase):
+    """Кэш данных ИПР сбрасывается при любом изменении ИПР"""
+
+    def setUp(self):
+        super().setUp()
+        create_statuses('open', 'in_progress', 'expired')
+        manager = create_manager('manager_detail_cache')
+        self.manager_user = manager.user
+        employee = create_employee('employee_detail_cache', head=manager)
+        self.idp = create_idp(manager, employee)
+        self.task = create_task(self.idp)
+        self.url = f'/api/v1/employees/{employee.id}/idps/{self.idp.id}/'
+        self.client.force_authenticate(user=self.manager_user)
+
+    def get_status(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['status']['slug']
+
+    def test_cached_detail(self):
+        first = self.client.get(self.url)
+        # сотрудник из url и версия ИПР
+        with self.assertNumQueries(2):
+            second = self.client.get(self.url)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(get_idp_detail_metrics(), {'hit': 1, 'miss': 1})
+
+    def test_status_changes_invalidate_cache(self):
+        self.assertEqual(self.get_status(), 'open')
+
+        self.task.status = StatusTask.objects.get_cached('in_progress')
+        self.task.save()
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response.data['tasks'][0]['status']['slug'], 'in_progress'
+        )
+
+        determine_status_idp_by_task(self.idp.id)
+        self.assertEqual(self.get_status(), 'in_progress')
+
+        IDP.objects.filter(id=self.idp.id).update(
+            deadline=timezone.now() - timezone.timedelta(days=1)
+        )
+        expire_overdue_idps()
+        self.assertEqual(self.get_status(), 'expired')
+
+        expired = StatusIDP.objects.get(slug='expired')
+        expired.name = 'Просрочен'
+        with self.captureOnCommitCallbacks(execute=True):
+            expired.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['status']['name'], 'Просрочен')
+        self.assertEqual(get_idp_detail_metrics(), {'hit': 0, 'miss': 5})
+
+
+class PaginationTests(CleanCacheMixin, APITestCase):
+    """Постраничный вывод сотрудников, ИПР и комментариев"""
+
+    def setUp(self):
+        super().setUp()
+        create_statuses('open')
+        manager = create_manager('manager_pages')
+        self.manager_user = manager.user
+        self.employees = [
+            create_employee(f'employee_pages_{number}', head=manager)
+            for number in range(3)
+        ]
+        self.idps = [
+            create_idp(manager, self.employees[0], deadline=None)
+            for number in range(3)
+        ]
+        self.client.force_authenticate(user=self.manager_user)
+
+    def collect(self, url):
+        """Обходит все страницы курсора и возвращает id объектов"""
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_employee_pages(self):
+        response = self.client.get('/api/v1/employees/?page_size=2')
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [employee.id for employee in self.employees[:2]]
+        )
+        response = self.client.get(response.data['next'])
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.employees[2].id]
+        )
+
+    def test_idp_cursor_starts_with_latest(self):
+        self.assertEqual(
+            self.collect(
+                f'/api/v1/employees/{self.employees[0].id}/idps/?page_size=2'
+            ),
+            [idp.id for idp in reversed(self.idps)]
+        )
+
+    def test_comment_cursor_is_stable_for_equal_dates(self):
+        idp = self.idps[-1]
+        IdpComment.objects.bulk_create([
+            IdpComment(idp=idp, author=self.manager_user, text=str(number))
+            for number in range(5)
+        ])
+        IdpComment.objects.update(pub_date=timezone.now())
+        self.assertEqual(
+            self.collect(f'/api/v1/idp/{idp.id}/comments/?page_size=2'),
+            list(IdpComment.objects.order_by('id').values_list(
+                'id', flat=True
+            ))
+        )
+
+
+class CommentListQueryCountTests(CleanCacheMixin, APITestCase):
+    """Кол-во запросов к ветке комментариев не зависит от ее длины"""
+
+    def setUp(self):
+        super().setUp()
+        manager = create_manager('manager_comments')
+        self.manager_user = manager.user
+        employee = create_employee('employee_comments', head=manager)
+        self.mentor = create_employee('mentor_comments', head=manager)
+        self.authors = [self.manager_user, employee.user, self.mentor.user]
+        self.idp = create_idp(
+            manager, employee, mentor=self.mentor, deadline=None
+        )
+        self.task = create_task(self.idp)
+
+    def add_comments(self, model, count, **kwargs):
+        model.objects.bulk_create([
+            model(
+                author=self.authors[number % len(self.authors)],
+                text='Комментарий',
+                **kwargs
+            )
+            for number in range(count)
+        ])
+
+    def count_queries(self, url):
+        user = get_user_model().objects.get(pk=self.manager_user.pk)
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'page_size': 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context), response.data['results']
+
+    def test_query_count_does_not_grow_with_thread_length(self):
+        for model, url, kwargs in (
+            (IdpComment, f'/api/v1/idp/{self.idp.id}/comments/',
+             {'idp': self.idp}),
+            (TaskComment, f'/api/v1/task/{self.task.id}/comments/',
+             {'task': self.task}),
+        ):
+            with self.subTest(url=url):
+                self.add_comments(model, 3, **kwargs)
+                short_thread_queries, results = self.count_queries(url)
+                self.assertEqual(len(results), 3)
+
+                self.add_comments(model, 497, **kwargs)
+                long_thread_queries, results = self.count_queries(url)
+                self.assertEqual(len(results), 100)
+                self.assertEqual(short_thread_queries, long_thread_queries)
+                # ИПР или задача, профиль пользователя и комментарии
+                # вместе с авторами
+                self.assertEqual(long_thread_queries, 3)
+
+    def test_author_data(self):
+        self.add_comments(IdpComment, 3, idp=self.idp)
+        _, results = self.count_queries(
+            f'/api/v1/idp/{self.idp.id}/comments/'
+        )
+        self.assertEqual([comment['author'] for comment in results], [
+            {
+                'id': self.manager_user.manager_profile.id,
+                'last_name': '',
+                'first_name': '',
+                'middle_name': '',
+                'is_mentor': False,
+            },
+            {
+                'id': self.idp.employee_id,
+                'last_name': '',
+                'first_name': '',
+                'middle_name': '',
+                'is_mentor': False,
+            },
+            {
+                'id': self.mentor.id,
+                'last_name': '',
+                'first_name': '',
+                'middle_name': '',
+                'is_mentor': True,
+            },
+        ])
+
+
+@override_settings(QUERY_BUDGETS_ENFORCE=True)
+class QueryBudgetTests(CleanCacheMixin, APITestCase):
+    """Запросы к API укладываются в бюджеты SQL-запросов"""
+
+    def setUp(self):
+        super().setUp()
+        create_statuses('open', 'in_progress', 'completed', 'awaiting_review')
+        manager = create_manager('manager_budget')
+        self.manager_user = manager.user
+        self.employee, self.mentor, _ = [
+            create_employee(f'employee_budget_{number}', head=manager)
+            for number in range(3)
+        ]
+        self.idp = create_idp(manager, self.employee, mentor=self.mentor)
+        self.task = create_task(self.idp)
+        IdpComment.objects.create(
+            idp=self.idp, author=self.manager_user, text='Комментарий'
+        )
+        TaskComment.objects.create(
+            task=self.task, author=self.mentor.user, text='Комментарий'
+        )
+
+    def authenticate(self, user):
+        self.client.force_authenticate(
+            user=get_user_model().objects.get(pk=user.pk)
+        )
+
+    def test_read_requests(self):
+        employee_url = f'/api/v1/employees/{self.employee.id}/'
+        urls = [
+            '/api/v1/employees/',
+            employee_url,
+            f'{employee_url}idps/',
+            f'{employee_url}idps/{self.idp.id}/',
+            f'/api/v1/idp/{self.idp.id}/comments/',
+            f'/api/v1/task/{self.task.id}/comments/',
+        ]
+        for user, user_urls in (
+            (self.manager_user, urls + ['/api/v1/head/statistics/']),
+            (self.mentor.user, urls),
+            (self.employee.user, urls[1:]),
+        ):
+            for url in user_urls:
+                with self.subTest(user=user.username, url=url):
+                    self.authenticate(user)
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_write_requests(self):
+        self.authenticate(self.employee.user)
+        with mock.patch(
+            'api.tasks.determine_status_idp_by_task.apply_async'
+        ):
+            response = self.client.patch(
+                f'/api/v1/idps/{self.idp.id}/tasks/{self.task.id}/status/',
+                {'status_slug': 'in_progress'},
+                format='json',
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.authenticate(self.manager_user)
+        response = self.client.patch(
+            f'/api/v1/employees/{self.employee.id}/idps/{self.idp.id}/',
+            {'name': 'ИПР', 'tasks': [{'id': self.task.id, 'name': 'Курс'}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_idp_list_queries_do_not_grow(self):
+        url = f'/api/v1/employees/{self.employee.id}/idps/'
+        self.authenticate(self.manager_user)
+        with CaptureQueriesContext(connection) as single:
+            self.client.get(url)
+        in_progress = StatusIDP.objects.get(slug='in_progress')
+        for number in range(5):
+            IDP.objects.create(
+                author=self.manager_user.manager_profile,
+                employee=self.employee,
+                mentor=self.mentor,
+                name=f'ИПР {number}',
+                deadline=timezone.now() + timezone.timedelta(days=7),
+                status=in_progress,
+            )
+        self.authenticate(self.manager_user)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(len(many), len(single))
+
+    @override_settings(QUERY_BUDGETS={'employee-list': 1})
+    def test_exceeded_budget_fails(self):
+        self.authenticate(self.manager_user)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/v1/employees/')
+
+
+class IDPExportTests(CleanCacheMixin, APITestCase):
+    """Потоковая выгрузка ИПР"""
+
+    def setUp(self):
+        super().setUp()
+        self.staff_user = create_user('hr_export', is_staff=True)
+        managers = [
+            create_manager(f'manager_export_{number}') for number in range(2)
+        ]
+        self.idps = [
+            create_idp(
+                manager,
+                create_employee(f'employee_export_{number}', head=manager),
+                name=f'ИПР {number}',
+            )
+            for number, manager in enumerate(managers)
+        ]
+        self.manager = managers[0]
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_access(self):
+        self.client.force_authenticate(user=self.manager.user)
+        self.assertEqual(
+            self.client.get('/api/v1/export/idps/csv/').status_code,
+            status.HTTP_403_FORBIDDEN
+        )
+
+    def test_export(self):
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.get('/api/v1/export/idps/csv/')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="idps.csv"'
+        )
+        lines = self.export('/api/v1/export/idps/csv/').splitlines()
+        self.assertEqual(len(lines), 3)
+        records = [
+            json.loads(line) for line in self.export(
+                '/api/v1/export/idps/ndjson/', manager=self.manager.id
+            ).splitlines()
+        ]
+        self.assertEqual(
+            [record['id'] for record in records], [self.idps[0].id]
+        )
+        self.assertEqual(
+            self.export(
+                '/api/v1/export/idps/ndjson/',
+                status='open',
+                date_to=timezone.localdate() - timezone.timedelta(days=1),
+            ),
+            ''
+        )
+
+    def test_refused_under_asgi(self):
+        token = Token.objects.create(user=self.staff_user)
+        response = async_to_sync(AsyncClient().get)(
+            '/api/v1/export/idps/csv/', authorization=f'Token {token.key}'
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_501_NOT_IMPLEMENTED
+        )
+        self.assertIn('export_idps', response.json()['detail'])
+
+    def test_invalid_filters(self):
+        self.client.force_authenticate(user=self.staff_user)
+        for params in (
+            {'status': 'unknown'},
+            {'manager': 0},
+            {'date_from': '2024-02-01', 'date_to': '2024-01-01'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(
+                    self.client.get(
+                        '/api/v1/export/idps/ndjson/', params
+                    ).status_code,
+                    status.HTTP_400_BAD_REQUEST
+                )
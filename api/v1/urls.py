@@ -2,7 +2,8 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (EmployeeViewSet, HeadStatisticViewSet, IDPCommentViewSet,
-                    IDPViewSet, TaskCommentViewSet, TaskStatusChangeViewSet)
+                    IDPExportViewSet, IDPViewSet, TaskCommentViewSet,
+                    TaskStatusChangeViewSet)
 
 router = DefaultRouter()
 router.register('employees', EmployeeViewSet, basename='employee')
@@ -23,6 +24,8 @@ router.register(
     r'task/(?P<task_id>\d+)/comments', TaskCommentViewSet,
     basename='task_comments'
 )
+router.register('export/idps', IDPExportViewSet, basename='idp_export')
+
 urlpatterns = [
     path('', include(router.urls))
 ]
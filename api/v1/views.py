@@ -1,27 +1,48 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Max, Prefetch
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (OpenApiParameter, extend_schema,
                                    extend_schema_view, inline_serializer)
 from rest_framework import mixins, serializers, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import APIException, PermissionDenied
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
-from api.tasks import determine_status_idp_by_task
-from plans.models import IDP, StatusTask, Task
+from api.tasks import schedule_determine_status_idp
+from plans.export import EXPORT_FORMATS, filter_idps
+from plans.models import IDP, ManagerStatistics, StatusTask, Task
+from plans.statistics import rebuild_manager_statistics
 from users.models import Employee, Manager
 
+from .access import get_access
+from .cache import get_idp_detail
+from .conditional import conditional_get, employees_version, latest
+from .pagination import (CommentCursorPagination, EmployeePagination,
+                         IDPCursorPagination)
 from .permissions import (Comments, IsEmployeeIDP,
                           IsEmployeeIDPExecutorMentorOrManager,
                           IsManagerandEmployee, IsManagerIDP, IsMentorIDP)
 from .serializers import (EmployeeSerializer, HeadStatisticSerializer,
                           IDPCommentSerializer, IDPCreateAndUpdateSerializer,
-                          IDPDetailSerializer, IDPSerializer,
+                          IDPDetailSerializer, IDPExportFilterSerializer,
+                          IDPSerializer,
                           IDPStatusUpdateSerializer, StatusIDPSerializer,
                           StatusTaskSerializer, TaskCommentSerializer,
                           TaskSerializer, TaskStatusUpdateSerializer)
 
 
+class RequestAccessMixin:
+    """Дает вьюсету общий для запроса RequestAccess"""
+
+    @property
+    def access(self):
+        return get_access(self.request, self)
+
+
 @extend_schema(tags=['ИПР'])
 @extend_schema_view(
     list=extend_schema(
@@ -93,9 +114,11 @@ from .serializers import (EmployeeSerializer, HeadStatisticSerializer,
         ],
     ),
 )
-class IDPViewSet(viewsets.ModelViewSet):
+class IDPViewSet(RequestAccessMixin, viewsets.ModelViewSet):
     """Вьюсет для ИПР"""
     http_method_names = ['get', 'post', 'patch']
+    idp_url_kwarg = 'pk'
+    pagination_class = IDPCursorPagination
     permission_classes = [
         IsManagerIDP
         | IsEmployeeIDP
@@ -110,35 +133,79 @@ class IDPViewSet(viewsets.ModelViewSet):
         return IDPSerializer
 
     def perform_create(self, serializer):
-        manager = Manager.objects.get(user=self.request.user)
-        serializer.save(author=manager)
+        serializer.save(author=self.access.manager)
 
     def get_queryset(self):
-        employee_id = self.kwargs.get('employee_id')
-        employee = get_object_or_404(Employee, id=employee_id)
+        employee = self.access.employee
+        if employee is None:
+            raise Http404
         current_user = self.request.user
 
         if current_user.role == 'manager':
-            return IDP.objects.filter(
+            queryset = IDP.objects.filter(employee=employee)
+        elif self.access.is_employee(employee):
+            queryset = IDP.objects.filter(
                 employee=employee
-            ).prefetch_related('task')
-        elif current_user.employee_profile == employee:
-            return IDP.objects.filter(
-                employee=employee
-            ).exclude(
-                task__isnull=True
-            ).prefetch_related('task')
+            ).filter(
+                task_count__gt=0
+            )
         else:
-            return IDP.objects.filter(
+            queryset = IDP.objects.filter(
                 employee=employee,
-                mentor=current_user.employee_profile
-            ).prefetch_related('task')
+                mentor=self.access.employee_profile
+            )
+        if self.action == 'list':
+            return queryset.select_related('status')
+        return queryset.prefetch_related('task')
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({'employee_id': self.kwargs.get('employee_id')})
         return context
 
+    def get_list_version(self):
+        """Версия списка ИПР сотрудника"""
+        version = self.get_queryset().prefetch_related(None).aggregate(
+            updated_at=Max('updated_at'), count=Count('id')
+        )
+        return version['updated_at'], tuple(version.values())
+
+    def get_detail_version(self):
+        """Версия ИПР и его ментора"""
+        self.detail_version = self.get_queryset().prefetch_related(
+            None
+        ).filter(
+            pk=self.access.get_kwarg('pk')
+        ).values_list('updated_at', 'mentor__updated_at').first()
+        if self.detail_version is None:
+            return None
+        return latest(*self.detail_version), self.detail_version
+
+    def serialize_detail(self):
+        """Сериализует ИПР за фиксированное число запросов"""
+        queryset = self.get_queryset().select_related(
+            'status', 'mentor__user'
+        ).prefetch_related(None).prefetch_related(
+            Prefetch('task', queryset=Task.objects.select_related('status'))
+        )
+        instance = get_object_or_404(queryset, pk=self.kwargs['pk'])
+        self.check_object_permissions(self.request, instance)
+        return self.get_serializer(instance).data
+
+    @conditional_get(get_list_version)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(get_detail_version)
+    def retrieve(self, request, *args, **kwargs):
+        if self.detail_version is None:
+            raise Http404
+        return Response(get_idp_detail(
+            self.access.get_kwarg('pk'),
+            self.detail_version,
+            self.serialize_detail,
+        ))
+
     def get_permissions(self):
         if self.action == 'create':
             self.permission_classes = [IsManagerIDP]
@@ -177,7 +244,9 @@ class IDPViewSet(viewsets.ModelViewSet):
     )
     def status(self, request, employee_id, pk):
         """Изменяет статус ИПР"""
-        idp = get_object_or_404(IDP, id=pk)
+        idp = self.access.idp
+        if idp is None:
+            raise Http404
         serializer = IDPStatusUpdateSerializer(
             idp, data=request.data, partial=True
         )
@@ -211,30 +280,57 @@ class EmployeeViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated, IsManagerandEmployee]
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
+    pagination_class = EmployeePagination
     http_method_names = ['get']
 
-    def list(self, request, *args, **kwargs):
-        user = request.user
+    def get_queryset(self):
+        return self.serializer_class.setup_eager_loading(self.queryset)
+
+    @cached_property
+    def list_queryset(self):
+        """Сотрудники, которых пользователь видит в списке"""
+        user = self.request.user
         queryset = self.queryset.none()
         if hasattr(user, 'manager_profile'):
             if user.manager_profile:
                 queryset = self.get_subordinates(user.manager_profile)
         elif hasattr(user, 'employee_profile'):
-            mentor_idp = IDP.objects.filter(mentor=user.employee_profile)
-            employee_ids = [idp.employee.id for idp in mentor_idp]
-            queryset = Employee.objects.filter(id__in=employee_ids)
+            queryset = self.queryset.filter(
+                id__in=IDP.objects.filter(
+                    mentor=user.employee_profile
+                ).values('employee')
+            )
             if not queryset.exists():
                 raise PermissionDenied(
                     'У вас нет прав доступа к этому ресурсу.'
                 )
+        return queryset
+
+    def get_list_version(self):
+        """Версия списка сотрудников"""
+        return employees_version(self.list_queryset)
 
+    def get_detail_version(self):
+        """Версия сотрудника и его ИПР"""
+        employee = get_object_or_404(self.queryset, pk=self.kwargs['pk'])
+        self.check_object_permissions(self.request, employee)
+        return employees_version(self.queryset.filter(pk=employee.pk))
+
+    @conditional_get(get_list_version)
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(
+            self.serializer_class.setup_eager_loading(
+                self.list_queryset.order_by('id')
+            )
+        )
         serializer = self.serializer_class(
-            queryset,
+            page,
             many=True,
             context={'request': request}
         )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
+    @conditional_get(get_detail_version)
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         self.check_object_permissions(request, instance)
@@ -246,7 +342,7 @@ class EmployeeViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_subordinates(self, manager):
         """Возвращает подчиненных сотрудников данного руководителя."""
-        return Employee.objects.filter(head=manager)
+        return self.queryset.filter(head=manager)
 
 
 @extend_schema(tags=['Статистика для руководителя'])
@@ -263,18 +359,22 @@ class HeadStatisticViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     permission_classes = [IsManagerandEmployee]
 
     def get_queryset(self):
-        username = self.request.user.username
-        queryset = get_object_or_404(Manager, user__username=username)
-        return [queryset]
+        return ManagerStatistics.objects.filter(
+            manager__user=self.request.user
+        )
 
     def list(self, request):
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(*serializer.data)
+        statistics = self.get_queryset().first()
+        if statistics is None:
+            manager = get_object_or_404(Manager, user=request.user)
+            rebuild_manager_statistics(managers=[manager.id])
+            statistics = self.get_queryset().get()
+        serializer = self.get_serializer(statistics)
+        return Response(serializer.data)
 
 
 @extend_schema(tags=['Статус задачи'])
-class TaskStatusChangeViewSet(viewsets.ViewSet):
+class TaskStatusChangeViewSet(RequestAccessMixin, viewsets.ViewSet):
     """Вьюсет для изменения статуса задачи"""
     serializer_class = TaskSerializer
     permission_classes = [IsEmployeeIDPExecutorMentorOrManager]
@@ -307,16 +407,19 @@ class TaskStatusChangeViewSet(viewsets.ViewSet):
     def status(self, request, idp_id, task_id):
         """Изменение статуса задачи."""
         new_status_slug = request.data['status_slug']
-        new_status_id = get_object_or_404(StatusTask, slug=new_status_slug).id
-        task = get_object_or_404(Task, idp=idp_id, id=task_id)
+        try:
+            new_status_id = StatusTask.objects.get_cached(new_status_slug).id
+        except StatusTask.DoesNotExist:
+            raise Http404
+        task = self.access.task
+        if task is None or task.idp_id != int(idp_id):
+            raise Http404
         serializer = TaskStatusUpdateSerializer(
             task, data={'status': new_status_id}, partial=True
         )
         if serializer.is_valid(raise_exception=True):
             serializer.save()
-            determine_status_idp_by_task.apply_async(
-                args=[idp_id], countdown=1
-            )
+            schedule_determine_status_idp(task.idp_id)
         return Response(
             serializer.data,
             status=status.HTTP_200_OK
@@ -324,6 +427,7 @@ class TaskStatusChangeViewSet(viewsets.ViewSet):
 
 
 class BaseCommentViewSet(
+    RequestAccessMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet
@@ -332,6 +436,7 @@ class BaseCommentViewSet(
 
     serializer_class = None
     permission_classes = [Comments]
+    pagination_class = CommentCursorPagination
 
     def perform_create(self, serializer, idp=None, task=None):
         user = self.request.user
@@ -342,9 +447,12 @@ class BaseCommentViewSet(
 
     def get_queryset(self, idp=None, task=None):
         if idp:
-            return idp.idp_comments.all()
+            comments = idp.idp_comments.all()
         elif task:
-            return task.task_comments.all()
+            comments = task.task_comments.all()
+        return comments.select_related(
+            'author__manager_profile', 'author__employee_profile'
+        )
 
     def get_serializer_context(self, idp=None):
         context = super().get_serializer_context()
@@ -381,8 +489,10 @@ class IDPCommentViewSet(BaseCommentViewSet):
     serializer_class = IDPCommentSerializer
 
     def get_idp(self):
-        idp_id = self.kwargs.get('idp_id')
-        return get_object_or_404(IDP, id=idp_id)
+        idp = self.access.idp
+        if idp is None:
+            raise Http404
+        return idp
 
     def perform_create(self, serializer):
         idp = self.get_idp()
@@ -426,8 +536,10 @@ class TaskCommentViewSet(BaseCommentViewSet):
     serializer_class = TaskCommentSerializer
 
     def get_task(self):
-        task_id = self.kwargs.get('task_id')
-        return get_object_or_404(Task, id=task_id)
+        task = self.access.task
+        if task is None:
+            raise Http404
+        return task
 
     def perform_create(self, serializer):
         task = self.get_task()
@@ -441,3 +553,52 @@ class TaskCommentViewSet(BaseCommentViewSet):
         task = self.get_task()
         idp = task.idp
         return super().get_serializer_context(idp=idp)
+
+
+class ExportUnavailable(APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = (
+        'Выгрузка недоступна при запуске через ASGI, используйте команду '
+        'export_idps'
+    )
+    default_code = 'export_unavailable'
+
+
+@extend_schema(
+    tags=['Выгрузка'],
+    parameters=[IDPExportFilterSerializer],
+    responses={200: OpenApiTypes.BINARY},
+)
+class IDPExportViewSet(viewsets.ViewSet):
+    """
+    Потоковая выгрузка всех ИПР с задачами и комментариями для
+    сотрудников с доступом в админку
+    """
+    permission_classes = [IsAdminUser]
+
+    def export(self, request, export_format):
+        # Django 3.2 перебирает потоковый ответ ASGI в event loop, где ORM
+        # запрещен, и обрывает выгрузку уже после статуса 200
+        if isinstance(request._request, ASGIRequest):
+            raise ExportUnavailable()
+        filters = IDPExportFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        content_type, iterate = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            iterate(filter_idps(**filters.validated_data)),
+            content_type=f'{content_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="idps.{export_format}"'
+        )
+        return response
+
+    @extend_schema(summary='Выгрузка ИПР в CSV')
+    @action(detail=False, methods=['get'])
+    def csv(self, request):
+        return self.export(request, 'csv')
+
+    @extend_schema(summary='Выгрузка ИПР в NDJSON')
+    @action(detail=False, methods=['get'])
+    def ndjson(self, request):
+        return self.export(request, 'ndjson')
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from api.tasks import get_idp_status_metrics
+from api.v1.cache import get_idp_detail_metrics
+
+from .metrics import registry, render_metrics
+
+
+def metrics(request):
+    """
+    Метрики в формате Prometheus. Доступны по токену METRICS_TOKEN,
+    а без него только сотрудникам с доступом в админку
+    """
+    if settings.METRICS_TOKEN:
+        allowed = constant_time_compare(
+            request.headers.get('Authorization', ''),
+            f'Bearer {settings.METRICS_TOKEN}'
+        )
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    text = render_metrics(registry.collect(), {
+        (
+            'idp_status_recalculations_total',
+            'IDP status recalculations.',
+            'result',
+        ): get_idp_status_metrics(),
+        (
+            'idp_detail_cache_total',
+            'IDP detail cache lookups.',
+            'result',
+        ): get_idp_detail_metrics(),
+    })
+    return HttpResponse(
+        text, content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,12 @@
+import os
+import time
+
+
+def post_worker_init(worker):
+    """Пишет в лог время от запуска контейнера до готовности воркера"""
+    started = os.getenv('STARTED_AT')
+    if started:
+        worker.log.info(
+            'Worker ready to serve requests in %.1fs after start',
+            time.time() - float(started),
+        )
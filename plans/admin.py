@@ -1,7 +1,7 @@
 from django.contrib import admin
 
-from plans.models import (IDP, IdpComment, StatusIDP, StatusTask, Task,
-                          TaskComment, TypeTask)
+from plans.models import (IDP, IdpComment, ManagerStatistics, StatusIDP,
+                          StatusTask, Task, TaskComment, TypeTask)
 
 
 class TaskInlines(admin.StackedInline):
@@ -46,3 +46,14 @@ class IdpCommentAdmin(admin.ModelAdmin):
 @admin.register(TaskComment)
 class TaskCommentAdmin(admin.ModelAdmin):
     list_display = ('id', 'task')
+
+
+@admin.register(ManagerStatistics)
+class ManagerStatisticsAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'manager',
+        'count_employe',
+        'count_employe_with_idp',
+        'count_idp_with_status_awaiting_review',
+    )
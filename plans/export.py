@@ -0,0 +1,225 @@
+"""Потоковая выгрузка ИПР с задачами, статусами и комментариями."""
+import csv
+import json
+
+from plans.models import IDP, IdpComment, Task, TaskComment
+
+EXPORT_CHUNK_SIZE = 500
+CSV_COLUMNS = (
+    'idp_id',
+    'idp_name',
+    'idp_status',
+    'idp_deadline',
+    'idp_pub_date',
+    'manager',
+    'employee',
+    'mentor',
+    'task_id',
+    'task_name',
+    'task_type',
+    'task_status',
+    'task_source',
+    'task_pub_date',
+    'idp_comments',
+    'task_comments',
+)
+
+
+def filter_idps(manager=None, status=None, date_from=None, date_to=None):
+    """ИПР для выгрузки по руководителю, статусу и дате создания"""
+    idps = IDP.objects.all()
+    if manager is not None:
+        idps = idps.filter(author=manager)
+    if status is not None:
+        idps = idps.filter(status=status)
+    if date_from is not None:
+        idps = idps.filter(pub_date__date__gte=date_from)
+    if date_to is not None:
+        idps = idps.filter(pub_date__date__lte=date_to)
+    return idps
+
+
+def group_by(objects, attribute):
+    groups = {}
+    for obj in objects:
+        groups.setdefault(getattr(obj, attribute), []).append(obj)
+    return groups
+
+
+def iter_idp_chunks(idps, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Перебирает ИПР пачками по возрастанию id и к каждой пачке загружает
+    задачи и комментарии тремя запросами, поэтому память не зависит
+    от размера выгрузки. Возвращает списки (ИПР, задачи, комментарии),
+    где задачи - пары (задача, комментарии к ней)
+    """
+    idps = idps.select_related(
+        'status', 'author__user', 'employee__user', 'mentor__user'
+    ).order_by('id')
+    last_id = 0
+    while True:
+        chunk = list(idps.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        last_id = chunk[-1].id
+        ids = [idp.id for idp in chunk]
+        tasks = group_by(
+            Task.objects.filter(idp__in=ids).select_related(
+                'type', 'status'
+            ).order_by('idp', 'id'),
+            'idp_id'
+        )
+        task_comments = group_by(
+            TaskComment.objects.filter(task__idp__in=ids).select_related(
+                'author'
+            ).order_by('task', 'pub_date', 'id'),
+            'task_id'
+        )
+        idp_comments = group_by(
+            IdpComment.objects.filter(idp__in=ids).select_related(
+                'author'
+            ).order_by('idp', 'pub_date', 'id'),
+            'idp_id'
+        )
+        yield [
+            (
+                idp,
+                [
+                    (task, task_comments.get(task.id, []))
+                    for task in tasks.get(idp.id, [])
+                ],
+                idp_comments.get(idp.id, []),
+            )
+            for idp in chunk
+        ]
+
+
+def full_name(user):
+    return ' '.join(
+        name for name in (user.last_name, user.first_name, user.middle_name)
+        if name
+    )
+
+
+def format_date(value):
+    return value.isoformat() if value is not None else None
+
+
+def format_person(profile):
+    if profile is None:
+        return None
+    return {
+        'id': profile.id,
+        'username': profile.user.username,
+        'name': full_name(profile.user),
+    }
+
+
+def format_comment(comment):
+    return {
+        'author': comment.author.username,
+        'name': full_name(comment.author),
+        'text': comment.text,
+        'pub_date': format_date(comment.pub_date),
+    }
+
+
+def format_idp(idp, tasks, comments):
+    """ИПР с задачами и комментариями в виде словаря для JSON"""
+    return {
+        'id': idp.id,
+        'name': idp.name,
+        'status': idp.status.slug if idp.status else None,
+        'deadline': format_date(idp.deadline),
+        'pub_date': format_date(idp.pub_date),
+        'manager': format_person(idp.author),
+        'employee': format_person(idp.employee),
+        'mentor': format_person(idp.mentor),
+        'tasks': [
+            {
+                'id': task.id,
+                'name': task.name,
+                'type': task.type.slug,
+                'status': task.status.slug if task.status else None,
+                'source': task.source,
+                'pub_date': format_date(task.pub_date),
+                'comments': [
+                    format_comment(comment) for comment in task_comments
+                ],
+            }
+            for task, task_comments in tasks
+        ],
+        'comments': [format_comment(comment) for comment in comments],
+    }
+
+
+def iter_ndjson(idps, chunk_size=EXPORT_CHUNK_SIZE):
+    """Выгрузка в NDJSON: по строке JSON на ИПР"""
+    for chunk in iter_idp_chunks(idps, chunk_size):
+        yield ''.join(
+            json.dumps(format_idp(*row), ensure_ascii=False) + '\n'
+            for row in chunk
+        )
+
+
+class Echo:
+    """Файлоподобный объект, возвращающий записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def join_comments(comments):
+    return '\n'.join(
+        f'{comment["pub_date"]} {comment["author"]}: {comment["text"]}'
+        for comment in comments
+    )
+
+
+def iter_csv(idps, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Выгрузка в CSV: строка на каждую задачу с данными ее ИПР, для ИПР
+    без задач одна строка с пустыми полями задачи
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for chunk in iter_idp_chunks(idps, chunk_size):
+        rows = []
+        for row in chunk:
+            idp = format_idp(*row)
+            idp_columns = [
+                idp['id'],
+                idp['name'],
+                idp['status'],
+                idp['deadline'],
+                idp['pub_date'],
+                *(
+                    idp[role]['username'] if idp[role] else None
+                    for role in ('manager', 'employee', 'mentor')
+                ),
+            ]
+            idp_comments = join_comments(idp['comments'])
+            for task in idp['tasks'] or [None]:
+                if task is None:
+                    task_columns = [None] * 6
+                    task_comments = ''
+                else:
+                    task_columns = [
+                        task['id'],
+                        task['name'],
+                        task['type'],
+                        task['status'],
+                        task['source'],
+                        task['pub_date'],
+                    ]
+                    task_comments = join_comments(task['comments'])
+                rows.append(writer.writerow(
+                    idp_columns + task_columns + [idp_comments, task_comments]
+                ))
+        yield ''.join(rows)
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', iter_csv),
+    'ndjson': ('application/x-ndjson', iter_ndjson),
+}
@@ -0,0 +1,144 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from plans.models import IDP, StatusIDP, StatusTask, Task
+from plans.statistics import annotate_latest_idp
+from plans.synthetic import generate_org
+from users.models import Employee
+
+PREVIOUS_INDEXES = {
+    IDP: [models.Index(fields=['employee'], name='benchmark_idp_employee')],
+    Task: [models.Index(fields=['idp'], name='benchmark_task_idp')],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure hot IDP and task queries with the composite indexes '
+        'and with the single column indexes they replaced'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--generate',
+            type=int,
+            default=0,
+            metavar='IDPS',
+            help='Generate a synthetic organisation with this many IDPs',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='How many times each query is executed',
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Print query plans',
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Also measure with the previous indexes (PostgreSQL only)',
+        )
+
+    def get_queries(self):
+        """Возвращает частые запросы к ИПР и задачам"""
+        idp = IDP.objects.exclude(mentor=None).filter(
+            task_count__gt=0
+        ).order_by('-id').first()
+        if idp is None:
+            raise CommandError(
+                'No IDPs with mentor and tasks, use --generate first'
+            )
+        employee_idps = IDP.objects.filter(employee=idp.employee_id)
+        active_statuses = StatusIDP.objects.filter(
+            slug__in=['open', 'in_progress', 'awaiting_review']
+        )
+        return {
+            'current_idp': employee_idps.order_by('-pub_date', '-id')[:1],
+            'current_idp_with_tasks': employee_idps.filter(
+                task_count__gt=0
+            ).order_by('-pub_date', '-id')[:1],
+            'mentor_access': employee_idps.filter(
+                mentor=idp.mentor_id
+            ).values('id')[:1],
+            'head_latest_idp': employee_idps.filter(
+                author=idp.author_id
+            ).order_by('-id').values('id')[:1],
+            'overdue_idps': IDP.objects.filter(
+                status__in=active_statuses,
+                deadline__lt=timezone.now(),
+                id__in=Employee.objects.values('current_idp'),
+            ).order_by('id').values('id')[:1000],
+            'head_statistics': annotate_latest_idp(
+                Employee.objects.filter(head=idp.author_id)
+            ).values('latest_idp_status', 'latest_idp_has_tasks'),
+            'idp_tasks_by_status': Task.objects.filter(
+                idp=idp,
+                status=StatusTask.objects.get_cached('completed'),
+            ).values('id'),
+        }
+
+    def measure(self, queries, repeat):
+        """Возвращает медианное время выполнения запросов в мс"""
+        timings = {}
+        for name, queryset in queries.items():
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[name] = statistics.median(samples)
+        return timings
+
+    def explain(self, queries, title):
+        options = {}
+        if connection.vendor == 'postgresql':
+            options['analyze'] = True
+        for name, queryset in queries.items():
+            self.stdout.write(f'-- {name} ({title})')
+            self.stdout.write(queryset.explain(**options))
+
+    def handle(self, *args, **options):
+        if options['compare'] and connection.vendor != 'postgresql':
+            raise CommandError('--compare requires PostgreSQL')
+        if options['generate']:
+            started = time.perf_counter()
+            created = generate_org(options['generate'])
+            self.stdout.write(
+                f'Generated {created} in {time.perf_counter() - started:.1f}s'
+            )
+        with connection.cursor() as cursor:
+            for model in (IDP, Task):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+        queries = self.get_queries()
+        if options['explain']:
+            self.explain(queries, 'current indexes')
+        current = self.measure(queries, options['repeat'])
+        previous = {}
+        if options['compare']:
+            with transaction.atomic():
+                with connection.schema_editor() as editor:
+                    for model, indexes in PREVIOUS_INDEXES.items():
+                        for index in model._meta.indexes:
+                            editor.remove_index(model, index)
+                        for index in indexes:
+                            editor.add_index(model, index)
+                        editor.execute(f'ANALYZE {model._meta.db_table}')
+                if options['explain']:
+                    self.explain(queries, 'previous indexes')
+                previous = self.measure(queries, options['repeat'])
+                transaction.set_rollback(True)
+
+        for name, timing in current.items():
+            line = f'{name:<24} {timing:>10.2f} ms'
+            if name in previous:
+                line += f' {previous[name]:>10.2f} ms with previous indexes'
+            self.stdout.write(line)
@@ -0,0 +1,73 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from plans.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, filter_idps
+from plans.models import StatusIDP
+from users.models import Manager
+
+
+class Command(BaseCommand):
+    help = (
+        'Export IDPs with tasks, statuses and comments as CSV or NDJSON. '
+        'Rows are streamed in chunks, so memory does not depend on the '
+        'size of the export'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=sorted(EXPORT_FORMATS), default='csv'
+        )
+        parser.add_argument('--manager', type=int, help='Manager id')
+        parser.add_argument('--status', help='IDP status slug')
+        parser.add_argument(
+            '--date-from',
+            type=date.fromisoformat,
+            help='Created on or after, YYYY-MM-DD',
+        )
+        parser.add_argument(
+            '--date-to',
+            type=date.fromisoformat,
+            help='Created on or before, YYYY-MM-DD',
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write, standard output by default',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        filters = {
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+        }
+        if options['manager'] is not None:
+            try:
+                filters['manager'] = Manager.objects.get(
+                    pk=options['manager']
+                )
+            except Manager.DoesNotExist:
+                raise CommandError(
+                    f'Manager {options["manager"]} does not exist'
+                )
+        if options['status'] is not None:
+            try:
+                filters['status'] = StatusIDP.objects.get_cached(
+                    options['status']
+                )
+            except StatusIDP.DoesNotExist:
+                raise CommandError(
+                    f'IDP status {options["status"]} does not exist'
+                )
+        _, iterate = EXPORT_FORMATS[options['format']]
+        chunks = iterate(filter_idps(**filters), options['chunk_size'])
+        if options['output']:
+            with open(
+                options['output'], 'w', encoding='utf-8', newline=''
+            ) as file:
+                file.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
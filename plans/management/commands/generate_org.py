@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from plans.synthetic import generate_org
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic organisation: managers, employees, mentor '
+        'links, IDPs with tasks and comments'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--managers', type=int, default=10)
+        parser.add_argument('--employees-per-manager', type=int, default=10)
+        parser.add_argument('--idps-per-employee', type=int, default=4)
+        parser.add_argument(
+            '--tasks-per-idp',
+            type=int,
+            default=2,
+            help='Average number of tasks per IDP',
+        )
+        parser.add_argument(
+            '--comments-per-idp',
+            type=int,
+            default=2,
+            help='Average number of comments per IDP and per task',
+        )
+        parser.add_argument(
+            '--prefix',
+            default='synthetic',
+            help='Username prefix, must be unique for each run',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = generate_org(
+            options['managers']
+            * options['employees_per_manager']
+            * options['idps_per_employee'],
+            employees_per_manager=options['employees_per_manager'],
+            idps_per_employee=options['idps_per_employee'],
+            tasks_per_idp=options['tasks_per_idp'],
+            comments_per_idp=options['comments_per_idp'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {created["managers"]} managers, '
+            f'{created["employees"]} employees and {created["idps"]} IDPs '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from plans.models import IDP
+from users.models import Employee
+
+
+class Command(BaseCommand):
+    help = 'Rebuild task counters of IDPs and current IDPs of employees'
+
+    def handle(self, *args, **options):
+        IDP.update_task_counters(IDP.objects.values('id'))
+        IDP.update_current_idps(Employee.objects.values('id'))
+        self.stdout.write(self.style.SUCCESS('IDP data rebuilt'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from plans.statistics import (find_inconsistent_statistics,
+                              rebuild_manager_statistics)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or check summary statistics of managers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only compare stored statistics with recalculated ones',
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            inconsistent = find_inconsistent_statistics()
+            if inconsistent:
+                raise CommandError(
+                    'Statistics is inconsistent for managers: '
+                    + ', '.join(str(manager_id) for manager_id in inconsistent)
+                )
+            self.stdout.write(self.style.SUCCESS('Statistics is consistent'))
+            return
+
+        rebuild_manager_statistics()
+        self.stdout.write(self.style.SUCCESS('Statistics rebuilt'))
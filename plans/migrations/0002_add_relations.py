@@ -0,0 +1,83 @@
+# Generated by Django 3.2 on 2026-10-18 17:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_names'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('plans', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idp',
+            name='author',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='IDP', to='users.manager', verbose_name='Руководитель'),
+        ),
+        migrations.AddField(
+            model_name='idp',
+            name='employee',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='IDP', to='users.employee', verbose_name='Сотрудник'),
+        ),
+        migrations.AddField(
+            model_name='idp',
+            name='mentor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='IDP_mentor', to='users.employee', verbose_name='Ментор'),
+        ),
+        migrations.AddField(
+            model_name='idp',
+            name='status',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='IDP', to='plans.statusidp', verbose_name='Статус исполнения'),
+        ),
+        migrations.AddField(
+            model_name='idpcomment',
+            name='author',
+            field=models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='idpcomment_author', to='users.user', verbose_name='Пользователь'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='idpcomment',
+            name='idp',
+            field=models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='idp_comments', to='plans.idp', verbose_name='ИПР'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='idp',
+            field=models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='task', to='plans.idp', verbose_name='ИПР'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='status',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='task', to='plans.statustask', verbose_name='Статус исполнения'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='type',
+            field=models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='task', to='plans.typetask', verbose_name='Тип задачи'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='taskcomment',
+            name='author',
+            field=models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='taskcomment_author', to='users.user', verbose_name='Пользователь'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='taskcomment',
+            name='task',
+            field=models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='task_comments', to='plans.task', verbose_name='Задача'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='typetask',
+            name='name',
+            field=models.CharField(max_length=50, verbose_name='Название'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2 on 2026-10-18 17:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_names'),
+        ('plans', '0002_add_relations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ManagerStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count_employe', models.PositiveIntegerField(default=0, verbose_name='Сотрудников')),
+                ('count_employe_with_idp', models.PositiveIntegerField(default=0, verbose_name='Сотрудников с активным ИПР')),
+                ('count_idp_without_tasks', models.PositiveIntegerField(default=0, verbose_name='ИПР без задач')),
+                ('count_idp_with_status_not_done', models.PositiveIntegerField(default=0, verbose_name='Просроченных ИПР')),
+                ('count_idp_with_status_awaiting_review', models.PositiveIntegerField(default=0, verbose_name='ИПР, ожидающих ревью')),
+                ('count_idp_with_status_cancelled', models.PositiveIntegerField(default=0, verbose_name='Отмененных ИПР')),
+                ('manager', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='idp_statistics', to='users.manager', verbose_name='Руководитель')),
+            ],
+            options={
+                'verbose_name': 'Статистика руководителя',
+                'verbose_name_plural': 'Статистика руководителей',
+            },
+        ),
+    ]
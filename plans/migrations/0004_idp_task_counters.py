@@ -0,0 +1,48 @@
+# Generated by Django 3.2 on 2026-10-18 17:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_task_counters(apps, schema_editor):
+    IDP = apps.get_model('plans', 'IDP')
+    Task = apps.get_model('plans', 'Task')
+    tasks = Task.objects.filter(idp=OuterRef('pk')).order_by().values('idp')
+
+    def count(**filters):
+        return Coalesce(Subquery(
+            tasks.filter(**filters).annotate(count=Count('id')).values('count')
+        ), 0)
+
+    IDP.objects.update(
+        task_count=count(),
+        task_done_count=count(status__slug='completed'),
+        task_in_progress_count=count(status__slug='in_progress'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plans', '0003_managerstatistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idp',
+            name='task_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во задач'),
+        ),
+        migrations.AddField(
+            model_name='idp',
+            name='task_done_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во выполненных задач'),
+        ),
+        migrations.AddField(
+            model_name='idp',
+            name='task_in_progress_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во задач в работе'),
+        ),
+        migrations.RunPython(fill_task_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2 on 2026-10-18 18:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_employee_current_idp'),
+        ('plans', '0004_idp_task_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='idp',
+            index=models.Index(fields=['employee', '-pub_date', '-id'], name='idp_employee_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['idp', 'status'], name='task_idp_status_idx'),
+        ),
+        migrations.AlterField(
+            model_name='idp',
+            name='employee',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='IDP', to='users.employee', verbose_name='Сотрудник'),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='idp',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='task', to='plans.idp', verbose_name='ИПР'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2 on 2026-10-18 19:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plans', '0006_idp_task_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='idpcomment',
+            index=models.Index(fields=['idp', 'pub_date', 'id'], name='idpcomment_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskcomment',
+            index=models.Index(fields=['task', 'pub_date', 'id'], name='taskcomment_pub_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='idpcomment',
+            name='idp',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='idp_comments', to='plans.idp', verbose_name='ИПР'),
+        ),
+        migrations.AlterField(
+            model_name='taskcomment',
+            name='task',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='task_comments', to='plans.task', verbose_name='Задача'),
+        ),
+    ]
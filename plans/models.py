@@ -1,6 +1,13 @@
+import threading
+import uuid
+from functools import partial
+
 from colorfield.fields import ColorField
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from users.models import Employee, Manager, User
@@ -9,6 +16,117 @@ from users.models import Employee, Manager, User
 MAX_LENGTH_BIG = 200
 MAX_LENGTH_SMALL = 50
 
+TASK_COUNTERS = ('task_count', 'task_done_count', 'task_in_progress_count')
+CLEAN_FIELDS = ('author', 'employee', 'mentor', 'deadline')
+
+
+class SlugCacheManager(models.Manager):
+    """
+    Менеджер справочника, кэширующий его объекты в памяти процесса.
+    Кэш сбрасывается сигналами после фиксации транзакции, а другие
+    процессы узнают об изменениях по ключу версии в общем кэше
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._version = None
+        self._by_slug = None
+        self._by_pk = None
+        self._local = threading.local()
+
+    @property
+    def version_key(self):
+        return f'slug_cache:{self.model._meta.label_lower}'
+
+    def _read(self):
+        objects = list(self.get_queryset())
+        return (
+            {obj.slug: obj for obj in objects},
+            {obj.pk: obj for obj in objects},
+        )
+
+    def _load_pending(self):
+        """
+        Возвращает кэш транзакции, изменившей справочник. До фиксации
+        только она видит свои изменения, а после отката кэш забывается
+        """
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            return None
+        # Откат транзакции или точки сохранения убирает их обработчики
+        # on_commit, по ним и видно, какие изменения еще не отменены
+        registered = [
+            callback
+            for _, callback in transaction.get_connection().run_on_commit
+        ]
+        callbacks = [
+            callback for callback in pending['callbacks']
+            if callback in registered
+        ]
+        if not callbacks:
+            self._local.pending = None
+            return None
+        if len(callbacks) < len(pending['callbacks']):
+            pending['callbacks'] = callbacks
+            pending['objects'] = None
+        if pending['objects'] is None:
+            pending['objects'] = self._read()
+        return pending['objects']
+
+    def _load(self):
+        pending = self._load_pending()
+        if pending is not None:
+            return pending
+        version = cache.get(self.version_key)
+        with self._lock:
+            if self._by_slug is None or version != self._version:
+                self._by_slug, self._by_pk = self._read()
+                self._version = version
+            return self._by_slug, self._by_pk
+
+    def get_cached(self, slug=None, pk=None):
+        """Возвращает объект справочника по slug или pk без запроса к БД"""
+        by_slug, by_pk = self._load()
+        obj = by_slug.get(slug) if pk is None else by_pk.get(pk)
+        if obj is None:
+            raise self.model.DoesNotExist(
+                f'{self.model._meta.object_name} matching query does not '
+                f'exist.'
+            )
+        return obj
+
+    def get_or_create_cached(self, slug):
+        """Возвращает объект по slug, создавая его при отсутствии"""
+        try:
+            return self.get_cached(slug)
+        except self.model.DoesNotExist:
+            obj, created = self.get_or_create(slug=slug)
+            return obj
+
+    def _publish(self):
+        with self._lock:
+            self._by_slug = None
+            self._by_pk = None
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    def clear_cache(self):
+        """
+        Сбрасывает кэш во всех процессах после фиксации транзакции.
+        Иначе другой процесс успел бы перечитать старые строки уже с новой
+        версией и не увидел бы изменение
+        """
+        if not transaction.get_connection().in_atomic_block:
+            self._publish()
+            return
+        publish = partial(self._publish)
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            pending = self._local.pending = {'callbacks': []}
+        pending['callbacks'].append(publish)
+        pending['objects'] = None
+        transaction.on_commit(publish)
+
 
 class StatusIDP(models.Model):
     """Модель для статусов ИПР"""
@@ -23,6 +141,8 @@ class StatusIDP(models.Model):
     color_fon = ColorField(verbose_name='Цвет фона')
     color_text = ColorField(verbose_name='Цвет текста')
 
+    objects = SlugCacheManager()
+
     class Meta:
         verbose_name = 'Статус исполнения ИПР'
         verbose_name_plural = 'Статусы исполнения ИПР'
@@ -44,6 +164,7 @@ class IDP(models.Model):
         Employee,
         on_delete=models.SET_NULL,
         null=True,
+        db_index=False,
         related_name='IDP',
         verbose_name='Сотрудник',
     )
@@ -83,9 +204,34 @@ class IDP(models.Model):
         verbose_name='Дата создания',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    task_count = models.PositiveIntegerField(
+        verbose_name='Кол-во задач',
+        default=0,
+        editable=False,
+    )
+    task_done_count = models.PositiveIntegerField(
+        verbose_name='Кол-во выполненных задач',
+        default=0,
+        editable=False,
+    )
+    task_in_progress_count = models.PositiveIntegerField(
+        verbose_name='Кол-во задач в работе',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'IDP'
+        indexes = [
+            models.Index(
+                fields=['employee', '-pub_date', '-id'],
+                name='idp_employee_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -109,13 +255,99 @@ class IDP(models.Model):
             )
 
     def save(self, *args, **kwargs):
-        self.clean()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(CLEAN_FIELDS):
+            self.clean()
         if not self.status:
             default_status_slug = 'open'
-            self.status, created = StatusIDP.objects.get_or_create(
-                slug=default_status_slug
+            self.status = StatusIDP.objects.get_or_create_cached(
+                default_status_slug
             )
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        if (
+            not adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in TASK_COUNTERS
+            ]
+        elif not adding and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
+        loaded_employee_id = getattr(self, '_loaded_employee_id', None)
+        # Сигналы статистики держат блокировку от pre_save до post_save
+        with transaction.atomic(savepoint=False):
+            if adding and self.employee_id:
+                list(Employee.objects.select_for_update().filter(
+                    pk=self.employee_id
+                ).values_list('pk', flat=True))
+                super().save(*args, **kwargs)
+                Employee.objects.filter(pk=self.employee_id).update(
+                    current_idp=self
+                )
+            elif not adding and loaded_employee_id != self.employee_id:
+                super().save(*args, **kwargs)
+                IDP.update_current_idps([
+                    employee_id
+                    for employee_id in (loaded_employee_id, self.employee_id)
+                    if employee_id is not None
+                ])
+            else:
+                super().save(*args, **kwargs)
+        self._loaded_employee_id = self.employee_id
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_employee_id = instance.__dict__.get('employee_id')
+        return instance
+
+    def is_current(self):
+        """Проверяет, является ли ИПР текущим для своего сотрудника"""
+        if self._meta.get_field('employee').is_cached(self):
+            return (
+                self.employee is not None
+                and self.employee.current_idp_id == self.pk
+            )
+        return Employee.objects.filter(
+            pk=self.employee_id, current_idp=self.pk
+        ).exists()
+
+    @classmethod
+    def update_current_idps(cls, employee_ids):
+        """Пересчитывает текущий ИПР у переданных сотрудников"""
+        Employee.objects.filter(pk__in=employee_ids).update(
+            current_idp=Subquery(
+                cls.objects.filter(
+                    employee=OuterRef('pk')
+                ).order_by('-pub_date', '-id').values('id')[:1]
+            )
+        )
+
+    @classmethod
+    def update_task_counters(cls, idp_ids):
+        """
+        Пересчитывает счетчики задач у переданных ИПР и отмечает их
+        измененными
+        """
+        tasks = Task.objects.filter(
+            idp=OuterRef('pk')
+        ).order_by().values('idp')
+
+        def count(**filters):
+            return Coalesce(Subquery(
+                tasks.filter(**filters).annotate(
+                    count=Count('id')
+                ).values('count')
+            ), 0)
+
+        cls.objects.filter(pk__in=idp_ids).update(
+            task_count=count(),
+            task_done_count=count(status__slug='completed'),
+            task_in_progress_count=count(status__slug='in_progress'),
+            updated_at=timezone.now(),
+        )
 
 
 class StatusTask(models.Model):
@@ -131,6 +363,8 @@ class StatusTask(models.Model):
     color_fon = ColorField(verbose_name='Цвет фона')
     color_text = ColorField(verbose_name='Цвет текста')
 
+    objects = SlugCacheManager()
+
     class Meta:
         verbose_name = 'Статус исполнения задачи'
         verbose_name_plural = 'Статусы исполнения задачи'
@@ -150,6 +384,8 @@ class TypeTask(models.Model):
         unique=True
     )
 
+    objects = SlugCacheManager()
+
     class Meta:
         verbose_name = 'Тип задач'
         verbose_name_plural = 'Типы задач'
@@ -163,6 +399,7 @@ class Task(models.Model):
     idp = models.ForeignKey(
         IDP,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='task',
         verbose_name='ИПР',
     )
@@ -195,10 +432,20 @@ class Task(models.Model):
         verbose_name='Дата создания',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
 
     class Meta:
         verbose_name = 'Задача'
         verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(
+                fields=['idp', 'status'],
+                name='task_idp_status_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -206,10 +453,11 @@ class Task(models.Model):
     def save(self, *args, **kwargs):
         if not self.status:
             default_status_slug = 'open'
-            self.status, created = StatusTask.objects.get_or_create(
-                slug=default_status_slug
+            self.status = StatusTask.objects.get_or_create_cached(
+                default_status_slug
             )
-        super().save(*args, **kwargs)
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
 
 
 class Comments(models.Model):
@@ -237,6 +485,7 @@ class IdpComment(Comments):
     idp = models.ForeignKey(
         IDP,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='idp_comments',
         verbose_name='ИПР',
     )
@@ -244,6 +493,12 @@ class IdpComment(Comments):
     class Meta:
         verbose_name = 'Комментарий к ИПР'
         verbose_name_plural = 'Комментарии к ИПР'
+        indexes = [
+            models.Index(
+                fields=['idp', 'pub_date', 'id'],
+                name='idpcomment_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.text}'
@@ -254,6 +509,7 @@ class TaskComment(Comments):
     task = models.ForeignKey(
         Task,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='task_comments',
         verbose_name='Задача',
     )
@@ -261,6 +517,53 @@ class TaskComment(Comments):
     class Meta:
         verbose_name = 'Комментарий к задаче'
         verbose_name_plural = 'Комментарии к задаче'
+        indexes = [
+            models.Index(
+                fields=['task', 'pub_date', 'id'],
+                name='taskcomment_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.text}'
+
+
+class ManagerStatistics(models.Model):
+    """Сводная статистика руководителя по ИПР сотрудников"""
+    manager = models.OneToOneField(
+        Manager,
+        on_delete=models.CASCADE,
+        related_name='idp_statistics',
+        verbose_name='Руководитель',
+    )
+    count_employe = models.PositiveIntegerField(
+        verbose_name='Сотрудников',
+        default=0,
+    )
+    count_employe_with_idp = models.PositiveIntegerField(
+        verbose_name='Сотрудников с активным ИПР',
+        default=0,
+    )
+    count_idp_without_tasks = models.PositiveIntegerField(
+        verbose_name='ИПР без задач',
+        default=0,
+    )
+    count_idp_with_status_not_done = models.PositiveIntegerField(
+        verbose_name='Просроченных ИПР',
+        default=0,
+    )
+    count_idp_with_status_awaiting_review = models.PositiveIntegerField(
+        verbose_name='ИПР, ожидающих ревью',
+        default=0,
+    )
+    count_idp_with_status_cancelled = models.PositiveIntegerField(
+        verbose_name='Отмененных ИПР',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Статистика руководителя'
+        verbose_name_plural = 'Статистика руководителей'
+
+    def __str__(self):
+        return f'{self.manager}'
@@ -0,0 +1,177 @@
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from users.models import Employee
+
+from .models import IDP, StatusIDP, StatusTask, Task, TypeTask
+from .statistics import (apply_statistics_delta, collect_statistics,
+                         lock_statistics, rebuild_manager_statistics,
+                         tasks_deleted_in_bulk)
+
+deleting = ContextVar('deleting', default=None)
+
+
+class DeletedObjects:
+    """
+    Задачи, ИПР и сотрудники одного каскадного удаления. Django отправляет
+    pre_delete для всех объектов до удаления строк, а post_delete после,
+    поэтому счетчики и статистика пересчитываются один раз после последнего
+    post_delete, а не на каждую строку
+    """
+
+    def __init__(self):
+        self.pending = 0
+        self.idps = set()
+        self.employees = set()
+        self.managers = set()
+        self.marker = lambda: None
+        transaction.on_commit(self.marker)
+
+    def is_alive(self):
+        """Удаление, прерванное ошибкой, откатывается вместе с маркером"""
+        return any(
+            func is self.marker
+            for _, func in transaction.get_connection().run_on_commit
+        )
+
+    def flush(self):
+        employees = Employee.objects.filter(
+            Q(id__in=self.employees) | Q(IDP__in=self.idps)
+        ).exclude(head=None)
+        managers = self.managers | set(
+            employees.values_list('head', flat=True)
+        )
+        if self.idps:
+            IDP.update_task_counters(self.idps)
+        if self.employees:
+            IDP.update_current_idps(self.employees)
+        if managers:
+            rebuild_manager_statistics(managers=managers, create=False)
+
+
+def remember_statistics(instance, employee_ids):
+    """
+    Блокирует статистику руководителей сотрудников и сохраняет их вклад
+    до изменения объекта. Блокировка держится до конца транзакции save
+    """
+    instance._statistics_employees = list(employee_ids)
+    employees = Employee.objects.filter(id__in=instance._statistics_employees)
+    lock_statistics(employees)
+    instance._statistics_before = collect_statistics(employees)
+
+
+def update_statistics(instance):
+    """Применяет к статистике изменение вклада сотрудников"""
+    if not hasattr(instance, '_statistics_before'):
+        return
+    after = collect_statistics(
+        Employee.objects.filter(id__in=instance._statistics_employees)
+    )
+    apply_statistics_delta(instance._statistics_before, after)
+    del instance._statistics_before
+
+
+@receiver(pre_save, sender=IDP)
+def remember_idp_statistics(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    if hasattr(instance, '_loaded_employee_id'):
+        employee_ids = {instance.employee_id, instance._loaded_employee_id}
+    else:
+        employees = Employee.objects.filter(id=instance.employee_id)
+        if instance.pk:
+            employees = employees | Employee.objects.filter(
+                id__in=IDP.objects.filter(pk=instance.pk).values('employee')
+            )
+        employee_ids = employees.values_list('id', flat=True)
+    remember_statistics(instance, employee_ids)
+
+
+@receiver(pre_save, sender=Task)
+def remember_task_statistics(sender, instance, raw, **kwargs):
+    if raw or not instance._state.adding:
+        return
+    remember_statistics(instance, Employee.objects.filter(
+        IDP=instance.idp_id
+    ).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=IDP)
+@receiver(post_save, sender=Task)
+def update_idp_statistics(sender, instance, **kwargs):
+    update_statistics(instance)
+
+
+@receiver(post_save, sender=Task)
+def update_task_counters(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    IDP.update_task_counters([instance.idp_id])
+
+
+@receiver(pre_save, sender=Employee)
+def remember_employee_head(sender, instance, raw, **kwargs):
+    if raw or not instance.pk:
+        return
+    instance._previous_head_id = Employee.objects.filter(
+        pk=instance.pk
+    ).values_list('head', flat=True).first()
+
+
+@receiver(post_save, sender=Employee)
+def update_employee_statistics(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    previous_head_id = getattr(instance, '_previous_head_id', None)
+    if created or previous_head_id != instance.head_id:
+        rebuild_manager_statistics(managers=[
+            head_id for head_id in (previous_head_id, instance.head_id)
+            if head_id is not None
+        ], create=False)
+
+
+@receiver(pre_delete, sender=IDP)
+@receiver(pre_delete, sender=Task)
+@receiver(pre_delete, sender=Employee)
+def remember_deleted_object(sender, instance, **kwargs):
+    if sender is Task and tasks_deleted_in_bulk.get():
+        return
+    deleted = deleting.get()
+    if deleted is None or not deleted.is_alive():
+        deleted = DeletedObjects()
+        deleting.set(deleted)
+    deleted.pending += 1
+    if sender is Task:
+        deleted.idps.add(instance.idp_id)
+    elif sender is IDP and instance.employee_id:
+        deleted.employees.add(instance.employee_id)
+    elif instance.head_id:
+        deleted.managers.add(instance.head_id)
+
+
+@receiver(post_delete, sender=IDP)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Employee)
+def update_deleted_objects(sender, instance, **kwargs):
+    if sender is Task and tasks_deleted_in_bulk.get():
+        return
+    deleted = deleting.get()
+    deleted.pending -= 1
+    if not deleted.pending:
+        deleting.set(None)
+        deleted.flush()
+
+
+@receiver(post_save, sender=StatusIDP)
+@receiver(post_save, sender=StatusTask)
+@receiver(post_save, sender=TypeTask)
+@receiver(post_delete, sender=StatusIDP)
+@receiver(post_delete, sender=StatusTask)
+@receiver(post_delete, sender=TypeTask)
+def clear_reference_cache(sender, **kwargs):
+    sender.objects.clear_cache()
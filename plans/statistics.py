@@ -0,0 +1,212 @@
+"""Статистика руководителя по ИПР его сотрудников."""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery
+
+from plans.models import IDP, ManagerStatistics, Task
+from users.models import Employee, Manager
+
+ACTIVE_STATUSES = ['in_progress', 'open', 'awaiting_review']
+
+tasks_deleted_in_bulk = ContextVar('tasks_deleted_in_bulk', default=False)
+
+STATISTICS_AGGREGATES = {
+    'count_employe': Count('id'),
+    'count_employe_with_idp': Count(
+        'id', filter=Q(latest_idp_status__in=ACTIVE_STATUSES)
+    ),
+    'count_idp_with_status_not_done': Count(
+        'id', filter=Q(latest_idp_status='expired')
+    ),
+    'count_idp_with_status_cancelled': Count(
+        'id', filter=Q(latest_idp_status='cancelled')
+    ),
+    'count_idp_with_status_awaiting_review': Count(
+        'id', filter=Q(latest_idp_status='awaiting_review')
+    ),
+    'count_idp_without_tasks': Count(
+        'id', filter=Q(
+            latest_idp_status__isnull=False, latest_idp_has_tasks=False
+        )
+    ),
+}
+
+
+def annotate_latest_idp(employees):
+    """
+    Добавляет к сотрудникам статус последнего ИПР, выданного их
+    руководителем, и признак наличия в нем задач
+    """
+    latest_idps = IDP.objects.filter(
+        author=OuterRef('head'), employee=OuterRef('pk')
+    ).order_by('-id')
+    return employees.annotate(
+        latest_idp_id=Subquery(latest_idps.values('id')[:1]),
+        latest_idp_status=Subquery(latest_idps.values('status__slug')[:1]),
+    ).annotate(
+        latest_idp_has_tasks=Exists(
+            Task.objects.filter(idp=OuterRef('latest_idp_id'))
+        ),
+    )
+
+
+def collect_statistics(employees):
+    """Возвращает счетчики статистики, сгруппированные по руководителям"""
+    rows = annotate_latest_idp(
+        employees.filter(head__isnull=False)
+    ).order_by().values('head').annotate(**STATISTICS_AGGREGATES)
+    return {
+        row.pop('head'): Counter(row) for row in rows
+    }
+
+
+def format_statistics(counts):
+    """Дополняет счетчики статистики производными показателями"""
+    count_employe = counts['count_employe']
+    count_employe_with_idp = counts['count_employe_with_idp']
+    if count_employe:
+        percent_progress_employees = int(
+            100 * count_employe_with_idp / count_employe
+        )
+    else:
+        percent_progress_employees = None
+    return {
+        'count_employe': count_employe,
+        'count_employe_with_idp': count_employe_with_idp,
+        'percent_progress_employees': percent_progress_employees,
+        'count_employe_without_idp': count_employe - count_employe_with_idp,
+        'count_idp_without_tasks': counts['count_idp_without_tasks'],
+        'count_idp_with_status_not_done':
+            counts['count_idp_with_status_not_done'],
+        'count_idp_with_status_awaiting_review':
+            counts['count_idp_with_status_awaiting_review'],
+        'count_idp_with_status_cancelled':
+            counts['count_idp_with_status_cancelled'],
+    }
+
+
+def get_manager_statistics(manager):
+    """
+    Считает статистику руководителя одним агрегирующим запросом
+    по последним ИПР его сотрудников
+    """
+    counts = collect_statistics(Employee.objects.filter(head=manager))
+    return format_statistics(counts.get(manager.id, Counter()))
+
+
+def rebuild_manager_statistics(managers=None, create=True):
+    """
+    Пересчитывает сводную статистику руководителей с нуля.
+    При create=False обновляются только уже существующие строки.
+    Строку, которую успел создать параллельный пересчет, не дублирует
+    """
+    manager_ids = Manager.objects.values_list('id', flat=True)
+    if managers is not None:
+        manager_ids = manager_ids.filter(id__in=managers)
+    manager_ids = list(manager_ids)
+    with transaction.atomic():
+        existing = {
+            row.manager_id: row
+            for row in ManagerStatistics.objects.select_for_update().filter(
+                manager__in=manager_ids
+            ).order_by('manager')
+        }
+        counts = collect_statistics(
+            Employee.objects.filter(head__in=manager_ids)
+        )
+        created = []
+        for manager_id in manager_ids:
+            row = existing.get(manager_id)
+            if row is None:
+                if not create:
+                    continue
+                row = ManagerStatistics(manager_id=manager_id)
+                created.append(row)
+            manager_counts = counts.get(manager_id, Counter())
+            for field in STATISTICS_AGGREGATES:
+                setattr(row, field, manager_counts[field])
+        ManagerStatistics.objects.bulk_update(
+            existing.values(), STATISTICS_AGGREGATES.keys()
+        )
+        ManagerStatistics.objects.bulk_create(created, ignore_conflicts=True)
+
+
+def find_inconsistent_statistics():
+    """
+    Сверяет сохраненную статистику с пересчитанной и возвращает
+    id руководителей, у которых она расходится
+    """
+    counts = collect_statistics(Employee.objects.all())
+    inconsistent = []
+    for row in ManagerStatistics.objects.values(
+        'manager', *STATISTICS_AGGREGATES
+    ):
+        expected = counts.get(row['manager'], Counter())
+        if any(
+            expected[field] != row[field]
+            for field in STATISTICS_AGGREGATES
+        ):
+            inconsistent.append(row['manager'])
+    return sorted(inconsistent)
+
+
+def lock_statistics(employees):
+    """
+    Блокирует до конца транзакции строки статистики руководителей
+    сотрудников. Параллельные изменения считают разницу по очереди, а не
+    от одного и того же состояния
+    """
+    list(ManagerStatistics.objects.select_for_update().filter(
+        manager__in=employees.exclude(head=None).values('head')
+    ).order_by('manager').values_list('pk', flat=True))
+
+
+def apply_statistics_delta(before, after):
+    """
+    Применяет к сводной статистике разницу вклада сотрудников.
+    Отсутствующие строки будут построены при первом чтении
+    """
+    for manager_id in before.keys() | after.keys():
+        delta = {
+            field: (
+                after.get(manager_id, Counter())[field]
+                - before.get(manager_id, Counter())[field]
+            )
+            for field in STATISTICS_AGGREGATES
+        }
+        delta = {field: value for field, value in delta.items() if value}
+        if not delta:
+            continue
+        ManagerStatistics.objects.filter(manager_id=manager_id).update(**{
+            field: F(field) + value for field, value in delta.items()
+        })
+
+
+@contextmanager
+def track_statistics(employee_ids):
+    """
+    Применяет к сводной статистике изменение вклада сотрудников за время
+    выполнения блока. Нужен для массовых операций, минующих сигналы
+    """
+    employees = Employee.objects.filter(id__in=employee_ids)
+    with transaction.atomic(savepoint=False):
+        lock_statistics(employees)
+        before = collect_statistics(employees)
+        yield
+        apply_statistics_delta(before, collect_statistics(employees))
+
+
+@contextmanager
+def delete_tasks_in_bulk():
+    """
+    Отключает пересчет счетчиков ИПР и статистики в сигналах удаления
+    задач. Вызывающий код пересчитывает их сам один раз после удаления
+    """
+    token = tasks_deleted_in_bulk.set(True)
+    try:
+        yield
+    finally:
+        tasks_deleted_in_bulk.reset(token)
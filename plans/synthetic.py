@@ -0,0 +1,242 @@
+"""Синтетическая оргструктура для замеров производительности."""
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from plans.models import (IDP, IdpComment, StatusIDP, StatusTask, Task,
+                          TaskComment, TypeTask)
+from plans.statistics import rebuild_manager_statistics
+from users.models import Employee, Manager, MentorEmployee, User
+
+IDP_STATUS_WEIGHTS = {
+    'open': 2,
+    'in_progress': 4,
+    'awaiting_review': 1,
+    'completed': 3,
+    'expired': 1,
+    'cancelled': 1,
+}
+TASK_STATUS_WEIGHTS = {'open': 2, 'in_progress': 2, 'completed': 3}
+MENTOR_SHARE = 0.3
+EMPLOYEE_BATCH_SIZE = 1000
+
+
+def choose(weights):
+    """Выбирает ключ словаря с учетом весов"""
+    return random.choices(list(weights), list(weights.values()))[0]
+
+
+def create_users(prefix, role, count):
+    """Создает пользователей без пароля и возвращает их id"""
+    password = make_password(None)
+    User.objects.bulk_create(
+        [
+            User(
+                username=f'{prefix}_{role}_{number}',
+                first_name='Имя',
+                middle_name='Отчество',
+                last_name='Фамилия',
+                role=role,
+                password=password,
+            )
+            for number in range(count)
+        ],
+        batch_size=EMPLOYEE_BATCH_SIZE,
+    )
+    return list(User.objects.filter(
+        username__startswith=f'{prefix}_{role}_'
+    ).order_by('id').values_list('id', flat=True))
+
+
+def create_comments(model, field, parents, count):
+    """Создает комментарии авторов из участников ИПР"""
+    model.objects.bulk_create(
+        [
+            model(
+                author_id=random.choice(authors),
+                text='Комментарий',
+                **{field: parent_id},
+            )
+            for parent_id, authors in parents
+            for _ in range(random.randint(0, 2 * count))
+        ],
+        batch_size=EMPLOYEE_BATCH_SIZE,
+    )
+
+
+def create_idps(
+    employees, users, idps_per_employee, tasks_per_idp, comments_per_idp,
+    statuses
+):
+    """
+    Создает ИПР, задачи, комментарии и связи ментор-сотрудник для пачки
+    сотрудников. users сопоставляет id профилей с id пользователей
+    """
+    idps = []
+    task_statuses = []
+    now = timezone.now()
+    for employee_id, head_id, colleagues in employees:
+        for _ in range(idps_per_employee):
+            tasks = [
+                choose(TASK_STATUS_WEIGHTS)
+                for _ in range(random.randint(0, 2 * tasks_per_idp))
+            ]
+            mentor_id = random.choice(colleagues)
+            idps.append(IDP(
+                author_id=head_id,
+                employee_id=employee_id,
+                mentor_id=(
+                    mentor_id
+                    if mentor_id != employee_id
+                    and random.random() < MENTOR_SHARE
+                    else None
+                ),
+                name='ИПР',
+                deadline=now + timezone.timedelta(
+                    days=random.randint(-60, 60)
+                ),
+                status=statuses['idp'][choose(IDP_STATUS_WEIGHTS)],
+                task_count=len(tasks),
+                task_done_count=tasks.count('completed'),
+                task_in_progress_count=tasks.count('in_progress'),
+            ))
+            task_statuses.append(tasks)
+    IDP.objects.bulk_create(idps)
+    created_idps = list(IDP.objects.filter(
+        employee__in=[employee_id for employee_id, _, _ in employees]
+    ).order_by('id').values_list('id', 'employee', 'author', 'mentor'))
+    Task.objects.bulk_create(
+        [
+            Task(
+                idp_id=idp_id,
+                type=statuses['type'],
+                name='Задача',
+                description='Описание',
+                source='Источник',
+                status=statuses['task'][status],
+            )
+            for (idp_id, _, _, _), tasks in zip(created_idps, task_statuses)
+            for status in tasks
+        ],
+        batch_size=EMPLOYEE_BATCH_SIZE,
+    )
+    MentorEmployee.objects.bulk_create(
+        [
+            MentorEmployee(mentor_id=mentor_id, mentee_id=employee_id)
+            for mentor_id, employee_id in {
+                (mentor_id, employee_id)
+                for _, employee_id, _, mentor_id in created_idps
+                if mentor_id is not None
+            }
+        ],
+        ignore_conflicts=True,
+    )
+    if comments_per_idp:
+        participants = {
+            idp_id: [
+                users[role, profile_id]
+                for role, profile_id in (
+                    ('employee', employee_id),
+                    ('manager', author_id),
+                    ('employee', mentor_id),
+                )
+                if profile_id is not None
+            ]
+            for idp_id, employee_id, author_id, mentor_id in created_idps
+        }
+        create_comments(
+            IdpComment, 'idp_id', participants.items(), comments_per_idp
+        )
+        create_comments(
+            TaskComment, 'task_id',
+            [
+                (task_id, participants[idp_id])
+                for task_id, idp_id in Task.objects.filter(
+                    idp__in=participants
+                ).values_list('id', 'idp')
+            ],
+            comments_per_idp,
+        )
+    return len(idps)
+
+
+def generate_org(
+    idps, employees_per_manager=10, idps_per_employee=4, tasks_per_idp=2,
+    comments_per_idp=0, prefix='synthetic', seed=0
+):
+    """
+    Создает руководителей, сотрудников, ИПР, задачи и комментарии
+    пачками в обход сигналов и затем пересчитывает денормализованные
+    данные. Возвращает количество созданных руководителей, сотрудников
+    и ИПР
+    """
+    random.seed(seed)
+    employee_count = -(-idps // idps_per_employee)
+    manager_count = -(-employee_count // employees_per_manager)
+    statuses = {
+        'idp': {
+            slug: StatusIDP.objects.get_or_create_cached(slug)
+            for slug in IDP_STATUS_WEIGHTS
+        },
+        'task': {
+            slug: StatusTask.objects.get_or_create_cached(slug)
+            for slug in TASK_STATUS_WEIGHTS
+        },
+        'type': TypeTask.objects.get_or_create_cached('course'),
+    }
+    with transaction.atomic():
+        Manager.objects.bulk_create([
+            Manager(user_id=user_id)
+            for user_id in create_users(prefix, 'manager', manager_count)
+        ])
+        managers = list(Manager.objects.filter(
+            user__username__startswith=f'{prefix}_manager_'
+        ).order_by('id').values_list('id', 'user'))
+        Employee.objects.bulk_create(
+            [
+                Employee(
+                    user_id=user_id,
+                    position='Разработчик',
+                    grade='Middle',
+                    head_id=managers[number // employees_per_manager][0],
+                )
+                for number, user_id in enumerate(
+                    create_users(prefix, 'employee', employee_count)
+                )
+            ],
+            batch_size=EMPLOYEE_BATCH_SIZE,
+        )
+    synthetic_employees = Employee.objects.filter(
+        user__username__startswith=f'{prefix}_employee_'
+    )
+    employees = list(
+        synthetic_employees.order_by('id').values_list('id', 'head', 'user')
+    )
+    users = {
+        ('manager', manager_id): user_id for manager_id, user_id in managers
+    }
+    colleagues = {}
+    for employee_id, head_id, user_id in employees:
+        users['employee', employee_id] = user_id
+        colleagues.setdefault(head_id, []).append(employee_id)
+    created = 0
+    for start in range(0, len(employees), EMPLOYEE_BATCH_SIZE):
+        batch = employees[start:start + EMPLOYEE_BATCH_SIZE]
+        with transaction.atomic():
+            created += create_idps(
+                [
+                    (employee_id, head_id, colleagues[head_id])
+                    for employee_id, head_id, _ in batch
+                ],
+                users, idps_per_employee, tasks_per_idp, comments_per_idp,
+                statuses
+            )
+    IDP.update_current_idps(synthetic_employees.values('id'))
+    rebuild_manager_statistics()
+    return {
+        'managers': len(managers),
+        'employees': len(employees),
+        'idps': created,
+    }
@@ -0,0 +1,60 @@
+"""Общие данные для тестов: пользователи, справочники, ИПР и задачи."""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+
+from plans.models import IDP, StatusIDP, StatusTask, Task, TypeTask
+
+
+class CleanCacheMixin:
+    """Каждый тест начинается с пустого кэша"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+def create_user(username, role='employee', **kwargs):
+    return get_user_model().objects.create_user(
+        username=username, role=role, **kwargs
+    )
+
+
+def create_manager(username):
+    """Создает руководителя и возвращает его профиль"""
+    return create_user(username, role='manager').manager_profile
+
+
+def create_employee(username, head=None):
+    """Создает сотрудника в команде руководителя и возвращает его профиль"""
+    employee = create_user(username).employee_profile
+    if head is not None:
+        employee.head = head
+        employee.save()
+    return employee
+
+
+def create_statuses(*slugs):
+    """Создает одноименные статусы ИПР и задач"""
+    for slug in slugs:
+        StatusIDP.objects.create(name=slug, slug=slug)
+        StatusTask.objects.create(name=slug, slug=slug)
+
+
+def create_idp(author, employee, **kwargs):
+    kwargs.setdefault('name', 'ИПР')
+    kwargs.setdefault(
+        'deadline', timezone.now() + timezone.timedelta(days=7)
+    )
+    return IDP.objects.create(author=author, employee=employee, **kwargs)
+
+
+def create_task(idp, **kwargs):
+    if 'type' not in kwargs:
+        kwargs['type'] = TypeTask.objects.get_or_create(
+            slug='course', defaults={'name': 'Курс'}
+        )[0]
+    kwargs.setdefault('name', 'Задача')
+    kwargs.setdefault('description', 'Описание')
+    kwargs.setdefault('source', 'Источник')
+    return Task.objects.create(idp=idp, **kwargs)
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from plans.export import CSV_COLUMNS, filter_idps, iter_csv, iter_ndjson
+from plans.models import IDP, IdpComment, StatusIDP, TaskComment, TypeTask
+from plans.tests.fixtures import (create_employee, create_idp, create_task,
+                                  create_user)
+
+
+class ExportTest(TestCase):
+    """Выгрузка ИПР с задачами и комментариями"""
+
+    def setUp(self):
+        self.manager = create_user(
+            'manager', role='manager', last_name='Петров', first_name='Петр',
+        ).manager_profile
+        course = TypeTask.objects.create(name='Курс', slug='course')
+        self.idps = []
+        for number in range(5):
+            employee = create_employee(
+                f'employee_{number}', head=self.manager
+            )
+            idp = create_idp(self.manager, employee, name=f'ИПР {number}')
+            self.idps.append(idp)
+            IdpComment.objects.create(
+                idp=idp, author=self.manager.user, text='Начнем'
+            )
+            for task_number in range(number % 3):
+                task = create_task(
+                    idp, type=course, name=f'Задача {task_number}'
+                )
+                TaskComment.objects.create(
+                    task=task, author=employee.user, text='Готово,\nсдаю'
+                )
+
+    def test_ndjson(self):
+        lines = ''.join(iter_ndjson(filter_idps(), chunk_size=2)).splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [record['id'] for record in records],
+            [idp.id for idp in self.idps]
+        )
+        record = records[2]
+        self.assertEqual(record['status'], 'open')
+        self.assertEqual(record['manager']['name'], 'Петров Петр')
+        self.assertEqual(record['mentor'], None)
+        self.assertEqual(record['comments'][0]['text'], 'Начнем')
+        self.assertEqual(len(record['tasks']), 2)
+        self.assertEqual(record['tasks'][1]['name'], 'Задача 1')
+        self.assertEqual(
+            record['tasks'][1]['comments'][0]['text'], 'Готово,\nсдаю'
+        )
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(
+            ''.join(iter_csv(filter_idps(), chunk_size=2))
+        )))
+        self.assertEqual(rows[0], list(CSV_COLUMNS))
+        self.assertEqual(len(rows), 1 + 1 + 1 + 2 + 1 + 1)
+        row = dict(zip(CSV_COLUMNS, rows[3]))
+        self.assertEqual(row['idp_id'], str(self.idps[2].id))
+        self.assertEqual(row['employee'], 'employee_2')
+        self.assertEqual(row['task_name'], 'Задача 0')
+        self.assertTrue(row['task_comments'].endswith('Готово,\nсдаю'))
+        row = dict(zip(CSV_COLUMNS, rows[1]))
+        self.assertEqual(row['task_id'], '')
+        self.assertIn('manager: Начнем', row['idp_comments'])
+
+    def test_filters(self):
+        IDP.objects.filter(pk=self.idps[0].pk).update(
+            status=StatusIDP.objects.create(name='Выполнен', slug='completed'),
+            pub_date=timezone.now() - timezone.timedelta(days=30),
+        )
+        self.assertEqual(
+            list(filter_idps(
+                status=StatusIDP.objects.get_cached('completed')
+            )),
+            [self.idps[0]]
+        )
+        self.assertEqual(
+            filter_idps(
+                manager=self.manager,
+                date_from=timezone.localdate() - timezone.timedelta(days=1),
+            ).count(),
+            4
+        )
+
+    def test_queries_per_chunk(self):
+        with CaptureQueriesContext(connection) as context:
+            list(iter_ndjson(filter_idps(), chunk_size=2))
+        self.assertEqual(len(context), 3 * 4 + 1)
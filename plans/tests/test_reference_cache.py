@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+
+from plans.models import StatusIDP, TypeTask
+
+
+class SlugCacheManagerTest(TestCase):
+    """Справочники читаются из кэша процесса"""
+
+    def setUp(self):
+        self.status = StatusIDP.objects.create(name='Открыт', slug='open')
+
+    def test_cached_lookup_without_queries(self):
+        StatusIDP.objects.get_cached('open')
+        with self.assertNumQueries(0):
+            self.assertEqual(StatusIDP.objects.get_cached('open'), self.status)
+            self.assertEqual(
+                StatusIDP.objects.get_cached(pk=self.status.pk), self.status
+            )
+
+    def test_cache_cleared_on_change(self):
+        StatusIDP.objects.get_cached('open')
+        self.status.name = 'Новый'
+        self.status.save()
+        self.assertEqual(StatusIDP.objects.get_cached('open').name, 'Новый')
+
+        self.status.delete()
+        with self.assertRaises(StatusIDP.DoesNotExist):
+            StatusIDP.objects.get_cached('open')
+
+    def test_get_or_create_cached(self):
+        with self.assertRaises(TypeTask.DoesNotExist):
+            TypeTask.objects.get_cached('course')
+        course = TypeTask.objects.get_or_create_cached('course')
+        self.assertEqual(TypeTask.objects.get_cached('course'), course)
+
+    def test_version_changes_after_commit(self):
+        version = cache.get(StatusIDP.objects.version_key)
+        with self.captureOnCommitCallbacks() as callbacks:
+            StatusIDP.objects.create(name='В работе', slug='in_progress')
+            self.assertEqual(
+                StatusIDP.objects.get_cached('in_progress').name, 'В работе'
+            )
+            self.assertEqual(
+                cache.get(StatusIDP.objects.version_key), version
+            )
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertNotEqual(cache.get(StatusIDP.objects.version_key), version)
+        self.assertEqual(
+            StatusIDP.objects.get_cached('in_progress').name, 'В работе'
+        )
+
+    def test_rolled_back_change_is_forgotten(self):
+        version = cache.get(StatusIDP.objects.version_key)
+        with transaction.atomic():
+            StatusIDP.objects.create(name='В работе', slug='in_progress')
+            StatusIDP.objects.get_cached('in_progress')
+            transaction.set_rollback(True)
+        with self.assertRaises(StatusIDP.DoesNotExist):
+            StatusIDP.objects.get_cached('in_progress')
+        self.assertEqual(cache.get(StatusIDP.objects.version_key), version)
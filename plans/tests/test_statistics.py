@@ -0,0 +1,273 @@
+import random
+import threading
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from plans.models import IDP, ManagerStatistics, StatusIDP, Task, TypeTask
+from plans.statistics import (STATISTICS_AGGREGATES, collect_statistics,
+                              find_inconsistent_statistics, format_statistics,
+                              get_manager_statistics,
+                              rebuild_manager_statistics)
+from plans.tests.fixtures import (create_employee, create_idp, create_manager,
+                                  create_task)
+from users.models import Employee, User
+
+IDP_STATUSES = [
+    'open', 'in_progress', 'awaiting_review',
+    'completed', 'expired', 'cancelled'
+]
+
+
+def reference_statistics(manager):
+    """Построчный подсчет статистики, как он был реализован изначально"""
+    employees = Employee.objects.filter(head=manager)
+    idps = IDP.objects.filter(author=manager, employee__in=employees)
+    current_idps = []
+    count_employe_with_idp = 0
+    count_idp_with_status_not_done = 0
+    count_idp_with_status_cancelled = 0
+    count_idp_status_review = 0
+    for employee in employees:
+        idp = idps.filter(employee=employee).last()
+        if idp:
+            if idp.status.slug in ['in_progress', 'open', 'awaiting_review']:
+                count_employe_with_idp += 1
+            elif idp.status.slug == 'expired':
+                count_idp_with_status_not_done += 1
+            elif idp.status.slug == 'cancelled':
+                count_idp_with_status_cancelled += 1
+            if idp.status.slug == 'awaiting_review':
+                count_idp_status_review += 1
+            current_idps.append(idp)
+    count_employe = employees.count()
+    idps_with_tasks = idps.filter(task__in=Task.objects.filter(idp__in=idps))
+    count_idp_without_tasks = len(current_idps) - len(
+        set(current_idps).intersection(list(idps_with_tasks))
+    )
+    return {
+        'count_employe': count_employe,
+        'count_employe_with_idp': count_employe_with_idp,
+        'percent_progress_employees': (
+            int(100 * count_employe_with_idp / count_employe)
+            if count_employe else None
+        ),
+        'count_employe_without_idp': count_employe - count_employe_with_idp,
+        'count_idp_without_tasks': count_idp_without_tasks,
+        'count_idp_with_status_not_done': count_idp_with_status_not_done,
+        'count_idp_with_status_awaiting_review': count_idp_status_review,
+        'count_idp_with_status_cancelled': count_idp_with_status_cancelled,
+    }
+
+
+class ManagerStatisticsTest(TestCase):
+    """Сверка агрегированной статистики с построчным подсчетом"""
+
+    def setUp(self):
+        random.seed(12)
+        self.statuses = {
+            slug: StatusIDP.objects.create(name=slug, slug=slug)
+            for slug in IDP_STATUSES
+        }
+        self.type_task = TypeTask.objects.create(name='Курс', slug='course')
+        self.managers = [
+            create_manager(f'manager_{number}') for number in range(3)
+        ]
+        employees = [
+            create_employee(
+                f'employee_{number}', head=random.choice(self.managers)
+            )
+            for number in range(30)
+        ]
+
+        for employee in employees:
+            for _ in range(random.randint(0, 3)):
+                idp = create_idp(
+                    employee.head, employee,
+                    status=random.choice(list(self.statuses.values())),
+                )
+                for _ in range(random.randint(0, 2)):
+                    create_task(idp, type=self.type_task)
+        for employee in random.sample(employees, 5):
+            employee.head = random.choice(self.managers)
+            employee.save()
+
+    def test_statistics_match_reference(self):
+        for manager in self.managers:
+            with self.subTest(manager=manager.id):
+                self.assertEqual(
+                    get_manager_statistics(manager),
+                    reference_statistics(manager)
+                )
+
+    def test_statistics_without_employees(self):
+        manager = create_manager('lonely_manager')
+        self.assertEqual(
+            get_manager_statistics(manager),
+            reference_statistics(manager)
+        )
+
+
+class ManagerStatisticsMaintenanceTest(ManagerStatisticsTest):
+    """Сводная статистика остается согласованной после изменений ИПР"""
+
+    def setUp(self):
+        super().setUp()
+        rebuild_manager_statistics()
+
+    def assertStatisticsConsistent(self):
+        self.assertEqual(find_inconsistent_statistics(), [])
+        for manager in self.managers:
+            statistics = ManagerStatistics.objects.get(manager=manager)
+            self.assertEqual(
+                format_statistics({
+                    field: getattr(statistics, field)
+                    for field in STATISTICS_AGGREGATES
+                }),
+                reference_statistics(manager)
+            )
+
+    def test_rebuild(self):
+        self.assertStatisticsConsistent()
+
+    def test_idp_changes(self):
+        employee = Employee.objects.filter(head__isnull=False).first()
+        idp = IDP.objects.create(
+            author=employee.head,
+            employee=employee,
+            name='Новый ИПР',
+            deadline=timezone.now() + timezone.timedelta(days=7),
+        )
+        self.assertStatisticsConsistent()
+
+        task = Task.objects.create(
+            idp=idp, type=self.type_task, name='Задача',
+            description='Описание', source='Источник'
+        )
+        self.assertStatisticsConsistent()
+
+        idp.status = self.statuses['awaiting_review']
+        idp.save()
+        self.assertStatisticsConsistent()
+
+        task.delete()
+        self.assertStatisticsConsistent()
+
+        idp.delete()
+        self.assertStatisticsConsistent()
+
+    def test_employee_changes(self):
+        employee = Employee.objects.filter(head=self.managers[0]).first()
+        employee.head = self.managers[1]
+        employee.save()
+        self.assertStatisticsConsistent()
+
+        create_employee('new_employee').delete()
+        employee.user.delete()
+        self.assertStatisticsConsistent()
+
+    def delete_idp_with_tasks(self, employee, tasks):
+        idp = create_idp(employee.head, employee)
+        Task.objects.bulk_create([
+            Task(
+                idp=idp, type=self.type_task, name='Задача',
+                description='Описание', source='Источник'
+            )
+            for _ in range(tasks)
+        ])
+        with CaptureQueriesContext(connection) as context:
+            idp.delete()
+        self.assertStatisticsConsistent()
+        return len(context)
+
+    def test_idp_delete_queries_do_not_grow_with_tasks(self):
+        employee = Employee.objects.filter(head__isnull=False).first()
+        self.assertEqual(
+            self.delete_idp_with_tasks(employee, 2),
+            self.delete_idp_with_tasks(employee, 20)
+        )
+
+    def test_bulk_delete(self):
+        Task.objects.filter(idp__employee__head=self.managers[0]).delete()
+        self.assertStatisticsConsistent()
+
+        IDP.objects.filter(author=self.managers[1]).delete()
+        self.assertStatisticsConsistent()
+
+        User.objects.filter(
+            employee_profile__head=self.managers[2]
+        ).delete()
+        self.assertStatisticsConsistent()
+
+    def test_inconsistency_detected(self):
+        ManagerStatistics.objects.filter(manager=self.managers[0]).update(
+            count_employe=100
+        )
+        self.assertEqual(
+            find_inconsistent_statistics(), [self.managers[0].id]
+        )
+
+
+@skipUnless(
+    connection.vendor == 'postgresql', 'Нужны блокировки строк PostgreSQL'
+)
+class ConcurrentStatisticsTest(TransactionTestCase):
+    """Параллельные изменения ИПР не расходятся со статистикой"""
+
+    def setUp(self):
+        for slug in IDP_STATUSES:
+            StatusIDP.objects.create(name=slug, slug=slug)
+        manager = create_manager('manager_concurrent')
+        self.idp = create_idp(
+            manager, create_employee('employee_concurrent', head=manager)
+        )
+        rebuild_manager_statistics()
+
+    def change_status(self, slug):
+        try:
+            idp = IDP.objects.get(pk=self.idp.pk)
+            idp.status = StatusIDP.objects.get(slug=slug)
+            idp.save()
+        except Exception as error:
+            self.errors.append(error)
+        finally:
+            connection.close()
+
+    def test_concurrent_saves_of_one_idp(self):
+        self.errors = []
+        remembered = threading.Event()
+        resume = threading.Event()
+
+        def pause_after_first_collect(employees):
+            counts = collect_statistics(employees)
+            if (
+                threading.current_thread() is first
+                and not remembered.is_set()
+            ):
+                remembered.set()
+                resume.wait(10)
+            return counts
+
+        first = threading.Thread(
+            target=self.change_status, args=['cancelled']
+        )
+        second = threading.Thread(
+            target=self.change_status, args=['expired']
+        )
+        with mock.patch(
+            'plans.signals.collect_statistics', pause_after_first_collect
+        ):
+            first.start()
+            remembered.wait(10)
+            second.start()
+            second.join(1)
+            resume.set()
+            first.join(10)
+            second.join(10)
+        self.assertEqual(self.errors, [])
+        self.idp.refresh_from_db()
+        self.assertEqual(self.idp.status.slug, 'expired')
+        self.assertEqual(find_inconsistent_statistics(), [])
@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import models
+from django.test import TestCase
+
+from plans.models import IDP, TASK_COUNTERS, IdpComment, TaskComment
+from plans.statistics import find_inconsistent_statistics
+from plans.synthetic import generate_org
+from users.models import Employee, MentorEmployee
+
+
+class GenerateOrgTest(TestCase):
+    """Синтетическая оргструктура согласована с денормализованными данными"""
+
+    def test_generate_org(self):
+        self.assertEqual(
+            generate_org(40, employees_per_manager=5, idps_per_employee=4),
+            {'managers': 2, 'employees': 10, 'idps': 40}
+        )
+        self.assertEqual(find_inconsistent_statistics(), [])
+        counters = list(IDP.objects.order_by('id').values_list(
+            'id', *TASK_COUNTERS
+        ))
+        IDP.update_task_counters(IDP.objects.values('id'))
+        self.assertEqual(
+            list(IDP.objects.order_by('id').values_list(
+                'id', *TASK_COUNTERS
+            )),
+            counters
+        )
+        for employee in Employee.objects.all():
+            self.assertEqual(
+                employee.current_idp_id,
+                IDP.objects.filter(
+                    employee=employee
+                ).latest('pub_date', 'id').id
+            )
+
+    def test_command_output(self):
+        stdout = StringIO()
+        call_command(
+            'generate_org', managers=2, employees_per_manager=5,
+            idps_per_employee=4, stdout=stdout
+        )
+        self.assertRegex(
+            stdout.getvalue(),
+            r'^Generated 2 managers, 10 employees and 40 IDPs in [\d.]+s\n$'
+        )
+
+    def test_generate_org_with_comments(self):
+        generate_org(
+            40, employees_per_manager=5, idps_per_employee=4,
+            comments_per_idp=2, prefix='commented'
+        )
+        self.assertTrue(IdpComment.objects.exists())
+        self.assertTrue(TaskComment.objects.exists())
+        self.assertFalse(IdpComment.objects.filter(
+            author__username__startswith='commented_'
+        ).exclude(
+            author__employee_profile=models.F('idp__employee')
+        ).exclude(
+            author__manager_profile=models.F('idp__author')
+        ).exclude(
+            author__employee_profile=models.F('idp__mentor')
+        ).exists())
+        for idp in IDP.objects.filter(mentor__isnull=False):
+            self.assertTrue(MentorEmployee.objects.filter(
+                mentor=idp.mentor, mentee=idp.employee
+            ).exists())
+        self.assertEqual(find_inconsistent_statistics(), [])
@@ -0,0 +1,104 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from plans.models import IDP, StatusTask, Task, TypeTask
+from plans.tests.fixtures import (create_employee, create_idp, create_manager,
+                                  create_task)
+from users.models import Employee
+
+
+class TaskCountersTest(TestCase):
+    """Счетчики задач ИПР поддерживаются при изменении задач"""
+
+    def setUp(self):
+        manager = create_manager('manager')
+        employee = create_employee('employee', head=manager)
+        self.statuses = {
+            slug: StatusTask.objects.create(name=slug, slug=slug)
+            for slug in ('open', 'in_progress', 'completed')
+        }
+        self.type_task = TypeTask.objects.create(name='Курс', slug='course')
+        self.idp = create_idp(manager, employee)
+
+    def create_task(self, status='open'):
+        return create_task(
+            self.idp, type=self.type_task, status=self.statuses[status]
+        )
+
+    def assertCounters(self, total, done, in_progress):
+        self.idp.refresh_from_db()
+        self.assertEqual(
+            (
+                self.idp.task_count,
+                self.idp.task_done_count,
+                self.idp.task_in_progress_count
+            ),
+            (total, done, in_progress)
+        )
+
+    def test_counters_follow_task_changes(self):
+        task = self.create_task()
+        self.create_task('completed')
+        self.assertCounters(2, 1, 0)
+
+        task.status = self.statuses['in_progress']
+        task.save()
+        self.assertCounters(2, 1, 1)
+
+        task.delete()
+        self.assertCounters(1, 1, 0)
+
+        Task.objects.filter(idp=self.idp).delete()
+        self.assertCounters(0, 0, 0)
+
+    def test_idp_save_keeps_counters(self):
+        stale_idp = IDP.objects.get(pk=self.idp.pk)
+        self.create_task()
+        stale_idp.name = 'Новое название'
+        stale_idp.save()
+        self.assertCounters(1, 0, 0)
+        self.assertEqual(self.idp.name, 'Новое название')
+
+
+class CurrentIDPTest(TestCase):
+    """Указатель на текущий ИПР сотрудника поддерживается при изменении ИПР"""
+
+    def setUp(self):
+        self.manager = create_manager('manager')
+        self.employees = [
+            create_employee(f'employee_{number}', head=self.manager)
+            for number in range(2)
+        ]
+
+    def create_idp(self, employee):
+        return create_idp(self.manager, employee)
+
+    def assertCurrentIDP(self, employee, idp):
+        employee.refresh_from_db()
+        self.assertEqual(employee.current_idp_id, idp and idp.id)
+
+    def test_current_idp_follows_idp_changes(self):
+        first, second = self.employees
+        previous = self.create_idp(first)
+        latest = self.create_idp(first)
+        self.assertCurrentIDP(first, latest)
+        self.assertTrue(latest.is_current())
+        self.assertFalse(previous.is_current())
+
+        latest.employee = second
+        latest.save()
+        self.assertCurrentIDP(first, previous)
+        self.assertCurrentIDP(second, latest)
+
+        previous.delete()
+        self.assertCurrentIDP(first, None)
+        self.assertCurrentIDP(second, latest)
+
+    def test_rebuild(self):
+        idp = self.create_idp(self.employees[0])
+        Employee.objects.update(current_idp=None)
+        call_command('rebuild_idp_data', stdout=StringIO())
+        self.assertCurrentIDP(self.employees[0], idp)
+        self.assertCurrentIDP(self.employees[1], None)
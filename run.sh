@@ -1,24 +1,57 @@
 #!/bin/sh
-echo "Running migrations..."
-python manage.py makemigrations;
-python manage.py migrate;
+# Usage: run.sh [all|release|web|worker|maintenance|beat]
+# Run release once per deploy, the other modes can then be started
+# in any number of replicas. all runs everything in one container.
+set -e
+export STARTED_AT=${STARTED_AT:-$(date +%s.%N)}
 
-echo "Collecting static files..."
-python manage.py collectstatic --noinput;
+release() {
+    echo "Preparing release..."
+    python manage.py prepare_release;
 
-echo "Loading initial data..."
-python manage.py loaddata user_dump.json;
-python manage.py update_users;
-python manage.py loaddata other_dump.json;
+    echo "Copying static files..."
+    cp -r /app/collected_static/. /backend_static/static/
+}
 
-echo "Starting Celery worker..."
-celery -A alfa_people worker -l info --pool=solo &
+worker() {
+    echo "Starting Celery worker for interactive tasks..."
+    exec celery -A alfa_people worker -l info -Q interactive -n interactive@%h --pool=${CELERY_POOL:-prefork} --concurrency=${CELERY_CONCURRENCY:-2}
+}
 
-echo "Starting Celery beat..."
-celery -A alfa_people beat --loglevel=info &
+maintenance() {
+    echo "Starting Celery worker for maintenance tasks..."
+    exec celery -A alfa_people worker -l info -Q maintenance -n maintenance@%h --pool=solo
+}
 
-echo "Copying static files..."
-cp -r /app/collected_static/. /backend_static/static/
+beat() {
+    echo "Starting Celery beat..."
+    exec celery -A alfa_people beat --loglevel=info
+}
 
-echo "Starting Gunicorn..."
-gunicorn --bind 0:8000 alfa_people.wsgi;
\ No newline at end of file
+web() {
+    echo "Starting Gunicorn..."
+    if [ "$SERVER_MODE" = "asgi" ]; then
+        exec gunicorn --config gunicorn.conf.py --bind 0:8000 --workers ${GUNICORN_WORKERS:-3} --worker-class uvicorn.workers.UvicornWorker alfa_people.asgi;
+    else
+        exec gunicorn --config gunicorn.conf.py --bind 0:8000 --workers ${GUNICORN_WORKERS:-3} alfa_people.wsgi;
+    fi
+}
+
+case "${1:-all}" in
+    release) release ;;
+    web) web ;;
+    worker) worker ;;
+    maintenance) maintenance ;;
+    beat) beat ;;
+    all)
+        release
+        worker &
+        maintenance &
+        beat &
+        web
+        ;;
+    *)
+        echo "Unknown mode: $1" >&2
+        exit 1
+        ;;
+esac
@@ -0,0 +1,86 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import Employee, Manager, User
+
+PROFILES = {'manager_profile': Manager, 'employee_profile': Employee}
+
+
+def token_cache_key(key):
+    """Ключ кэша токена. Сам токен в ключ не попадает"""
+    return f'auth_token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def invalidate_tokens(keys):
+    """
+    Удаляет токены из кэша после фиксации транзакции. Запрос, пришедший
+    до фиксации, иначе снова положил бы в кэш прежние данные
+    """
+    cache_keys = [token_cache_key(key) for key in keys]
+    if cache_keys:
+        transaction.on_commit(lambda: cache.delete_many(cache_keys))
+
+
+def invalidate_user_tokens(user_id):
+    """Удаляет из кэша токены пользователя"""
+    invalidate_users_tokens([user_id])
+
+
+def invalidate_users_tokens(user_ids):
+    """Удаляет из кэша токены пользователей одним запросом"""
+    invalidate_tokens(Token.objects.filter(
+        user__in=user_ids
+    ).values_list('key', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену, которая хранит пользователя и id его
+    профилей в кэше. Профили подставляются с отложенной загрузкой
+    полей, поэтому изменяемые данные сотрудника не берутся из кэша
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            cached = self.load_credentials(key)
+            cache.set(cache_key, cached, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        token, profile_ids = cached
+        user = token.user
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        for name, model in PROFILES.items():
+            profile = None
+            if profile_ids[name] is not None:
+                profile = model.from_db(
+                    token._state.db, ['id', 'user_id'],
+                    [profile_ids[name], user.id]
+                )
+                profile.user = user
+            User._meta.get_field(name).set_cached_value(user, profile)
+        return user, token
+
+    def load_credentials(self, key):
+        """Загружает токен, пользователя и id его профилей одним запросом"""
+        try:
+            token = Token.objects.select_related(
+                'user', *(f'user__{name}' for name in PROFILES)
+            ).get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        profile_ids = {}
+        for name in PROFILES:
+            profile = getattr(token.user, name, None)
+            profile_ids[name] = profile.id if profile else None
+        token.user._state.fields_cache.clear()
+        return token, profile_ids
@@ -0,0 +1,423 @@
+"""Массовый импорт пользователей, руководителей, сотрудников и менторов."""
+import csv
+import json
+import os
+import re
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from plans.statistics import rebuild_manager_statistics
+
+from .authentication import invalidate_users_tokens
+from .models import Employee, Manager, MentorEmployee, User
+
+IMPORT_CHUNK_SIZE = 1000
+READ_BLOCK_SIZE = 64 * 1024
+USER_FIELDS = (
+    'first_name', 'middle_name', 'last_name', 'email', 'role', 'is_active'
+)
+EMPLOYEE_FIELDS = ('position', 'grade')
+LINK_FIELDS = ('head', 'mentors')
+RECORD_FIELDS = {'username', *USER_FIELDS, *EMPLOYEE_FIELDS, *LINK_FIELDS}
+MENTORS_SEPARATOR = ';'
+FORMATS = {'.json': 'json', '.ndjson': 'ndjson', '.jsonl': 'ndjson',
+           '.csv': 'csv'}
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+BOOLEANS = {'true': True, '1': True, 'false': False, '0': False}
+
+
+class ImportDataError(ValueError):
+    """Ошибка во входных данных импорта"""
+
+
+def iter_json_array(file):
+    """Читает объекты JSON-массива по одному, не загружая файл целиком"""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_BLOCK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ImportDataError('JSON file must contain an array')
+    position = 1
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            block = file.read(READ_BLOCK_SIZE)
+            if not block:
+                raise ImportDataError('Unexpected end of JSON array')
+            buffer = buffer[position:] + block
+            position = 0
+            continue
+        yield record
+
+
+def iter_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(file):
+    """Строки CSV, список менторов разделяется точкой с запятой"""
+    for row in csv.DictReader(file):
+        if 'mentors' in row:
+            row['mentors'] = [
+                username for username in row['mentors'].split(
+                    MENTORS_SEPARATOR
+                ) if username.strip()
+            ]
+        if row.get('head') == '':
+            row['head'] = None
+        yield row
+
+
+READERS = {'json': iter_json_array, 'ndjson': iter_ndjson, 'csv': iter_csv}
+
+
+def read_records(path, file_format=None):
+    """
+    Возвращает функцию, которая при каждом вызове заново читает файл
+    и выдает пары (номер записи, запись)
+    """
+    if file_format is None:
+        file_format = FORMATS.get(os.path.splitext(path)[1].lower())
+        if file_format is None:
+            raise ImportDataError(f'Unknown format of {path}')
+    reader = READERS[file_format]
+
+    def read():
+        with open(path, encoding='utf-8', newline='') as file:
+            yield from enumerate(reader(file), start=1)
+
+    return read
+
+
+def clean_record(number, record):
+    """Проверяет запись и приводит значения полей к нужным типам"""
+    if not isinstance(record, dict):
+        raise ImportDataError(f'Record {number}: expected an object')
+    unknown = record.keys() - RECORD_FIELDS
+    if unknown:
+        raise ImportDataError(
+            f'Record {number}: unknown fields {", ".join(sorted(unknown))}'
+        )
+    record = {
+        field: value.strip() if isinstance(value, str) else value
+        for field, value in record.items()
+    }
+    if not record.get('username'):
+        raise ImportDataError(f'Record {number}: username is required')
+    if 'role' in record and record['role'] not in User.Role.values:
+        raise ImportDataError(
+            f'Record {number}: unknown role {record["role"]!r}'
+        )
+    if isinstance(record.get('is_active'), str):
+        try:
+            record['is_active'] = BOOLEANS[record['is_active'].lower()]
+        except KeyError:
+            raise ImportDataError(
+                f'Record {number}: is_active must be true or false'
+            )
+    if 'mentors' in record:
+        if not isinstance(record['mentors'], list):
+            raise ImportDataError(f'Record {number}: mentors must be a list')
+        if record['username'] in record['mentors']:
+            raise ImportDataError(
+                f'Record {number}: employee cannot be their own mentor'
+            )
+    return record
+
+
+def iter_chunks(records, chunk_size):
+    """
+    Группирует проверенные записи в пачки по username. Повторная
+    запись о том же пользователе в пачке заменяет предыдущую
+    """
+    chunk = {}
+    for number, record in records:
+        record = clean_record(number, record)
+        record['number'] = number
+        chunk[record['username']] = record
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = {}
+    if chunk:
+        yield chunk
+
+
+def describe(old, new):
+    return ', '.join(
+        f'{field}: {old[field]!r} -> {value!r}' for field, value in new.items()
+    )
+
+
+class PeopleImporter:
+    """
+    Синхронизирует пользователей, профили руководителей и сотрудников,
+    руководителей сотрудников и связи с менторами. Записи читаются
+    пачками, существующие строки каждой пачки загружаются несколькими
+    запросами, а изменения пишутся через bulk_create и bulk_update.
+    Сигналы post_save при этом не срабатывают, поэтому их действия
+    выполняются явно: создаются профили, сбрасывается кэш токенов,
+    обновляется версия сотрудников и статистика руководителей.
+
+    Файл читается дважды: сначала создаются пользователи и профили, а
+    затем назначаются руководители и менторы, поэтому запись может
+    ссылаться на людей из любой части файла. Импорт выполняется в одной
+    транзакции, а при dry_run она откатывается
+    """
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE, report=None,
+                 progress=None):
+        self.chunk_size = chunk_size
+        self.report = report or (lambda message: None)
+        self.progress = progress or (lambda stage, records: None)
+        self.stats = Counter()
+        self.password = make_password(None)
+
+    def run(self, read, dry_run=False):
+        """Импортирует записи из read() и возвращает счетчики изменений"""
+        self.stats = Counter()
+        self.touched_users = set()
+        self.affected_managers = set()
+        with transaction.atomic():
+            for chunk in iter_chunks(read(), self.chunk_size):
+                self.import_profiles(chunk)
+                self.stats['records'] += len(chunk)
+                self.progress('profiles', self.stats['records'])
+            processed = 0
+            for chunk in iter_chunks(read(), self.chunk_size):
+                self.import_links(chunk)
+                processed += len(chunk)
+                self.progress('links', processed)
+            if self.affected_managers:
+                rebuild_manager_statistics(
+                    managers=self.affected_managers, create=False
+                )
+            if dry_run:
+                transaction.set_rollback(True)
+            else:
+                invalidate_users_tokens(self.touched_users)
+        return self.stats
+
+    def import_users(self, chunk):
+        """Создает и обновляет пользователей пачки и возвращает их"""
+        users = {
+            user.username: user
+            for user in User.objects.filter(username__in=chunk)
+        }
+        created = []
+        updated = []
+        updated_fields = set()
+        for username, record in chunk.items():
+            values = {
+                field: record[field] for field in USER_FIELDS
+                if field in record
+            }
+            user = users.get(username)
+            if user is None:
+                created.append(User(
+                    username=username, password=self.password, **values
+                ))
+                self.report(f'+ user {username}')
+                continue
+            changed = {
+                field: value for field, value in values.items()
+                if getattr(user, field) != value
+            }
+            if changed:
+                self.report(
+                    f'~ user {username}: '
+                    f'{describe(user.__dict__, changed)}'
+                )
+                for field, value in changed.items():
+                    setattr(user, field, value)
+                updated.append(user)
+                updated_fields.update(changed)
+                self.touched_users.add(user.id)
+        User.objects.bulk_create(created, batch_size=self.chunk_size)
+        if updated:
+            User.objects.bulk_update(
+                updated, sorted(updated_fields), batch_size=self.chunk_size
+            )
+            Employee.objects.filter(user__in=updated).update(
+                updated_at=timezone.now()
+            )
+        self.stats['users_created'] += len(created)
+        self.stats['users_updated'] += len(updated)
+        if created:
+            users.update(
+                (user.username, user) for user in User.objects.filter(
+                    username__in=[user.username for user in created]
+                )
+            )
+        return users
+
+    def import_profiles(self, chunk):
+        """Создает пользователей и профили, обновляет должность и грейд"""
+        users = self.import_users(chunk)
+        user_ids = [user.id for user in users.values()]
+        managers = set(Manager.objects.filter(
+            user__in=user_ids
+        ).values_list('user', flat=True))
+        employees = {
+            employee.user_id: employee
+            for employee in Employee.objects.filter(user__in=user_ids)
+        }
+        created_managers = []
+        created_employees = []
+        updated_employees = []
+        updated_fields = set()
+        now = timezone.now()
+        for username, record in chunk.items():
+            user = users[username]
+            values = {
+                field: record[field] for field in EMPLOYEE_FIELDS
+                if field in record
+            }
+            if user.role == User.Role.MANAGER and user.id not in managers:
+                created_managers.append(Manager(user=user))
+                self.report(f'+ manager {username}')
+            if user.role != User.Role.EMPLOYEE:
+                continue
+            employee = employees.get(user.id)
+            if employee is None:
+                created_employees.append(Employee(
+                    user=user,
+                    position=values.get('position', ''),
+                    grade=values.get('grade', ''),
+                ))
+                self.report(f'+ employee {username}')
+                continue
+            changed = {
+                field: value for field, value in values.items()
+                if getattr(employee, field) != value
+            }
+            if changed:
+                self.report(
+                    f'~ employee {username}: '
+                    f'{describe(employee.__dict__, changed)}'
+                )
+                for field, value in changed.items():
+                    setattr(employee, field, value)
+                employee.updated_at = now
+                updated_employees.append(employee)
+                updated_fields.update(changed)
+        Manager.objects.bulk_create(created_managers)
+        Employee.objects.bulk_create(
+            created_employees, batch_size=self.chunk_size
+        )
+        if updated_employees:
+            Employee.objects.bulk_update(
+                updated_employees, [*sorted(updated_fields), 'updated_at'],
+                batch_size=self.chunk_size
+            )
+        self.touched_users.update(
+            profile.user_id
+            for profile in created_managers + created_employees
+        )
+        self.stats['managers_created'] += len(created_managers)
+        self.stats['employees_created'] += len(created_employees)
+        self.stats['employees_updated'] += len(updated_employees)
+
+    def import_links(self, chunk):
+        """Назначает руководителей и менторов сотрудникам пачки"""
+        chunk = {
+            username: record for username, record in chunk.items()
+            if record.keys() & set(LINK_FIELDS)
+        }
+        if not chunk:
+            return
+        referenced = {
+            mentor
+            for record in chunk.values()
+            for mentor in record.get('mentors', [])
+        }
+        employees = {
+            employee.user.username: employee
+            for employee in Employee.objects.filter(
+                user__username__in=chunk.keys() | referenced
+            ).select_related('user')
+        }
+        managers = dict(Manager.objects.filter(user__username__in={
+            record['head'] for record in chunk.values() if record.get('head')
+        }).values_list('user__username', 'id'))
+        links = {}
+        for mentee_id, mentor_id, link_id in MentorEmployee.objects.filter(
+            mentee__in=[
+                employee.id for username, employee in employees.items()
+                if username in chunk
+            ]
+        ).values_list('mentee', 'mentor', 'id'):
+            links.setdefault(mentee_id, {})[mentor_id] = link_id
+        heads = {}
+        created_links = []
+        deleted_links = []
+        now = timezone.now()
+        for username, record in chunk.items():
+            employee = employees.get(username)
+            if employee is None:
+                if not record.get('head') and not record.get('mentors'):
+                    continue
+                raise ImportDataError(
+                    f'Record {record["number"]}: {username} is not an '
+                    f'employee and cannot have a head or mentors'
+                )
+            if 'head' in record:
+                head_id = None
+                if record['head']:
+                    head_id = managers.get(record['head'])
+                    if head_id is None:
+                        raise ImportDataError(
+                            f'Record {record["number"]}: manager '
+                            f'{record["head"]} does not exist'
+                        )
+                if employee.head_id != head_id:
+                    self.report(
+                        f'~ employee {username}: head '
+                        f'{employee.head_id!r} -> {head_id!r}'
+                    )
+                    self.affected_managers.update(
+                        manager_id
+                        for manager_id in (employee.head_id, head_id)
+                        if manager_id is not None
+                    )
+                    employee.head_id = head_id
+                    heads.setdefault(head_id, []).append(employee.id)
+            if 'mentors' in record:
+                mentors = {}
+                for mentor in record['mentors']:
+                    if mentor not in employees:
+                        raise ImportDataError(
+                            f'Record {record["number"]}: mentor {mentor} '
+                            f'is not an employee'
+                        )
+                    mentors[employees[mentor].id] = mentor
+                current = links.get(employee.id, {})
+                for mentor_id in mentors.keys() - current.keys():
+                    created_links.append(MentorEmployee(
+                        mentor_id=mentor_id, mentee_id=employee.id
+                    ))
+                    self.report(
+                        f'+ mentor {mentors[mentor_id]} -> {username}'
+                    )
+                for mentor_id in current.keys() - mentors.keys():
+                    deleted_links.append(current[mentor_id])
+                    self.report(f'- mentor {mentor_id} -> {username}')
+        for head_id, employee_ids in heads.items():
+            Employee.objects.filter(id__in=employee_ids).update(
+                head=head_id, updated_at=now
+            )
+        MentorEmployee.objects.bulk_create(
+            created_links, batch_size=self.chunk_size
+        )
+        if deleted_links:
+            MentorEmployee.objects.filter(id__in=deleted_links).delete()
+        self.stats['heads_changed'] += sum(map(len, heads.values()))
+        self.stats['mentor_links_created'] += len(created_links)
+        self.stats['mentor_links_deleted'] += len(deleted_links)
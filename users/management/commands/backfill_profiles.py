@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.profiles import backfill_profiles
+
+
+class Command(BaseCommand):
+    help = 'Create missing manager and employee profiles according to roles'
+
+    def handle(self, *args, **options):
+        created = backfill_profiles()
+        self.stdout.write(self.style.SUCCESS(f'Created {created} profiles'))
@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.importer import (IMPORT_CHUNK_SIZE, READERS, PeopleImporter,
+                            read_records)
+
+
+class Command(BaseCommand):
+    help = (
+        'Create or update users, managers, employees, their heads and '
+        'mentors from a JSON, NDJSON or CSV file. Each record is keyed by '
+        'username, fields missing from a record are left unchanged'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='File format, detected by extension by default',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the changes and roll them back',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=IMPORT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        verbosity = options['verbosity']
+
+        def report(message):
+            if options['dry_run'] or verbosity > 1:
+                self.stdout.write(message)
+
+        def progress(stage, records):
+            if verbosity > 1:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{stage}: {records} records, '
+                    f'{records / elapsed:.0f} records/s'
+                )
+
+        importer = PeopleImporter(
+            chunk_size=options['chunk_size'],
+            report=report,
+            progress=progress,
+        )
+        try:
+            stats = importer.run(
+                read_records(options['path'], options['format']),
+                dry_run=options['dry_run'],
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(
+            f'{name} {value}' for name, value in sorted(stats.items())
+            if value and name != 'records'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Checked" if options["dry_run"] else "Imported"} '
+            f'{stats["records"]} records in {elapsed:.1f}s '
+            f'({stats["records"] / elapsed:.0f} records/s): '
+            f'{summary or "no changes"}'
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='first_name',
+            field=models.CharField(max_length=64, verbose_name='Имя'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='last_name',
+            field=models.CharField(max_length=64, verbose_name='Фамилия'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='middle_name',
+            field=models.CharField(max_length=64, verbose_name='Отчество'),
+        ),
+    ]
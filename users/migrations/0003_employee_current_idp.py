@@ -0,0 +1,32 @@
+# Generated by Django 3.2 on 2026-10-18 18:07
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def fill_current_idp(apps, schema_editor):
+    Employee = apps.get_model('users', 'Employee')
+    IDP = apps.get_model('plans', 'IDP')
+    Employee.objects.update(current_idp=Subquery(
+        IDP.objects.filter(
+            employee=OuterRef('pk')
+        ).order_by('-pub_date', '-id').values('id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plans', '0004_idp_task_counters'),
+        ('users', '0002_alter_user_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='current_idp',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='plans.idp', verbose_name='Текущий ИПР'),
+        ),
+        migrations.RunPython(fill_current_idp, migrations.RunPython.noop),
+    ]
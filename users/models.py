@@ -37,6 +37,22 @@ class User(AbstractUser):
     def __str__(self):
         return f'{self.username}'
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'role' in update_fields:
+            self._loaded_role = self.role
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_role = instance.__dict__.get('role')
+        return instance
+
+    def role_changed(self):
+        """Проверяет, изменилась ли роль с момента загрузки из БД"""
+        return self.role != getattr(self, '_loaded_role', None)
+
 
 class Manager(models.Model):
     """Модель руководителя"""
@@ -64,6 +80,19 @@ class Employee(models.Model):
     position = models.CharField(max_length=MAX_LENGTH)
     grade = models.CharField(max_length=MAX_LENGTH)
     head = models.ForeignKey(Manager, on_delete=models.CASCADE, null=True)
+    current_idp = models.ForeignKey(
+        'plans.IDP',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+        verbose_name='Текущий ИПР',
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
 
     class Meta:
         verbose_name = 'Сотрудник'
@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .authentication import invalidate_users_tokens
+from .models import Employee, Manager, User
+
+PROFILE_MODELS = {
+    User.Role.MANAGER: Manager,
+    User.Role.EMPLOYEE: Employee,
+}
+
+suspended_users = ContextVar('suspended_users', default=None)
+
+
+def provision_profile(user):
+    """Создает профиль, соответствующий роли пользователя"""
+    skipped = suspended_users.get()
+    if skipped is not None:
+        skipped.add(user.pk)
+        return
+    model = PROFILE_MODELS.get(user.role)
+    if model is not None:
+        model.objects.get_or_create(user=user)
+
+
+def backfill_profiles(user_ids=None):
+    """
+    Создает недостающие профили пользователей одним запросом на роль.
+    Без user_ids проверяются все пользователи
+    """
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    created = []
+    for role, model in PROFILE_MODELS.items():
+        missing = list(users.filter(role=role).exclude(
+            id__in=model.objects.values('user_id')
+        ).values_list('id', flat=True))
+        model.objects.bulk_create([model(user_id=pk) for pk in missing])
+        created.extend(missing)
+    if created:
+        invalidate_users_tokens(created)
+    return len(created)
+
+
+@contextmanager
+def suspend_profile_provisioning():
+    """
+    Отключает создание профилей при сохранении пользователей на время
+    блока, после блока создает недостающие профили одним проходом
+    """
+    skipped = set()
+    token = suspended_users.set(skipped)
+    try:
+        yield skipped
+    finally:
+        suspended_users.reset(token)
+    if skipped:
+        backfill_profiles(skipped)
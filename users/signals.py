@@ -1,12 +1,48 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 
+from .authentication import invalidate_tokens, invalidate_user_tokens
 from .models import Employee, Manager, User
+from .profiles import provision_profile
 
 
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if instance.role == User.Role.MANAGER:
-        Manager.objects.get_or_create(user=instance)
-    elif instance.role == User.Role.EMPLOYEE:
-        Employee.objects.get_or_create(user=instance)
+def create_user_profile(sender, instance, created, update_fields, **kwargs):
+    if created or (
+        (update_fields is None or 'role' in update_fields)
+        and instance.role_changed()
+    ):
+        provision_profile(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_cache(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        invalidate_user_tokens(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def touch_employee(sender, instance, created, raw, update_fields, **kwargs):
+    if created or raw or update_fields == frozenset(['last_login']):
+        return
+    Employee.objects.filter(user=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Manager)
+@receiver(post_save, sender=Employee)
+def invalidate_created_profile_cache(sender, instance, created, **kwargs):
+    if created:
+        invalidate_user_tokens(instance.user_id)
+
+
+@receiver(post_delete, sender=Manager)
+@receiver(post_delete, sender=Employee)
+def invalidate_deleted_profile_cache(sender, instance, **kwargs):
+    invalidate_user_tokens(instance.user_id)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from plans.tests.fixtures import CleanCacheMixin, create_manager, create_user
+from users.authentication import CachedTokenAuthentication, token_cache_key
+from users.models import Employee, User
+
+
+class CachedTokenAuthenticationTest(CleanCacheMixin, TestCase):
+    """Кэширование пользователя при аутентификации по токену"""
+
+    def setUp(self):
+        super().setUp()
+        self.manager = create_manager('manager')
+        self.user = create_user('employee')
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self):
+        return self.authentication.authenticate_credentials(self.token.key)
+
+    def test_cached_credentials(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+            self.assertEqual(token, self.token)
+            self.assertEqual(user.role, User.Role.EMPLOYEE)
+            self.assertEqual(
+                user.employee_profile.id, self.user.employee_profile.id
+            )
+            self.assertFalse(hasattr(user, 'manager_profile'))
+
+    def test_profile_fields_are_not_cached(self):
+        self.authenticate()
+        Employee.objects.filter(user=self.user).update(head=self.manager)
+        user, _ = self.authenticate()
+        with self.assertNumQueries(1):
+            self.assertEqual(user.employee_profile.head_id, self.manager.id)
+
+    def test_user_change_invalidates_cache(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_token_delete_invalidates_cache_after_commit(self):
+        self.authenticate()
+        key = self.token.key
+        cached = cache.get(token_cache_key(key))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+            # Параллельный запрос до фиксации видит токен и кэширует его
+            cache.set(token_cache_key(key), cached)
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(key)
@@ -0,0 +1,221 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from plans.statistics import (find_inconsistent_statistics,
+                              rebuild_manager_statistics)
+from plans.tests.fixtures import CleanCacheMixin
+from users.authentication import token_cache_key
+from users.importer import (ImportDataError, PeopleImporter,
+                            iter_json_array, read_records)
+from users.models import Employee, Manager, MentorEmployee, User
+
+
+def person(number, **fields):
+    return {
+        'username': f'employee_{number}',
+        'role': 'employee',
+        'last_name': 'Иванов',
+        'position': 'Разработчик',
+        'grade': 'Middle',
+        'head': 'boss',
+        **fields,
+    }
+
+
+class PeopleImporterTest(CleanCacheMixin, TestCase):
+    """Массовый импорт пользователей, профилей, руководителей и менторов"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, records, name='people.json'):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            if name.endswith('.csv'):
+                writer = csv.DictWriter(file, fieldnames=list(records[0]))
+                writer.writeheader()
+                writer.writerows(records)
+            elif name.endswith('.ndjson'):
+                for record in records:
+                    file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            else:
+                json.dump(records, file, ensure_ascii=False, indent=2)
+        return read_records(path)
+
+    def run_import(self, records, dry_run=False, **kwargs):
+        messages = []
+        importer = PeopleImporter(report=messages.append, **kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = importer.run(self.write(records), dry_run=dry_run)
+        return stats, messages
+
+    def test_create(self):
+        records = [
+            person(0, mentors=['employee_2']),
+            person(1, mentors=['employee_0', 'employee_2']),
+            person(2),
+            {'username': 'boss', 'role': 'manager', 'last_name': 'Петров'},
+        ]
+        stats, _ = self.run_import(records, chunk_size=2)
+        self.assertEqual(stats, {
+            'records': 4,
+            'users_created': 4,
+            'users_updated': 0,
+            'managers_created': 1,
+            'employees_created': 3,
+            'employees_updated': 0,
+            'heads_changed': 3,
+            'mentor_links_created': 3,
+            'mentor_links_deleted': 0,
+        })
+        boss = Manager.objects.get(user__username='boss')
+        self.assertEqual(
+            set(Employee.objects.values_list('head', flat=True)), {boss.id}
+        )
+        self.assertFalse(
+            User.objects.get(username='boss').has_usable_password()
+        )
+        self.assertEqual(
+            set(MentorEmployee.objects.values_list(
+                'mentor__user__username', 'mentee__user__username'
+            )),
+            {
+                ('employee_2', 'employee_0'),
+                ('employee_0', 'employee_1'),
+                ('employee_2', 'employee_1'),
+            }
+        )
+        rebuild_manager_statistics()
+        self.assertEqual(boss.idp_statistics.count_employe, 3)
+
+    def test_update(self):
+        records = [
+            {'username': 'boss', 'role': 'manager'},
+            {'username': 'chief', 'role': 'manager'},
+            *(person(number) for number in range(3)),
+        ]
+        self.run_import(records)
+        rebuild_manager_statistics()
+        user = User.objects.get(username='employee_1')
+        token = Token.objects.create(user=user)
+        cache.set(token_cache_key(token.key), 'cached')
+        self.assertEqual(self.run_import(records)[0]['records'], 5)
+        self.assertEqual(cache.get(token_cache_key(token.key)), 'cached')
+
+        records[3] = person(
+            1, grade='Senior', last_name='Смирнов', head='chief',
+            mentors=['employee_0'],
+        )
+        stats, messages = self.run_import(records)
+        self.assertEqual(
+            (
+                stats['users_updated'], stats['employees_updated'],
+                stats['heads_changed'], stats['mentor_links_created'],
+            ),
+            (1, 1, 1, 1)
+        )
+        self.assertIn(
+            "~ user employee_1: last_name: 'Иванов' -> 'Смирнов'", messages
+        )
+        employee = Employee.objects.get(user=user)
+        self.assertEqual(employee.grade, 'Senior')
+        self.assertEqual(employee.head.user.username, 'chief')
+        self.assertIsNone(cache.get(token_cache_key(token.key)))
+        self.assertEqual(find_inconsistent_statistics(), [])
+
+        records[3] = person(1, head=None, mentors=[])
+        stats, _ = self.run_import(records)
+        self.assertEqual(
+            (stats['heads_changed'], stats['mentor_links_deleted']), (1, 1)
+        )
+        self.assertIsNone(Employee.objects.get(user=user).head)
+        self.assertFalse(MentorEmployee.objects.exists())
+
+    def test_dry_run(self):
+        stats, messages = self.run_import(
+            [{'username': 'boss', 'role': 'manager'}, person(0)],
+            dry_run=True,
+        )
+        self.assertEqual(stats['users_created'], 2)
+        self.assertIn('+ employee employee_0', messages)
+        self.assertFalse(User.objects.exists())
+
+    def test_queries_do_not_grow_with_records(self):
+        def count_queries(count):
+            records = [{'username': 'boss', 'role': 'manager'}] + [
+                person(number, mentors=[f'employee_{number + 1}'])
+                for number in range(count)
+            ] + [person(count)]
+            self.run_import(records)
+            for record in records[1:]:
+                record['grade'] = 'Senior'
+                record['last_name'] = 'Петров'
+            with CaptureQueriesContext(connection) as context:
+                self.run_import(records)
+            return len(context)
+
+        few = count_queries(5)
+        User.objects.all().delete()
+        self.assertEqual(count_queries(50), few)
+
+    def test_formats(self):
+        read = self.write([
+            {'username': 'boss', 'role': 'manager', 'head': '',
+             'mentors': '', 'is_active': 'true'},
+            {'username': 'employee_0', 'role': 'employee', 'head': 'boss',
+             'mentors': 'employee_1', 'is_active': 'false'},
+            {'username': 'employee_1', 'role': 'employee', 'head': 'boss',
+             'mentors': '', 'is_active': '1'},
+        ], 'people.csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = PeopleImporter().run(read)
+        self.assertEqual(
+            (stats['heads_changed'], stats['mentor_links_created']), (2, 1)
+        )
+        self.assertFalse(User.objects.get(username='employee_0').is_active)
+        read = self.write(
+            [person(2, mentors=['employee_0'])], 'people.ndjson'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = PeopleImporter().run(read)
+        self.assertEqual(
+            (stats['employees_created'], stats['mentor_links_created']),
+            (1, 1)
+        )
+
+    def test_json_array_blocks(self):
+        records = [person(number) for number in range(20)]
+        text = json.dumps(records, ensure_ascii=False, indent=2)
+        with mock.patch('users.importer.READ_BLOCK_SIZE', 7):
+            self.assertEqual(
+                list(iter_json_array(io.StringIO(text))), records
+            )
+            with self.assertRaises(ImportDataError):
+                list(iter_json_array(io.StringIO(text[:-20])))
+
+    def test_invalid_records_roll_back(self):
+        for records in (
+            [person(0)],
+            [{'username': 'boss', 'role': 'manager'}, person(0, mentors=[
+                'nobody'
+            ])],
+            [{'username': 'boss', 'role': 'director'}],
+            [{'username': 'boss', 'department': 'IT'}],
+            [person(0, head='boss', mentors=['employee_0'])],
+        ):
+            with self.subTest(records=records):
+                with self.assertRaises(ImportDataError):
+                    self.run_import(records)
+                self.assertFalse(User.objects.exists())
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from plans.tests.fixtures import CleanCacheMixin
+from users.authentication import token_cache_key
+from users.models import Employee, Manager, User
+from users.profiles import backfill_profiles, suspend_profile_provisioning
+
+
+class ProfileProvisioningTest(CleanCacheMixin, TestCase):
+    """Создание профилей при сохранении пользователей"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username='employee')
+
+    def test_created_with_user(self):
+        self.assertTrue(Employee.objects.filter(user=self.user).exists())
+
+    def test_not_provisioned_without_role_change(self):
+        user = User.objects.get(pk=self.user.pk)
+        with mock.patch('users.signals.provision_profile') as provision:
+            update_last_login(None, user)
+            user.first_name = 'Иван'
+            user.save()
+            user.role = User.Role.MANAGER
+            user.save(update_fields=['first_name'])
+        provision.assert_not_called()
+        self.assertFalse(Manager.objects.filter(user=user).exists())
+
+    def test_role_change(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.role = User.Role.MANAGER
+        user.save()
+        self.assertTrue(Manager.objects.filter(user=user).exists())
+        with mock.patch('users.signals.provision_profile') as provision:
+            user.save()
+        provision.assert_not_called()
+
+    def test_suspend_and_backfill(self):
+        token = Token.objects.create(user=self.user)
+        cache.set(token_cache_key(token.key), 'cached')
+        with self.captureOnCommitCallbacks(execute=True):
+            with suspend_profile_provisioning():
+                for number in range(3):
+                    User.objects.create(
+                        username=f'manager_{number}', role=User.Role.MANAGER
+                    )
+                self.user.role = User.Role.MANAGER
+                self.user.save()
+                self.assertFalse(Manager.objects.exists())
+        self.assertEqual(Manager.objects.count(), 4)
+        self.assertIsNone(cache.get(token_cache_key(token.key)))
+
+    def test_backfill_profiles(self):
+        User.objects.bulk_create([
+            User(username='manager', role=User.Role.MANAGER),
+            User(username='new_employee'),
+        ])
+        with self.assertNumQueries(5):
+            self.assertEqual(backfill_profiles(), 2)
+        self.assertEqual(
+            set(Manager.objects.values_list('user__username', flat=True)),
+            {'manager'}
+        )
+        self.assertEqual(backfill_profiles(), 0)